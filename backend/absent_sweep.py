@@ -0,0 +1,84 @@
+import os
+import time
+import threading
+import traceback
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+def mark_absent_for_date(employees_collection, attendance_collection, date):
+    """Write an absent record for every employee with no attendance on the given date.
+
+    Uses $setOnInsert upserts keyed on (employee_id, date), so running it twice,
+    from several workers, or while late check-ins arrive never overwrites a
+    present record or creates duplicates.
+    """
+    all_ids = set(employees_collection.distinct("employee_id"))
+    marked_ids = set(attendance_collection.distinct("employee_id", {"date": date}))
+    unmarked = sorted(all_ids - marked_ids)
+    if not unmarked:
+        return {"date": date, "employees": len(all_ids), "marked_absent": 0, "employee_ids": []}
+
+    now = datetime.now()
+    operations = [
+        UpdateOne(
+            {"employee_id": employee_id, "date": date},
+            {"$setOnInsert": {
+                "employee_id": employee_id,
+                "date": date,
+                "in_time": "Absent",
+                "timestamp": now,
+                "status": "absent",
+                "late_time": None
+            }},
+            upsert=True
+        )
+        for employee_id in unmarked
+    ]
+    try:
+        result = attendance_collection.bulk_write(operations, ordered=False)
+        upserted = result.upserted_ids
+    except BulkWriteError as e:
+        # Duplicate keys mean a check-in or another sweep won the race for that employee
+        errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+        if errors:
+            raise
+        upserted = {item["index"]: item["_id"] for item in e.details.get("upserted", [])}
+
+    absent_ids = [unmarked[index] for index in sorted(upserted)]
+    return {"date": date, "employees": len(all_ids), "marked_absent": len(absent_ids), "employee_ids": absent_ids}
+
+class AbsentSweeper:
+    """Background thread that runs the absent sweep once a day after the cutoff time."""
+
+    def __init__(self, sweep, cutoff_getter, interval_seconds=60):
+        self.sweep = sweep
+        self.cutoff_getter = cutoff_getter
+        self.interval_seconds = interval_seconds
+        self.last_swept = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        """Start the sweep thread once per process (threads don't survive a fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._loop, name="absent-sweep", daemon=True).start()
+
+    def _loop(self):
+        while True:
+            try:
+                now = datetime.now()
+                today = now.strftime("%Y-%m-%d")
+                if self.last_swept != today and now.time() >= self.cutoff_getter():
+                    result = self.sweep(today)
+                    self.last_swept = today
+                    print(f"Absent sweep for {today}: marked {result['marked_absent']} of {result['employees']} employees")
+            except Exception as e:
+                print(f"Error in absent sweep: {e}")
+                traceback.print_exc()
+            time.sleep(self.interval_seconds)
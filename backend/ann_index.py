@@ -0,0 +1,610 @@
+import os
+import json
+import time
+import base64
+import tempfile
+import threading
+import numpy as np
+from embeddings import EMBEDDING_DIM
+from face_index import rank_employees
+from face_templates import FACE_TEMPLATES_MAX, FACE_TEMPLATE_SCORING
+from mapped_index import (
+    FACE_INDEX_MODE,
+    FACE_INDEX_MAX_AGE_S,
+    FACE_INDEX_CHECK_S,
+    embedding_config,
+    normalize_templates,
+    encode_change,
+    file_lock
+)
+
+# Approximate 1:N search for galleries where scoring every template per check-in
+# stops being cheap. Recall and latency trade off through FACE_IVF_NPROBE (lists
+# scanned per query) and FACE_HNSW_EF (graph search breadth); see
+# benchmarks/ann_recall.py for measured curves.
+FACE_ANN_PATH = os.getenv('FACE_ANN_PATH', os.path.join(tempfile.gettempdir(), f'frs_face_{FACE_INDEX_MODE}'))
+# 0 picks 4 * sqrt(rows) lists when the index is built
+FACE_IVF_NLIST = int(os.getenv('FACE_IVF_NLIST', '0'))
+FACE_IVF_NPROBE = int(os.getenv('FACE_IVF_NPROBE', '32'))
+# Below this many rows IVF keeps a single list, i.e. exact search
+FACE_IVF_MIN_ROWS = int(os.getenv('FACE_IVF_MIN_ROWS', '4096'))
+FACE_HNSW_M = int(os.getenv('FACE_HNSW_M', '16'))
+FACE_HNSW_EF_CONSTRUCTION = int(os.getenv('FACE_HNSW_EF_CONSTRUCTION', '200'))
+FACE_HNSW_EF = int(os.getenv('FACE_HNSW_EF', '64'))
+# The change journal is folded into a new snapshot once it grows past this
+FACE_ANN_JOURNAL_MAX_BYTES = int(os.getenv('FACE_ANN_JOURNAL_MAX_BYTES', str(16 * 1024 * 1024)))
+
+def replace_atomically(path, write):
+    """Call write(file) on a temporary file next to path, then rename it over path."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".face_ann.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def train_centroids(vectors, nlist, iterations=10, sample_size=65536, seed=0):
+    """Spherical k-means: nlist unit centroids fitted to a sample of the rows."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = assign_lists(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=nlist)
+        # Restart empty lists from random rows
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize_templates(sums, centroids.shape[1])
+    return centroids
+
+def assign_lists(vectors, centroids, chunk=4096):
+    """Nearest centroid of every row, a chunk at a time to bound the score matrix."""
+    return np.concatenate([
+        np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), chunk)
+    ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+class InvertedList:
+    """Templates assigned to one IVF centroid, in a growable contiguous block."""
+
+    def __init__(self, dim):
+        self.vectors = np.zeros((16, dim), dtype=np.float32)
+        self.ids = []
+
+    def add(self, employee_id, vectors):
+        needed = len(self.ids) + len(vectors)
+        if needed > self.vectors.shape[0]:
+            grown = np.zeros((max(needed, self.vectors.shape[0] * 2), self.vectors.shape[1]), dtype=np.float32)
+            grown[:len(self.ids)] = self.vectors[:len(self.ids)]
+            self.vectors = grown
+        self.vectors[len(self.ids):needed] = vectors
+        self.ids.extend([employee_id] * len(vectors))
+
+    def remove(self, employee_id):
+        for row in reversed([row for row, owner in enumerate(self.ids) if owner == employee_id]):
+            last = len(self.ids) - 1
+            if row != last:
+                self.vectors[row] = self.vectors[last]
+                self.ids[row] = self.ids[last]
+            self.ids.pop()
+
+class IVFIndex:
+    """Inverted-file index in pure NumPy.
+
+    Templates are bucketed by their nearest of nlist k-means centroids; a query
+    scores the centroids, then only the rows of the nprobe best lists. With
+    nlist ~ sqrt(rows) both steps grow with sqrt(rows) rather than rows.
+    Inserts go to the nearest existing centroid; the centroids are retrained
+    when the index is rebuilt or has grown 4x since training.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, dim=EMBEDDING_DIM, nlist=FACE_IVF_NLIST, nprobe=FACE_IVF_NPROBE):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.trained_rows = 0
+        self._centroids = np.zeros((0, dim), dtype=np.float32)
+        self._lists = []
+        self._where = {}
+        self._rows = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, employee_id):
+        return employee_id in self._where
+
+    def rows(self):
+        return self._rows
+
+    def lists(self):
+        """Number of inverted lists (centroids)."""
+        return len(self._lists)
+
+    def _add(self, employee_id, vectors):
+        if not self._lists:
+            # Nothing trained yet: one list holding everything, searched exhaustively
+            self._centroids = vectors[:1].copy()
+            self._lists = [InvertedList(self.dim)]
+        assignment = assign_lists(vectors, self._centroids)
+        for list_no in np.unique(assignment):
+            self._lists[list_no].add(employee_id, vectors[assignment == list_no])
+        self._where[employee_id] = [int(list_no) for list_no in np.unique(assignment)]
+        self._rows += len(vectors)
+
+    def _remove(self, employee_id):
+        list_nos = self._where.pop(employee_id, None)
+        if list_nos is None:
+            return False
+        for list_no in list_nos:
+            before = len(self._lists[list_no].ids)
+            self._lists[list_no].remove(employee_id)
+            self._rows -= before - len(self._lists[list_no].ids)
+        return True
+
+    def upsert(self, employee_id, vectors):
+        vectors = normalize_templates(vectors, self.dim)
+        with self._lock:
+            self._remove(employee_id)
+            self._add(employee_id, vectors)
+
+    def upsert_many(self, items):
+        with self._lock:
+            for employee_id, vectors in items:
+                self.upsert(employee_id, vectors)
+
+    def remove(self, employee_id):
+        with self._lock:
+            return self._remove(employee_id)
+
+    def items(self):
+        """(employee_id, k x dim templates) for every employee."""
+        templates = {}
+        with self._lock:
+            for inverted in self._lists:
+                for row, employee_id in enumerate(inverted.ids):
+                    templates.setdefault(employee_id, []).append(inverted.vectors[row])
+        return [(employee_id, np.vstack(vectors)) for employee_id, vectors in templates.items()]
+
+    def load(self, items):
+        """Replace the contents with (employee_id, vectors) pairs, training fresh centroids."""
+        ids, blocks, seen = [], [], set()
+        for employee_id, vectors in items:
+            if employee_id in seen:
+                continue
+            seen.add(employee_id)
+            ids.append(employee_id)
+            blocks.append(normalize_templates(vectors, self.dim))
+        matrix = np.vstack(blocks) if blocks else np.zeros((0, self.dim), dtype=np.float32)
+        rows = len(matrix)
+        nlist = 1 if rows < FACE_IVF_MIN_ROWS else min(self.nlist or int(4 * np.sqrt(rows)), rows)
+        centroids = train_centroids(matrix, nlist) if rows else np.zeros((0, self.dim), dtype=np.float32)
+        assignment = assign_lists(matrix, centroids) if rows else None
+        lists = [InvertedList(self.dim) for _ in range(len(centroids))]
+        where = {}
+        start = 0
+        for employee_id, vectors in zip(ids, blocks):
+            owned = assignment[start:start + len(vectors)]
+            for list_no in np.unique(owned):
+                lists[list_no].add(employee_id, vectors[owned == list_no])
+            where[employee_id] = [int(list_no) for list_no in np.unique(owned)]
+            start += len(vectors)
+        with self._lock:
+            self._centroids, self._lists, self._where, self._rows = centroids, lists, where, rows
+            self.trained_rows = rows
+
+    def needs_training(self):
+        """True once the index has grown well past the rows its centroids were fitted to."""
+        return self._rows >= FACE_IVF_MIN_ROWS and self._rows > 4 * max(self.trained_rows, 1)
+
+    def search(self, vector, k=1, scoring=FACE_TEMPLATE_SCORING, nprobe=None):
+        """Top-k (employee_id, similarity) over the rows of the nprobe lists nearest the query.
+
+        With "mean" scoring only an employee's templates in the probed lists are averaged.
+        """
+        query = normalize_templates(vector, self.dim)[0]
+        with self._lock:
+            if not self._where:
+                return []
+            nprobe = min(nprobe or self.nprobe, len(self._lists))
+            centroid_scores = self._centroids @ query
+            probe = np.argpartition(centroid_scores, len(self._lists) - nprobe)[len(self._lists) - nprobe:]
+            scores, ids = [], []
+            for list_no in probe:
+                inverted = self._lists[list_no]
+                if inverted.ids:
+                    scores.append(inverted.vectors[:len(inverted.ids)] @ query)
+                    ids.extend(inverted.ids)
+            if not ids:
+                return []
+            rows = None
+            if scoring == 'mean':
+                rows = {}
+                for row, employee_id in enumerate(ids):
+                    rows.setdefault(employee_id, []).append(row)
+            return rank_employees(np.concatenate(scores), ids, rows, k, scoring)
+
+    def save(self, path):
+        """Write centroids, lists and ids to path (atomically replaced)."""
+        with self._lock:
+            sizes = np.array([len(inverted.ids) for inverted in self._lists], dtype=np.int64)
+            vectors = np.vstack([inverted.vectors[:len(inverted.ids)] for inverted in self._lists]) \
+                if self._lists else np.zeros((0, self.dim), dtype=np.float32)
+            ids = json.dumps([employee_id for inverted in self._lists for employee_id in inverted.ids])
+            meta = json.dumps({"kind": self.kind, "trained_rows": self.trained_rows})
+            replace_atomically(path, lambda f: np.savez(
+                f, centroids=self._centroids, sizes=sizes, vectors=vectors, ids=np.array(ids), meta=np.array(meta)
+            ))
+
+    def restore(self, path):
+        """Load what save wrote."""
+        with np.load(path, allow_pickle=False) as data:
+            centroids = data["centroids"]
+            sizes = data["sizes"]
+            vectors = data["vectors"]
+            ids = json.loads(str(data["ids"]))
+            meta = json.loads(str(data["meta"]))
+        lists, where = [], {}
+        start = 0
+        for list_no, size in enumerate(sizes):
+            inverted = InvertedList(self.dim)
+            for row in range(start, start + size):
+                where.setdefault(ids[row], set()).add(list_no)
+            if size:
+                block_ids = ids[start:start + size]
+                inverted.vectors = vectors[start:start + size].copy()
+                inverted.ids = block_ids
+            lists.append(inverted)
+            start += size
+        with self._lock:
+            self._centroids, self._lists, self._rows = centroids, lists, int(sizes.sum())
+            self._where = {employee_id: sorted(list_nos) for employee_id, list_nos in where.items()}
+            self.trained_rows = meta["trained_rows"]
+
+class HnswIndex:
+    """HNSW graph index through hnswlib (optional dependency).
+
+    Each template is a graph node labelled with an integer; deleted nodes are
+    marked and their slots reused by later inserts. ef sets the search breadth
+    (recall vs latency); m and ef_construction the graph quality at build time.
+    """
+
+    kind = "hnsw"
+
+    def __init__(self, dim=EMBEDDING_DIM, ef=FACE_HNSW_EF, m=FACE_HNSW_M, ef_construction=FACE_HNSW_EF_CONSTRUCTION):
+        # Imported here so only deployments that choose HNSW need the package
+        import hnswlib
+        self._hnswlib = hnswlib
+        self.dim = dim
+        self.ef = ef
+        self.m = m
+        self.ef_construction = ef_construction
+        self._graph = None
+        self._labels = {}
+        self._owners = {}
+        self._next_label = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._labels)
+
+    def __contains__(self, employee_id):
+        return employee_id in self._labels
+
+    def rows(self):
+        return len(self._owners)
+
+    def _new_graph(self, capacity):
+        graph = self._hnswlib.Index(space='ip', dim=self.dim)
+        graph.init_index(max_elements=max(capacity, 1024), ef_construction=self.ef_construction, M=self.m, allow_replace_deleted=True)
+        return graph
+
+    def _add(self, employee_id, vectors):
+        if self._graph is None:
+            self._graph = self._new_graph(len(vectors) * 2)
+        needed = self._graph.get_current_count() + len(vectors)
+        if needed > self._graph.get_max_elements():
+            self._graph.resize_index(max(needed, self._graph.get_max_elements() * 2))
+        labels = list(range(self._next_label, self._next_label + len(vectors)))
+        self._next_label += len(vectors)
+        self._graph.add_items(vectors, labels, replace_deleted=True)
+        self._labels[employee_id] = labels
+        for label in labels:
+            self._owners[label] = employee_id
+
+    def _remove(self, employee_id):
+        labels = self._labels.pop(employee_id, None)
+        if labels is None:
+            return False
+        for label in labels:
+            self._graph.mark_deleted(label)
+            del self._owners[label]
+        return True
+
+    def upsert(self, employee_id, vectors):
+        vectors = normalize_templates(vectors, self.dim)
+        with self._lock:
+            self._remove(employee_id)
+            self._add(employee_id, vectors)
+
+    def upsert_many(self, items):
+        with self._lock:
+            for employee_id, vectors in items:
+                self.upsert(employee_id, vectors)
+
+    def remove(self, employee_id):
+        with self._lock:
+            return self._remove(employee_id)
+
+    def load(self, items):
+        """Replace the contents with (employee_id, vectors) pairs, building a fresh graph."""
+        items = [(employee_id, normalize_templates(vectors, self.dim)) for employee_id, vectors in items]
+        with self._lock:
+            self._graph = self._new_graph(sum(len(vectors) for _, vectors in items) * 2)
+            self._labels, self._owners, self._next_label = {}, {}, 0
+            for employee_id, vectors in items:
+                if employee_id not in self._labels:
+                    self._add(employee_id, vectors)
+
+    def needs_training(self):
+        return False
+
+    def search(self, vector, k=1, scoring=FACE_TEMPLATE_SCORING, ef=None):
+        """Top-k (employee_id, similarity) from the graph's nearest templates."""
+        query = normalize_templates(vector, self.dim)
+        with self._lock:
+            if not self._owners:
+                return []
+            candidates = min(len(self._owners), k * max(FACE_TEMPLATES_MAX, 1))
+            self._graph.set_ef(max(ef or self.ef, candidates))
+            labels, distances = self._graph.knn_query(query, k=candidates)
+            ids = [self._owners[int(label)] for label in labels[0]]
+        # Inner-product distance is 1 - cosine similarity for unit vectors
+        scores = 1 - distances[0]
+        rows = None
+        if scoring == 'mean':
+            rows = {}
+            for row, employee_id in enumerate(ids):
+                rows.setdefault(employee_id, []).append(row)
+        return rank_employees(scores, ids, rows, k, scoring)
+
+    def save(self, path):
+        """Write the graph to path and the label table to path.labels.json (each atomically replaced)."""
+        with self._lock:
+            graph_path = path + ".tmp-graph"
+            if self._graph is not None:
+                self._graph.save_index(graph_path)
+                os.replace(graph_path, path)
+            elif os.path.exists(path):
+                os.unlink(path)
+            labels = json.dumps({"labels": self._labels, "next_label": self._next_label}).encode("utf-8")
+            replace_atomically(path + ".labels.json", lambda f: f.write(labels))
+
+    def restore(self, path):
+        """Load what save wrote."""
+        with open(path + ".labels.json", "rb") as f:
+            table = json.loads(f.read().decode("utf-8"))
+        graph = None
+        if os.path.exists(path):
+            graph = self._hnswlib.Index(space='ip', dim=self.dim)
+            graph.load_index(path, allow_replace_deleted=True)
+        with self._lock:
+            self._graph = graph
+            self._labels = table["labels"]
+            self._owners = {label: employee_id for employee_id, labels in self._labels.items() for label in labels}
+            self._next_label = table["next_label"]
+
+def create_ann_index(kind):
+    if kind == "ivf":
+        return IVFIndex()
+    if kind == "hnsw":
+        return HnswIndex()
+    raise ValueError(f"Unknown approximate index kind: {kind}")
+
+class SharedAnnIndex:
+    """An IVF or HNSW index per worker, kept in step across the host's workers.
+
+    The index is persisted as a snapshot (FACE_ANN_PATH) plus an append-only
+    journal of upserts and removals since that snapshot. A write takes the
+    host's file lock, appends its change to the journal and applies it locally;
+    other workers replay new journal lines within FACE_INDEX_CHECK_S. Startup
+    restores the snapshot instead of rebuilding from Mongo unless it is older
+    than FACE_INDEX_MAX_AGE_S, and a long journal is folded into a new snapshot.
+    """
+
+    def __init__(self, kind=FACE_INDEX_MODE, path=FACE_ANN_PATH, check_seconds=FACE_INDEX_CHECK_S):
+        self.kind = kind
+        self.path = path
+        self.check_seconds = check_seconds
+        # Created on first use, so API-only workers never import hnswlib
+        self._index = None
+        self._meta = None
+        self._meta_key = None
+        self._offset = 0
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+
+    @property
+    def _meta_path(self):
+        return self.path + ".meta.json"
+
+    @property
+    def _journal_path(self):
+        return self.path + ".journal"
+
+    def _stored_key(self):
+        try:
+            stat = os.stat(self._meta_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _sync(self, force=False, locked=False):
+        """Restore a replaced snapshot and replay journal lines this worker has not applied yet."""
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = create_ann_index(self.kind)
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_seconds:
+            return
+        self._checked_at = now
+        key = self._stored_key()
+        if key is None:
+            return
+        if key != self._meta_key and not locked:
+            # A snapshot is several files; read them only while no writer is replacing them
+            with file_lock(self.path):
+                self._sync(force=True, locked=True)
+            return
+        with self._lock:
+            if key != self._meta_key:
+                self._restore(key)
+            if self._meta is not None:
+                self._replay()
+
+    def _restore(self, key):
+        try:
+            with open(self._meta_path, "rb") as f:
+                meta = json.loads(f.read().decode("utf-8"))
+            index = create_ann_index(self.kind)
+            if meta["kind"] == self.kind and meta["embedding"] == embedding_config():
+                index.restore(self.path)
+            else:
+                meta = dict(meta, stale=True)
+        except Exception as e:
+            # Treated as stale, so the next startup load rebuilds it
+            print(f"Ignoring unreadable {self.kind} index {self.path}: {e}")
+            index, meta = create_ann_index(self.kind), {"generation": 0, "built_at": 0, "stale": True}
+        self._index, self._meta, self._meta_key, self._offset = index, meta, key, 0
+
+    def _replay(self):
+        try:
+            with open(self._journal_path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            change = json.loads(line.decode("utf-8"))
+            # Lines from a newer snapshot's journal are applied after restoring that snapshot
+            if change["generation"] != self._meta["generation"]:
+                continue
+            if change["op"] == "remove":
+                self._index.remove(change["id"])
+            else:
+                vectors = np.frombuffer(base64.b64decode(change["vectors"]), dtype='<f4').reshape(-1, EMBEDDING_DIM)
+                self._index.upsert(change["id"], vectors)
+        self._offset += end
+
+    def _write_snapshot(self):
+        """Persist the in-memory index as the next generation and start an empty journal (file lock held)."""
+        generation = (self._meta or {}).get("generation", 0) + 1
+        meta = {"kind": self.kind, "generation": generation, "built_at": time.time(), "embedding": embedding_config()}
+        self._index.save(self.path)
+        replace_atomically(self._journal_path, lambda f: None)
+        encoded = json.dumps(meta).encode("utf-8")
+        replace_atomically(self._meta_path, lambda f: f.write(encoded))
+        self._meta, self._meta_key, self._offset = meta, self._stored_key(), 0
+
+    def _record(self, changes):
+        """Append changes (op, employee_id, vectors) to the journal and apply them here."""
+        with file_lock(self.path):
+            self._sync(force=True, locked=True)
+            with self._lock:
+                if self._meta is None or self._meta.get("stale"):
+                    # Nothing to journal against yet; the startup load rebuilds from Mongo, which already has the change
+                    for op, employee_id, vectors in changes:
+                        self._apply(op, employee_id, vectors)
+                    return
+                lines = b"".join(encode_change(self._meta["generation"], op, employee_id, vectors) for op, employee_id, vectors in changes)
+                with open(self._journal_path, "ab") as f:
+                    f.write(lines)
+                for op, employee_id, vectors in changes:
+                    self._apply(op, employee_id, vectors)
+                self._offset += len(lines)
+                if self._offset > FACE_ANN_JOURNAL_MAX_BYTES:
+                    if self._index.needs_training():
+                        self._index.load(self._index.items())
+                    self._write_snapshot()
+
+    def _apply(self, op, employee_id, vectors):
+        if op == "remove":
+            self._index.remove(employee_id)
+        else:
+            self._index.upsert(employee_id, vectors)
+
+    def __len__(self):
+        self._sync()
+        return len(self._index)
+
+    def __contains__(self, employee_id):
+        self._sync()
+        return employee_id in self._index
+
+    def rows(self):
+        self._sync()
+        return self._index.rows()
+
+    def generation(self):
+        """Snapshot generation this worker is on, or None before one exists."""
+        self._sync()
+        return self._meta["generation"] if self._meta is not None else None
+
+    def upsert(self, employee_id, vectors):
+        self._record([("upsert", employee_id, normalize_templates(vectors))])
+
+    def upsert_many(self, items):
+        changes = [("upsert", employee_id, normalize_templates(vectors)) for employee_id, vectors in items]
+        if changes:
+            self._record(changes)
+
+    def remove(self, employee_id):
+        if employee_id not in self:
+            return False
+        self._record([("remove", employee_id, None)])
+        return True
+
+    def load(self, items):
+        """Rebuild from (employee_id, vectors) pairs and persist the result as a new snapshot."""
+        with file_lock(self.path):
+            self._sync(force=True, locked=True)
+            with self._lock:
+                index = create_ann_index(self.kind)
+                index.load(items)
+                self._index = index
+                self._write_snapshot()
+
+    def load_from(self, items_factory, max_age=FACE_INDEX_MAX_AGE_S):
+        """Restore the host's snapshot and journal, rebuilding from items_factory() only when missing or stale."""
+        with file_lock(self.path):
+            self._sync(force=True, locked=True)
+            meta = self._meta
+            if meta is not None and not meta.get("stale") and time.time() - meta["built_at"] < max_age:
+                print(f"Restored {self.kind} identification index {self.path} (generation {meta['generation']})")
+                return
+            with self._lock:
+                index = create_ann_index(self.kind)
+                index.load(items_factory())
+                self._index = index
+                self._write_snapshot()
+
+    def search(self, vector, k=1, scoring=FACE_TEMPLATE_SCORING):
+        self._sync()
+        with self._lock:
+            index = self._index
+        return index.search(vector, k, scoring)
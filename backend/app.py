@@ -3,56 +3,158 @@ from datetime import datetime
 from dotenv import load_dotenv
 import pymongo
 import certifi
-from PIL import Image
-import numpy as np
-import tensorflow as tf
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import io
-import base64
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
 import traceback
-import smtplib
 import random
+import time
 import json
-from email.mime.text import MIMEText
-from deepface import DeepFace
-import dlib
-import cv2
-from scipy.spatial import distance as dist
-from imutils import face_utils
 import re
+import hashlib
+import uuid
+import shutil
+import zipfile
+import tempfile
+import threading
+from embeddings import (
+    build_embedding_record,
+    decode_vector,
+    enable_batching,
+    batching_stats
+)
+from inference_scheduler import SchedulerBusy, SchedulerTimeout
+import model_registry
+from inference_pool import InferencePool, PoolBusy, InferenceTimeout, analyze_and_embed, embed_image
+from stream_verify import StreamSession, latest_frame
+from face_index import EmbeddingIndex, load_index_from_collection, match_result
+from mapped_index import MappedEmbeddingIndex, FACE_INDEX_MODE, FACE_INDEX_PATH
+from ann_index import SharedAnnIndex
+from face_templates import get_reference_templates, compare_templates, learn_from_checkin
+from email_outbox import EmailOutbox, OutboxFull
+from employee_cache import EmployeeCache
+from otp_store import MemoryOtpStore, MongoOtpStore, OTP_TTL_SECONDS
+from absent_sweep import mark_absent_for_date, AbsentSweeper
+from attendance_summary import AttendanceSummary
+from history_pages import page_size, fetch_page, stream_page
+from bulk_enroll import BulkEnrollment, EMPLOYEE_ID_COLLATION, read_roster, open_photos
+from face_store import FaceImageStore, normalize_face_image, FACE_MAX_SIDE
+from image_io import InvalidImage, ImageTooLarge, MAX_UPLOAD_BYTES, read_upload, open_image
+from werkzeug.exceptions import RequestEntityTooLarge
+import metrics
 
 # Load environment variables
 load_dotenv()
-print(f"Loaded EMAIL_SENDER: {os.getenv('EMAIL_SENDER')}")
-print(f"Loaded EMAIL_PASSWORD: {os.getenv('EMAIL_PASSWORD')}")
+print(f"Email sender configured: {bool(os.getenv('EMAIL_SENDER'))}")
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
+# Reject oversized uploads before they are buffered; leave room for the form fields
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 64 * 1024
+app.config['SOCK_SERVER_OPTIONS'] = {'max_message_size': MAX_UPLOAD_BYTES}
+# WebSocket routes; each open socket holds a worker thread, so run gunicorn with GUNICORN_THREADS > 1
+sock = Sock(app)
+
+# APP_ROLE splits the app so API and face workers can be scaled separately:
+#   all        every endpoint, with the face models in this process or its pool (default)
+#   api        everything except face matching; never imports TensorFlow, dlib or OpenCV
+#              and starts in well under a second
+#   inference  every endpoint with the face models; put it behind a proxy that sends
+#              FACE_ENDPOINTS here and everything else to api workers
+APP_ROLE = os.getenv('APP_ROLE', 'all')
+INFERENCE_ENABLED = APP_ROLE != 'api'
+FACE_ENDPOINTS = {'verify', 'verify_stream', 'identify', 'cnn_process', 'bulk_enroll'}
 
 # Directory for storing images
 IMAGE_DIR = 'images'
 os.makedirs(IMAGE_DIR, exist_ok=True)
 
-# Load dlib face detector and predictor
-detector = dlib.get_frontal_face_detector()
-predictor = dlib.shape_predictor("shape_predictor_68_face_landmarks.dat")
+# Micro-batch Facenet forward passes across concurrent requests. Only useful when
+# a worker serves requests concurrently (gunicorn --threads / GUNICORN_THREADS).
+batch_scheduler = None
+if INFERENCE_ENABLED and os.getenv('INFERENCE_BATCHING', '0') == '1':
+    batch_scheduler = enable_batching(
+        max_batch_size=int(os.getenv('BATCH_MAX_SIZE', '8')),
+        max_wait_ms=float(os.getenv('BATCH_MAX_WAIT_MS', '10')),
+        max_queue=int(os.getenv('BATCH_MAX_QUEUE', '256')),
+        timeout=float(os.getenv('BATCH_TIMEOUT_S', '5'))
+    )
+
+# Optionally run detection and Facenet in a pool of pre-warmed processes so the web
+# worker stays free for I/O-bound endpoints. INFERENCE_POOL_PROCESSES=0 runs inline.
+INFERENCE_POOL_PROCESSES = int(os.getenv('INFERENCE_POOL_PROCESSES', '0'))
+INFERENCE_RETRY_AFTER_S = int(os.getenv('INFERENCE_RETRY_AFTER_S', '1'))
+inference_pool = None
+if INFERENCE_ENABLED and INFERENCE_POOL_PROCESSES > 0:
+    inference_pool = InferencePool(
+        processes=INFERENCE_POOL_PROCESSES,
+        max_pending=int(os.getenv('INFERENCE_POOL_MAX_PENDING', '0')) or None,
+        threads_per_process=int(os.getenv('INFERENCE_POOL_THREADS', '0')) or None,
+        timeout=float(os.getenv('INFERENCE_TIMEOUT_S', '10'))
+    )
+
+# Load dlib face detector, predictor and Facenet once per process (or once in the
+# gunicorn master when MODEL_PRELOAD=1, so workers share the pages copy-on-write).
+# MODEL_LOAD_MODE=background lets the worker answer /api/ready while loading.
+# With an inference pool the models live only in the pool processes.
+MODEL_LOAD_MODE = os.getenv('MODEL_LOAD_MODE', 'eager')
+if not INFERENCE_ENABLED:
+    print("APP_ROLE=api: face models are not loaded in this worker")
+elif inference_pool is not None:
+    # A pool started in the gunicorn master would not survive the fork; workers start their own
+    if os.getenv('MODEL_PRELOAD', '0') != '1':
+        inference_pool.ensure_started()
+elif MODEL_LOAD_MODE == 'background':
+    model_registry.start_background_load()
+else:
+    try:
+        model_registry.ensure_ready()
+    except Exception:
+        print("Face models failed to load; face endpoints will report not ready")
 
 # MongoDB connection setup
 MONGO_URI = os.getenv('MONGO_URI')
 client = None
 employees_collection = None
 attendance_collection = None
+email_outbox_collection = None
+enrollment_jobs_collection = None
+face_store = None
+employee_cache = None
+attendance_summary = None
 
 # Email configuration
 EMAIL_SENDER = os.getenv('EMAIL_SENDER')
 EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
-
-# Temporary OTP storage
-otp_storage = {}
+SMTP_SERVER = os.getenv('SMTP_SERVER', "smtp.gmail.com")
+SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+# Set SMTP_USE_TLS=0 to point the outbox at a local SMTP stand-in
+SMTP_USE_TLS = os.getenv('SMTP_USE_TLS', '1') == '1'
+email_outbox = None
+
+# Roster plus photo archive accepted by /api/bulk-enroll
+BULK_ENROLL_MAX_BYTES = int(os.getenv('BULK_ENROLL_MAX_BYTES', str(512 * 1024 * 1024)))
+
+# Pending OTP verifications. OTP_STORE=mongo (the default) shares them across workers and
+# nodes; the in-memory store is used with OTP_STORE=memory or when Mongo is unavailable.
+otp_store = MemoryOtpStore(OTP_TTL_SECONDS, max_entries=int(os.getenv('OTP_MAX_PENDING', '10000')))
+# Staged registration photos outlive their OTP so a confirmation in the last second still finds them
+STAGED_IMAGE_TTL_SECONDS = OTP_TTL_SECONDS + 3600
+
+# 1:N identification index, kept in sync with enrollment writes. In mmap mode the
+# workers on a host share one index file instead of each holding a copy; ivf and
+# hnsw trade a little recall for sublinear search on very large galleries.
+if FACE_INDEX_MODE == 'mmap':
+    face_index = MappedEmbeddingIndex(FACE_INDEX_PATH)
+elif FACE_INDEX_MODE in ('ivf', 'hnsw'):
+    face_index = SharedAnnIndex(FACE_INDEX_MODE)
+else:
+    face_index = EmbeddingIndex()
+face_index_loaded = threading.Event()
+_startup_pid = None
+_startup_lock = threading.Lock()
 
 # Config file path for In Time threshold
 CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
@@ -70,68 +172,302 @@ def write_config(config):
     with open(CONFIG_PATH, 'w') as f:
         json.dump(config, f, indent=2)
 
-# MongoDB connection
-print("Attempting to connect to MongoDB Atlas")
+# Utility to read the time after which unmarked employees count as absent
+def absent_cutoff():
+    return datetime.strptime(read_config().get("absentCutoff", "14:00"), "%H:%M").time()
+
+# Utility to turn a YYYY-MM month into a date string range usable with the (employee_id, date) index
+def month_range(month):
+    if not re.match(r'^\d{4}-\d{2}$', month):
+        raise ValueError("Invalid month format. Use YYYY-MM")
+    year, mon = int(month[:4]), int(month[5:])
+    next_month = f"{year + 1}-01" if mon == 12 else f"{year}-{mon + 1:02d}"
+    return {"$gte": f"{month}-01", "$lt": f"{next_month}-01"}
+
+# Utility to compare an HH:MM:SS in-time with the In Time threshold; returns (late_time, late_minutes)
+def late_by(in_time_str):
+    in_time = datetime.strptime(in_time_str, "%H:%M:%S").time()
+    in_time_threshold = datetime.strptime(read_config()["inTimeThreshold"], "%H:%M").time()
+    if in_time <= in_time_threshold:
+        return None, 0
+    late_delta = datetime.combine(datetime.today(), in_time) - datetime.combine(datetime.today(), in_time_threshold)
+    hours, remainder = divmod(late_delta.seconds, 3600)
+    minutes = remainder // 60
+    return (f"{hours} hr {minutes} min" if hours > 0 else f"{minutes} min"), late_delta.seconds // 60
+
+def count_attendance(record, department=None):
+    """Add a newly inserted attendance record to the summary counters."""
+    try:
+        attendance_summary.record(record, department)
+    except Exception as e:
+        # The record itself is stored; rebuild_attendance_summary.py repairs the counters
+        print(f"Failed to update attendance summary for {record['employee_id']}: {e}")
+        traceback.print_exc()
+
+def sweep_absences(date):
+    """Mark everyone without a record on date absent and count the new absences."""
+    result = mark_absent_for_date(employees_collection, attendance_collection, date)
+    if result["employee_ids"]:
+        departments = {
+            e["employee_id"]: e.get("department")
+            for e in employees_collection.find({"employee_id": {"$in": result["employee_ids"]}}, {"_id": 0, "employee_id": 1, "department": 1})
+        }
+        try:
+            attendance_summary.record_absences(date, result["employee_ids"], departments)
+        except Exception as e:
+            print(f"Failed to update attendance summary for absences on {date}: {e}")
+            traceback.print_exc()
+    return result
+
+def ensure_indexes():
+    """Create the indexes the attendance queries rely on."""
+    try:
+        # One attendance record per employee per day
+        attendance_collection.create_index([("employee_id", 1), ("date", 1)], unique=True, name="employee_date")
+    except pymongo.errors.OperationFailure as e:
+        print(f"Could not create unique (employee_id, date) index, existing data has duplicates: {e}")
+        attendance_collection.create_index([("employee_id", 1), ("date", 1)], name="employee_date")
+    # Covers "who has a record on this date" for the absent sweep
+    attendance_collection.create_index([("date", 1), ("employee_id", 1)], name="date_employee")
+    # Serves paginated history (month ranges included) newest first without a scan or in-memory sort
+    attendance_collection.create_index([("employee_id", 1), ("date", -1), ("timestamp", -1)], name="employee_date_timestamp")
+    employees_collection.create_index([("employee_id", 1)], name="employee_id")
+    try:
+        # One employee per ID, ignoring case; also serves the bulk enrollment duplicate check
+        employees_collection.create_index([("employee_id", 1)], unique=True, collation=EMPLOYEE_ID_COLLATION, name="employee_id_ci")
+    except pymongo.errors.OperationFailure as e:
+        print(f"Could not create unique case-insensitive employee_id index, existing IDs differ only in case: {e}")
+        employees_collection.create_index([("employee_id", 1)], collation=EMPLOYEE_ID_COLLATION, name="employee_id_ci")
+    employees_collection.create_index([("email", 1)], name="email")
+    attendance_summary.ensure_indexes()
+    face_store.ensure_indexes()
+    if email_outbox is not None:
+        email_outbox.ensure_indexes()
+    if isinstance(otp_store, MongoOtpStore):
+        otp_store.ensure_indexes()
+
+# MongoDB connection. The client connects lazily, so importing the app never waits on
+# Atlas; indexes and the identification index are set up by run_startup_tasks.
 try:
-    client = pymongo.MongoClient(MONGO_URI, tls=True, tlsCAFile=certifi.where())
-    client.admin.command('ping')
+    client = pymongo.MongoClient(MONGO_URI, tls=True, tlsCAFile=certifi.where(), event_listeners=[metrics.MongoCommandListener()])
     db = client['frs_db']
     employees_collection = db['employees']
     attendance_collection = db['attendance']
-    print("Connected to MongoDB successfully")
+    email_outbox_collection = db['email_outbox']
+    enrollment_jobs_collection = db['enrollment_jobs']
+    face_store = FaceImageStore(db['face_images'])
+    # Hot employee fields, so repeated check-ins skip the Atlas round trip.
+    # EMPLOYEE_CACHE_WATCH=1 invalidates across workers via a change stream.
+    employee_cache = EmployeeCache(
+        employees_collection,
+        max_entries=int(os.getenv('EMPLOYEE_CACHE_SIZE', '2048')),
+        ttl_seconds=float(os.getenv('EMPLOYEE_CACHE_TTL_S', '300')),
+        watch=os.getenv('EMPLOYEE_CACHE_WATCH', '0') == '1'
+    )
+    # Counters kept up to date on every attendance write; see rebuild_attendance_summary.py
+    attendance_summary = AttendanceSummary(db['attendance_monthly'], db['attendance_calendar'])
+    if os.getenv('OTP_STORE', 'mongo') == 'mongo':
+        otp_store = MongoOtpStore(db['pending_verifications'], OTP_TTL_SECONDS)
+except Exception as e:
+    print(f"Failed to set up MongoDB client: {e}")
+    traceback.print_exc()
+
+# Emails are delivered by background workers; persisted in Mongo when it is available
+try:
+    email_outbox = EmailOutbox(
+        EMAIL_SENDER,
+        EMAIL_PASSWORD,
+        SMTP_SERVER,
+        SMTP_PORT,
+        use_tls=SMTP_USE_TLS,
+        collection=email_outbox_collection,
+        workers=int(os.getenv('EMAIL_WORKERS', '1')),
+        max_queue=int(os.getenv('EMAIL_MAX_QUEUE', '1000')),
+        retention_seconds=int(os.getenv('EMAIL_OUTBOX_RETENTION_DAYS', '7')) * 24 * 3600
+    )
 except Exception as e:
-    print(f"Failed to connect to MongoDB: {e}")
+    print(f"Failed to set up email outbox: {e}")
     traceback.print_exc()
 
+# Queue depths and index size, read at scrape time
+metrics.register_gauge("frs_email_outbox_queue_depth", "Emails waiting in this worker's outbox queue",
+                       lambda: email_outbox.stats()["queue_depth"] if email_outbox is not None else None)
+metrics.register_gauge("frs_inference_batch_queue_depth", "Faces waiting for a batched Facenet pass",
+                       lambda: (batching_stats() or {}).get("queue_depth"))
+metrics.register_gauge("frs_inference_pool_pending", "Inference jobs in flight in this worker's process pool",
+                       lambda: inference_pool.pending() if inference_pool is not None else None)
+metrics.register_gauge("frs_employee_cache_hit_rate", "Share of employee lookups served from this worker's cache",
+                       lambda: employee_cache.stats()["hit_rate"] if employee_cache is not None else None)
+metrics.register_gauge("frs_face_index_size", "Employees in the identification index", lambda: len(face_index))
+
+# Optional in-process sweep that marks everyone without a record absent at the cutoff
+absent_sweeper = None
+if os.getenv('ABSENT_SWEEP', '0') == '1' and attendance_collection is not None:
+    absent_sweeper = AbsentSweeper(sweep_absences, absent_cutoff)
+
 def send_email(to_email, subject, body):
-    """Send an email using SMTP with detailed debugging."""
-    if not EMAIL_SENDER or not EMAIL_PASSWORD:
-        raise ValueError("EMAIL_SENDER or EMAIL_PASSWORD not set in .env")
-    
-    try:
-        msg = MIMEText(body)
-        msg['Subject'] = subject
-        msg['From'] = EMAIL_SENDER
-        msg['To'] = to_email
-
-        print(f"Sending email to {to_email} from {EMAIL_SENDER}")
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.set_debuglevel(1)
-            server.starttls()
-            server.login(EMAIL_SENDER, EMAIL_PASSWORD)
-            server.send_message(msg)
-        print(f"Email sent successfully to {to_email}")
-    except smtplib.SMTPAuthenticationError as e:
-        print(f"SMTP Authentication Error: {e}")
-        traceback.print_exc()
-        raise Exception("Failed to authenticate with SMTP server.")
+    """Queue an email on the background outbox; delivery happens off the request path."""
+    if not EMAIL_SENDER:
+        raise ValueError("EMAIL_SENDER not set in .env")
+    if email_outbox is None:
+        raise Exception("Email outbox is not available")
+
+    email_outbox.enqueue(to_email, subject, body)
+    print(f"Queued email to {to_email}")
+
+def send_attendance_email(endpoint, employee, today, in_time_str, late_time):
+    """Notify an employee of a recorded check-in; the record is already written, so a full outbox only drops the email."""
+    try:
+        send_email(
+            employee['email'],
+            "Attendance Recorded - Face Recognition System",
+            f"Your attendance has been recorded on {today} at {in_time_str}." +
+            (f" You were {late_time} late." if late_time else "")
+        )
+    except OutboxFull as e:
+        metrics.email_enqueue_failures.inc(endpoint=endpoint)
+        print(f"Dropped attendance email to {employee['email']}: {e}")
+
+@app.before_request
+def start_request_timer():
+    """Remember when the request started for the latency histogram."""
+    request.environ['frs.start_time'] = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    """Record per-route latency; the route template keeps label cardinality bounded."""
+    start = request.environ.get('frs.start_time')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.http_request_duration.observe(time.perf_counter() - start, route=route, method=request.method, status=response.status_code)
+    return response
+
+def run_startup_tasks():
+    """Create indexes and fill the identification index, off the import path."""
+    start = time.perf_counter()
+    try:
+        ensure_indexes()
+        print(f"Connected to MongoDB, indexes ready in {time.perf_counter() - start:.2f}s")
     except Exception as e:
-        print(f"Failed to send email: {e}")
+        print(f"Failed to create MongoDB indexes: {e}")
         traceback.print_exc()
+    if INFERENCE_ENABLED:
+        try:
+            load_index_from_collection(face_index, employees_collection)
+            face_index_loaded.set()
+        except Exception as e:
+            print(f"Failed to load the identification index: {e}")
+            traceback.print_exc()
+
+@app.before_request
+def reject_face_endpoints():
+    """API-only workers answer face endpoints with 503 so a misrouted request fails fast."""
+    if not INFERENCE_ENABLED and request.endpoint in FACE_ENDPOINTS:
+        return jsonify({"success": False, "error": "Face recognition is served by the inference workers"}), 503
+
+@app.before_request
+def start_background_workers():
+    """Make sure this worker process runs its background threads (they don't survive a fork)."""
+    global _startup_pid
+    if employees_collection is not None and _startup_pid != os.getpid():
+        with _startup_lock:
+            if _startup_pid != os.getpid():
+                _startup_pid = os.getpid()
+                threading.Thread(target=run_startup_tasks, name="startup-tasks", daemon=True).start()
+    if email_outbox is not None:
+        email_outbox.ensure_started()
+    if absent_sweeper is not None:
+        absent_sweeper.ensure_started()
+    if inference_pool is not None:
+        inference_pool.ensure_started()
+    if batch_scheduler is not None:
+        batch_scheduler.start()
+    if employee_cache is not None:
+        employee_cache.ensure_started()
+
+def inference_ready():
+    """True once the models that serve face endpoints are loaded, in the pool or in this process."""
+    if inference_pool is not None:
+        return inference_pool.is_ready()
+    return model_registry.is_ready()
+
+def run_inference(func, *args):
+    """Run an inference function in the process pool when configured, otherwise inline."""
+    if not INFERENCE_ENABLED:
+        raise RuntimeError("Face inference is not available with APP_ROLE=api")
+    if inference_pool is not None:
+        return inference_pool.run(func, *args)
+    return func(*args)
+
+def count_inference_error(endpoint, func, *args):
+    """run_inference, counting exceptions raised by detection or embedding themselves
+    (a busy pool, a timeout or an undecodable upload is reported separately)."""
+    try:
+        return run_inference(func, *args)
+    except (PoolBusy, SchedulerBusy, InferenceTimeout, SchedulerTimeout, InvalidImage):
+        raise
+    except Exception:
+        metrics.inference_errors.inc(endpoint=endpoint)
         raise
 
+def analyze_frame(image, endpoint, min_eye_distance=10, box=None):
+    """Detect (or use the tracked box), align and embed a face; records per-stage timings for the endpoint."""
+    with metrics.stage(endpoint, 'inference'):
+        result = count_inference_error(endpoint, analyze_and_embed, image, min_eye_distance, box)
+    for name, seconds in result["timings"].items():
+        metrics.stage_duration.observe(seconds, endpoint=endpoint, stage=name)
+    if not result["quality"]["passed"]:
+        metrics.quality_rejections.inc(endpoint=endpoint, reason=result["quality"]["reason"])
+    return result
+
+def quality_response(analysis, endpoint):
+    """400 telling the kiosk why the frame was not usable (no face, blurry, turned away...)."""
+    quality = analysis["quality"]
+    metrics.record_outcome(endpoint, quality["reason"])
+    return jsonify({
+        "success": False,
+        "error": quality["message"],
+        "reason": quality["reason"],
+        "quality": quality["metrics"]
+    }), 400
+
+def check_face(face_image, endpoint, min_eye_distance=10):
+    """Analyze an uploaded face image."""
+    return analyze_frame(read_upload(face_image), endpoint, min_eye_distance)
+
+def image_error_response(e):
+    """400/413 for uploads that are not a usable image or exceed the size limits."""
+    if isinstance(e, RequestEntityTooLarge):
+        e = ImageTooLarge(f"Upload is larger than {MAX_UPLOAD_BYTES // 1024} KB")
+    return jsonify({"success": False, "error": str(e)}), e.status_code
+
+def reference_compute(endpoint):
+    """compute(image) for a missing reference embedding, run the same way the endpoint's check-ins are."""
+    return lambda image: count_inference_error(endpoint, embed_image, image)
+
+def learn_template(employee, employeeID, probe, similarities):
+    """Let a successful check-in refine the employee's templates; never fails the check-in."""
+    try:
+        templates = learn_from_checkin(employee, probe, similarities, employees_collection)
+        if templates is not None:
+            employee_cache.invalidate(employeeID)
+            face_index.upsert(employeeID, templates)
+            print(f"Face templates for {employeeID} updated ({len(templates)} total)")
+    except Exception as e:
+        print(f"Failed to update face templates for {employeeID}: {e}")
+        traceback.print_exc()
+
+def busy_response(endpoint):
+    """429 with Retry-After when this worker already has as much inference in flight as it accepts."""
+    metrics.record_outcome(endpoint, 'busy')
+    response = jsonify({"success": False, "error": "Face recognition is busy, please retry"})
+    response.headers['Retry-After'] = str(INFERENCE_RETRY_AFTER_S)
+    return response, 429
+
 def generate_otp():
     """Generate a 6-digit OTP."""
     return str(random.randint(100000, 999999))
 
-def calculate_eye_distance(image):
-    """Calculate the distance between eyes for face proximity check."""
-    try:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        rects = detector(gray, 1)
-        if len(rects) == 0:
-            return None
-        shape = predictor(gray, rects[0])
-        shape = face_utils.shape_to_np(shape)
-        left_eye = shape[36:42]
-        right_eye = shape[42:48]
-        left_eye_center = left_eye.mean(axis=0)
-        right_eye_center = right_eye.mean(axis=0)
-        return dist.euclidean(left_eye_center, right_eye_center)
-    except Exception as e:
-        print(f"Error calculating eye distance: {e}")
-        return None
-
 @app.route('/api/register', methods=['POST'])
 def register():
     """Register a new employee with email, name, department, and send OTP."""
@@ -150,33 +486,30 @@ def register():
         if not all([employeeID, email, employeeName, department, face_image]):
             return jsonify({"success": False, "error": "Missing required fields: employeeID, email, employeeName, department, faceImage"}), 400
 
-        if employees_collection.find_one({"employee_id": employeeID}):
+        if employees_collection.find_one({"employee_id": employeeID}, {"_id": 1}):
             print(f"Employee ID {employeeID} already exists")
             return jsonify({"success": False, "error": "Employee ID already exists"}), 400
 
-        if employees_collection.find_one({"email": email}):
+        if employees_collection.find_one({"email": email}, {"_id": 1}):
             print(f"Email {email} already registered")
             return jsonify({"success": False, "error": "Email already registered"}), 400
 
         if not re.match(r'^[^\s@]+@[^\s@]+\.[^\s@]+$', email):
             return jsonify({"success": False, "error": "Invalid email format"}), 400
 
-        image = Image.open(face_image)
-        frame = np.array(image)
-        image_path = os.path.join(IMAGE_DIR, f"{employeeID}.jpg")
-        image.save(image_path)
-        image_bytes = io.BytesIO()
-        image.save(image_bytes, format='JPEG')
-        image_base64 = base64.b64encode(image_bytes.getvalue()).decode('utf-8')
+        # Normalize the photo once and stage it; the pending entry only holds its id
+        image_data, image_size = normalize_face_image(open_image(read_upload(face_image), FACE_MAX_SIDE))
+        face_image_id = face_store.stage_normalized(image_data, image_size, STAGED_IMAGE_TTL_SECONDS)
 
         otp = generate_otp()
-        otp_storage[employeeID] = {
+        otp_store.put(employeeID, {
             "otp": otp,
+            "purpose": "register",
             "email": email,
             "employeeName": employeeName,
             "department": department,
-            "face_image": image_base64
-        }
+            "face_image_id": face_image_id
+        })
         send_email(
             email,
             "Verify Your Email - Face Recognition System",
@@ -185,6 +518,8 @@ def register():
 
         print(f"OTP sent to {email} for employeeID={employeeID}")
         return jsonify({"success": True, "message": "OTP sent to email for verification"}), 200
+    except (InvalidImage, RequestEntityTooLarge) as e:
+        return image_error_response(e)
     except Exception as e:
         print(f"Error in registration: {e}")
         traceback.print_exc()
@@ -206,21 +541,39 @@ def verify_otp():
         if not all([employeeID, otp, password]):
             return jsonify({"success": False, "error": "Missing required fields: employeeID, otp, password"}), 400
 
-        if employeeID not in otp_storage or otp_storage[employeeID]["otp"] != otp:
+        pending = otp_store.take(employeeID, otp, "register")
+        if not pending:
             print(f"Invalid OTP for employeeID={employeeID}")
             return jsonify({"success": False, "error": "Invalid OTP"}), 401
 
+        if not face_store.commit(pending["face_image_id"]):
+            return jsonify({"success": False, "error": "Registration expired, please register again"}), 410
         employee_data = {
             "employee_id": employeeID,
-            "email": otp_storage[employeeID]["email"],
-            "employee_name": otp_storage[employeeID]["employeeName"],
-            "department": otp_storage[employeeID]["department"],
+            "email": pending["email"],
+            "employee_name": pending["employeeName"],
+            "department": pending["department"],
             "password": password,
-            "face_image": otp_storage[employeeID]["face_image"],
+            "face_image_id": pending["face_image_id"],
             "created_at": datetime.now()
         }
-        employees_collection.insert_one(employee_data)
-        del otp_storage[employeeID]
+
+        # Precompute the reference embedding so check-ins only embed the probe image;
+        # API-only workers leave it to the first check-in on an inference worker
+        if INFERENCE_ENABLED:
+            try:
+                image_data = face_store.get_bytes(pending["face_image_id"])
+                employee_data["face_embedding"] = build_embedding_record(run_inference(embed_image, image_data))
+            except Exception as e:
+                print(f"Failed to compute embedding for {employeeID}, it will be computed on first check-in: {e}")
+        try:
+            employees_collection.insert_one(employee_data)
+        except pymongo.errors.DuplicateKeyError:
+            print(f"Employee ID {employeeID} already exists")
+            return jsonify({"success": False, "error": "Employee ID already exists"}), 400
+        employee_cache.invalidate(employeeID)
+        if "face_embedding" in employee_data:
+            face_index.upsert(employeeID, decode_vector(employee_data["face_embedding"]))
 
         print(f"Employee {employeeID} registered successfully")
         return jsonify({"success": True, "message": "User registered successfully"}), 201
@@ -229,6 +582,111 @@ def verify_otp():
         traceback.print_exc()
         return jsonify({"success": False, "error": str(e)}), 500
 
+def run_enrollment_job(job_id, work_dir, roster_path, photos_path, dry_run):
+    """Background thread body for /api/bulk-enroll; progress and the final report go to the job document."""
+    # Index additions are applied once per chunk, so a shared index file is rewritten per chunk, not per row
+    enrolled = []
+
+    def flush_enrolled():
+        face_index.upsert_many(enrolled)
+        enrolled.clear()
+
+    def progress(report):
+        flush_enrolled()
+        enrollment_jobs_collection.update_one(
+            {"_id": job_id},
+            {"$set": {"rows": report["rows"], "enrolled": report["enrolled"], "rejected": report["rejected"]}}
+        )
+
+    try:
+        enrollment = BulkEnrollment(
+            employees_collection,
+            face_store,
+            dry_run=dry_run,
+            on_enrolled=lambda employee_id, vector: enrolled.append((employee_id, vector)),
+            on_progress=progress
+        )
+        report = enrollment.run(read_roster(roster_path), open_photos(photos_path))
+        flush_enrolled()
+        enrollment_jobs_collection.update_one({"_id": job_id}, {"$set": dict(report, status="done", finished_at=datetime.now())})
+        print(f"Bulk enrollment {job_id}: {report['enrolled']} of {report['rows']} rows enrolled, {report['rejected']} rejected in {report['seconds']}s")
+    except Exception as e:
+        print(f"Bulk enrollment {job_id} failed: {e}")
+        traceback.print_exc()
+        enrollment_jobs_collection.update_one({"_id": job_id}, {"$set": {"status": "failed", "error": str(e), "finished_at": datetime.now()}})
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+@app.route('/api/bulk-enroll', methods=['POST'])
+def bulk_enroll():
+    """Start enrolling a roster (.xlsx/.csv) with a zip of photos named by employee ID; returns a job id to poll."""
+    if employees_collection is None:
+        return jsonify({"success": False, "error": "Database connection not established"}), 500
+
+    work_dir = None
+    try:
+        # Rosters come with a whole batch of photos, far above the single-image limit
+        request.max_content_length = BULK_ENROLL_MAX_BYTES
+        roster = request.files.get('roster')
+        photos = request.files.get('photos')
+        dry_run = request.form.get('dryRun', 'false').lower() in ('1', 'true')
+
+        if not roster or not photos:
+            return jsonify({"success": False, "error": "Missing required fields: roster, photos"}), 400
+        roster_ext = os.path.splitext(roster.filename or '')[1].lower()
+        if roster_ext not in ('.xlsx', '.csv'):
+            return jsonify({"success": False, "error": "Roster must be an .xlsx or .csv file"}), 400
+
+        work_dir = tempfile.mkdtemp(prefix="bulk-enroll-")
+        roster_path = os.path.join(work_dir, "roster" + roster_ext)
+        photos_path = os.path.join(work_dir, "photos.zip")
+        roster.save(roster_path)
+        photos.save(photos_path)
+        if not zipfile.is_zipfile(photos_path):
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return jsonify({"success": False, "error": "Photos must be a .zip archive"}), 400
+
+        job_id = uuid.uuid4().hex
+        enrollment_jobs_collection.insert_one({
+            "_id": job_id,
+            "status": "running",
+            "roster": roster.filename,
+            "dry_run": dry_run,
+            "rows": 0,
+            "enrolled": 0,
+            "rejected": 0,
+            "created_at": datetime.now()
+        })
+        threading.Thread(
+            target=run_enrollment_job,
+            args=(job_id, work_dir, roster_path, photos_path, dry_run),
+            name=f"bulk-enroll-{job_id[:8]}",
+            daemon=True
+        ).start()
+
+        print(f"Started bulk enrollment {job_id} for {roster.filename}")
+        return jsonify({"success": True, "jobId": job_id, "message": "Bulk enrollment started"}), 202
+    except RequestEntityTooLarge:
+        return jsonify({"success": False, "error": f"Upload is larger than {BULK_ENROLL_MAX_BYTES // (1024 * 1024)} MB"}), 413
+    except Exception as e:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        print(f"Error starting bulk enrollment: {e}")
+        traceback.print_exc()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/bulk-enroll/<job_id>', methods=['GET'])
+def bulk_enroll_status(job_id):
+    """Progress of a bulk enrollment job, with the per-row reject report once it is done."""
+    if enrollment_jobs_collection is None:
+        return jsonify({"success": False, "error": "Database connection not established"}), 500
+
+    job = enrollment_jobs_collection.find_one({"_id": job_id})
+    if not job:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    job["jobId"] = job.pop("_id")
+    return jsonify({"success": True, "job": job}), 200
+
 @app.route('/api/send-update-otp', methods=['POST'])
 def send_update_otp():
     """Send OTP to employee email for updating details."""
@@ -242,12 +700,12 @@ def send_update_otp():
         if not all([employeeID, email]):
             return jsonify({"success": False, "error": "Missing required fields: employeeID, email"}), 400
 
-        employee = employees_collection.find_one({"employee_id": employeeID, "email": email})
-        if not employee:
+        employee = employee_cache.get(employeeID)
+        if not employee or employee.get('email') != email:
             return jsonify({"success": False, "error": "Employee not found or email mismatch"}), 404
 
         otp = generate_otp()
-        otp_storage[employeeID] = {"otp": otp, "email": email, "update_mode": True}
+        otp_store.put(employeeID, {"otp": otp, "purpose": "update", "email": email})
         send_email(
             email,
             "Update Your Details - Face Recognition System",
@@ -278,7 +736,7 @@ def update_employee():
         if not all([employeeID, otp, employeeName, email, department]):
             return jsonify({"success": False, "error": "Missing required fields"}), 400
 
-        if employeeID not in otp_storage or otp_storage[employeeID]["otp"] != otp or not otp_storage[employeeID].get("update_mode"):
+        if not otp_store.take(employeeID, otp, "update"):
             print(f"Invalid OTP for employeeID={employeeID}")
             return jsonify({"success": False, "error": "Invalid OTP or not in update mode"}), 401
 
@@ -287,20 +745,30 @@ def update_employee():
             "email": email,
             "department": department
         }
+        update = {"$set": update_data}
         if face_image:
-            image = Image.open(face_image)
-            image_path = os.path.join(IMAGE_DIR, f"{employeeID}.jpg")
-            image.save(image_path)
-            image_bytes = io.BytesIO()
-            image.save(image_bytes, format='JPEG')
-            image_base64 = base64.b64encode(image_bytes.getvalue()).decode('utf-8')
-            update_data["face_image"] = image_base64
+            image_data, image_size = normalize_face_image(open_image(read_upload(face_image), FACE_MAX_SIDE))
+            update_data["face_image_id"] = face_store.put_normalized(image_data, image_size)
+            # A new photo is a fresh enrollment, so templates learned from the old one go
+            if INFERENCE_ENABLED:
+                update_data["face_embedding"] = build_embedding_record(run_inference(embed_image, image_data))
+                update["$unset"] = {"face_image": "", "face_templates": ""}
+            else:
+                # Recomputed from the new image on the next check-in
+                update["$unset"] = {"face_image": "", "face_embedding": "", "face_templates": ""}
 
-        employees_collection.update_one({"employee_id": employeeID}, {"$set": update_data})
-        del otp_storage[employeeID]
+        employees_collection.update_one({"employee_id": employeeID}, update)
+        employee_cache.invalidate(employeeID)
+        attendance_summary.set_department(employeeID, department, datetime.now().strftime("%Y-%m"))
+        if "face_embedding" in update_data:
+            face_index.upsert(employeeID, decode_vector(update_data["face_embedding"]))
+        elif face_image:
+            face_index.remove(employeeID)
 
         print(f"Employee {employeeID} updated successfully")
         return jsonify({"success": True, "message": "Employee details updated successfully"}), 200
+    except (InvalidImage, RequestEntityTooLarge) as e:
+        return image_error_response(e)
     except Exception as e:
         print(f"Error updating employee: {e}")
         traceback.print_exc()
@@ -321,8 +789,9 @@ def login():
         if not all([employeeID, password]):
             return jsonify({"success": False, "error": "Missing required fields: employeeID, password"}), 400
 
-        employee = employees_collection.find_one({"employee_id": employeeID})
-        if employee and employee['password'] == password:
+        # Read from Mongo, not the employee cache, so a password reset applies on every worker at once
+        employee = employees_collection.find_one({"employee_id": employeeID}, {"_id": 0, "employee_name": 1, "password": 1})
+        if employee and employee.get('password') == password:
             employee_name = employee.get('employee_name', 'Unknown')
             print(f"Login successful for {employeeID}, name: {employee_name}")
             return jsonify({
@@ -348,12 +817,12 @@ def send_forgot_password_otp():
         if not email:
             return jsonify({"success": False, "error": "Missing email"}), 400
 
-        employee = employees_collection.find_one({"email": email})
+        employee = employees_collection.find_one({"email": email}, {"_id": 0, "employee_id": 1})
         if not employee:
             return jsonify({"success": False, "error": "Email not registered"}), 404
 
         otp = generate_otp()
-        otp_storage[employee['employee_id']] = {"otp": otp, "email": email, "forgot_password": True}
+        otp_store.put(employee['employee_id'], {"otp": otp, "purpose": "forgot_password", "email": email})
         send_email(
             email,
             "Reset Your Password - Face Recognition System",
@@ -381,17 +850,17 @@ def reset_password():
         if not all([email, otp, new_password]):
             return jsonify({"success": False, "error": "Missing required fields: email, otp, password"}), 400
 
-        employee = employees_collection.find_one({"email": email})
+        employee = employees_collection.find_one({"email": email}, {"_id": 0, "employee_id": 1})
         if not employee:
             return jsonify({"success": False, "error": "Email not registered"}), 404
 
         employee_id = employee['employee_id']
-        if employee_id not in otp_storage or otp_storage[employee_id]["otp"] != otp or not otp_storage[employee_id].get("forgot_password"):
+        if not otp_store.take(employee_id, otp, "forgot_password"):
             print(f"Invalid OTP for employeeID={employee_id}")
             return jsonify({"success": False, "error": "Invalid OTP"}), 401
 
         employees_collection.update_one({"employee_id": employee_id}, {"$set": {"password": new_password}})
-        del otp_storage[employee_id]
+        employee_cache.invalidate(employee_id)
 
         print(f"Password reset successfully for employeeID={employee_id}")
         return jsonify({"success": True, "message": "Password reset successfully"}), 200
@@ -424,11 +893,66 @@ def update_in_time():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+def mark_attendance(employee, employeeID, in_time_str, similarity_score, endpoint):
+    """Record today's attendance for a verified face and notify the employee; returns (body, status)."""
+    today = datetime.now().strftime("%Y-%m-%d")
+    existing_record = attendance_collection.find_one({"employee_id": employeeID, "date": today})
+    if existing_record:
+        metrics.record_outcome(endpoint, 'already_marked', similarity_score)
+        return {
+            "success": False,
+            "message": "Attendance already marked for today",
+            "inTime": existing_record.get("in_time", existing_record.get("time", "N/A"))
+        }, 200
+
+    # Calculate late time based on inTimeThreshold
+    late_time, late_minutes = late_by(in_time_str)
+
+    # Store attendance record
+    attendance_record = {
+        "employee_id": employeeID,
+        "date": today,
+        "in_time": in_time_str,
+        "status": "present",
+        "timestamp": datetime.now(),
+        "late_time": late_time,
+        "late_minutes": late_minutes
+    }
+    try:
+        with metrics.stage(endpoint, 'attendance_write'):
+            attendance_collection.insert_one(attendance_record)
+    except pymongo.errors.DuplicateKeyError:
+        # Another request (or the absent sweep) recorded today first
+        metrics.record_outcome(endpoint, 'already_marked', similarity_score)
+        existing_record = attendance_collection.find_one({"employee_id": employeeID, "date": today})
+        return {
+            "success": False,
+            "message": "Attendance already marked for today",
+            "inTime": existing_record.get("in_time", existing_record.get("time", "N/A"))
+        }, 200
+    count_attendance(attendance_record, employee.get('department'))
+
+    # Send email notification
+    with metrics.stage(endpoint, 'email_enqueue'):
+        send_attendance_email(endpoint, employee, today, in_time_str, late_time)
+
+    metrics.record_outcome(endpoint, 'verified', similarity_score)
+    response = {
+        "success": True,
+        "message": "Attendance recorded successfully",
+        "inTime": in_time_str
+    }
+    if late_time:
+        response["lateTime"] = late_time
+    return response, 200
+
 @app.route('/api/verify', methods=['POST'])
 def verify():
     """Verify employee face and mark attendance with in-time and late-time calculation based on In Time threshold."""
     if employees_collection is None or attendance_collection is None:
         return jsonify({"success": False, "error": "Database connection not established"}), 500
+    if not inference_ready():
+        return jsonify({"success": False, "error": "Face recognition models are still loading"}), 503
 
     try:
         face_image = request.files.get('faceImage')
@@ -438,97 +962,196 @@ def verify():
         if not face_image or not employeeID or not in_time_str:
             return jsonify({"success": False, "error": "Missing required fields: faceImage, employeeID, inTime"}), 400
 
-        captured_image = Image.open(face_image)
-        captured_image = np.array(captured_image)
-        eye_distance = calculate_eye_distance(captured_image)
-        if eye_distance is None or eye_distance < 10:
-            print(f"Face too far or not detected for {employeeID} (eye distance: {eye_distance})")
-            return jsonify({"success": False, "error": "Face is too far from the camera or not detected"}), 400
+        analysis = check_face(face_image, 'verify')
+        if analysis["embedding"] is None:
+            print(f"Frame rejected for {employeeID}: {analysis['quality']['reason']} {analysis['quality']['metrics']}")
+            return quality_response(analysis, 'verify')
 
-        employee = employees_collection.find_one({"employee_id": employeeID})
+        with metrics.stage('verify', 'employee_lookup'):
+            employee = employee_cache.get(employeeID)
         if not employee:
+            metrics.record_outcome('verify', 'not_found')
             return jsonify({"success": False, "error": f"No reference image found for employee ID {employeeID}"}), 404
 
-        reference_image_base64 = employee['face_image']
-        reference_image_bytes = io.BytesIO(base64.b64decode(reference_image_base64))
-        reference_image = Image.open(reference_image_bytes)
-        reference_image = np.array(reference_image)
-
-        verification_result = DeepFace.verify(
-            img1_path=captured_image,
-            img2_path=reference_image,
-            model_name='Facenet',
-            enforce_detection=False
-        )
+        with metrics.stage('verify', 'reference_embedding'):
+            reference_templates = get_reference_templates(employee, employees_collection, face_store, compute=reference_compute('verify'))
+        if employeeID not in face_index:
+            face_index.upsert(employeeID, reference_templates)
+        verification_result = compare_templates(analysis["embedding"], reference_templates)
         similarity_score = (1 - verification_result["distance"]) * 100
-        print(f"Verification result for {employeeID}: {similarity_score:.2f}%")
+        print(f"Verification result for {employeeID}: {similarity_score:.2f}% over {len(reference_templates)} templates")
 
         if verification_result["verified"] and similarity_score >= 70:
-            today = datetime.now().strftime("%Y-%m-%d")
-            existing_record = attendance_collection.find_one({"employee_id": employeeID, "date": today})
-            if existing_record:
-                return jsonify({
-                    "success": False,
-                    "message": "Attendance already marked for today",
-                    "inTime": existing_record.get("in_time", existing_record.get("time", "N/A"))
-                }), 200
-
-            # Parse in-time and calculate late time based on inTimeThreshold
-            in_time = datetime.strptime(in_time_str, "%H:%M:%S").time()
-            config = read_config()
-            in_time_threshold = datetime.strptime(config["inTimeThreshold"], "%H:%M").time()
-            late_time = None
-            if in_time > in_time_threshold:
-                in_datetime = datetime.combine(datetime.today(), in_time)
-                threshold_datetime = datetime.combine(datetime.today(), in_time_threshold)
-                late_delta = in_datetime - threshold_datetime
-                hours, remainder = divmod(late_delta.seconds, 3600)
-                minutes = remainder // 60
-                late_time = f"{hours} hr {minutes} min" if hours > 0 else f"{minutes} min"
-
-            # Store attendance record
-            attendance_record = {
-                "employee_id": employeeID,
-                "date": today,
-                "in_time": in_time_str,
-                "status": "present",
-                "timestamp": datetime.now(),
-                "late_time": late_time if late_time else None
-            }
-            attendance_collection.insert_one(attendance_record)
-
-            # Send email notification
-            send_email(
-                employee['email'],
-                "Attendance Recorded - Face Recognition System",
-                f"Your attendance has been recorded on {today} at {in_time_str}." +
-                (f" You were {late_time} late." if late_time else "")
-            )
-
-            response = {
-                "success": True,
-                "message": "Attendance recorded successfully",
-                "inTime": in_time_str
-            }
-            if late_time:
-                response["lateTime"] = late_time
-            return jsonify(response), 200
+            body, status = mark_attendance(employee, employeeID, in_time_str, similarity_score, 'verify')
+            # Only a check-in that recorded today's attendance teaches a template, not repeat attempts
+            if status == 200 and body["success"]:
+                learn_template(employee, employeeID, analysis["embedding"], verification_result["similarities"])
+            return jsonify(body), status
         else:
+            metrics.record_outcome('verify', 'rejected', similarity_score)
             return jsonify({
                 "success": False,
                 "message": "Verification failed - face not recognized or similarity too low",
                 "similarity_score": similarity_score
             }), 401
+    except (PoolBusy, SchedulerBusy) as e:
+        print(f"Inference backlog in verification: {e}")
+        return busy_response('verify')
+    except (InferenceTimeout, SchedulerTimeout) as e:
+        metrics.record_outcome('verify', 'timeout')
+        print(f"Inference timed out in verification: {e}")
+        return jsonify({"success": False, "error": "Server is busy, please try again"}), 503
+    except (InvalidImage, RequestEntityTooLarge) as e:
+        metrics.record_outcome('verify', 'invalid_image')
+        return image_error_response(e)
     except Exception as e:
+        metrics.record_outcome('verify', 'error')
         print(f"Error in verification: {e}")
         traceback.print_exc()
         return jsonify({"success": False, "error": str(e)}), 500
 
+@sock.route('/api/verify-stream')
+def verify_stream(ws):
+    """Streaming check-in: the kiosk sends {employeeID, inTime} as text, then JPEG frames as binary
+    messages. The face is tracked across frames and evidence accumulates until a confident decision."""
+    def send(message):
+        ws.send(json.dumps(message))
+
+    def finish(body, status):
+        send({"type": "result", "status": status, **body})
+
+    if employees_collection is None or attendance_collection is None:
+        return finish({"success": False, "error": "Database connection not established"}, 500)
+    if not inference_ready():
+        return finish({"success": False, "error": "Face recognition models are still loading"}, 503)
+
+    try:
+        start = json.loads(ws.receive(timeout=10) or "{}")
+        employeeID = start.get('employeeID')
+        in_time_str = start.get('inTime')
+        if not employeeID or not in_time_str:
+            return finish({"success": False, "error": "Missing required fields: employeeID, inTime"}, 400)
+
+        employee = employee_cache.get(employeeID)
+        if not employee:
+            metrics.record_outcome('verify_stream', 'not_found')
+            return finish({"success": False, "error": f"No reference image found for employee ID {employeeID}"}, 404)
+        reference_templates = get_reference_templates(employee, employees_collection, face_store, compute=reference_compute('verify_stream'))
+
+        # Inline inference reuses the frame already decoded for tracking; the pool gets the smaller JPEG bytes
+        session = StreamSession(
+            reference_templates,
+            lambda image, data, box: analyze_frame(data if inference_pool is not None else image, 'verify_stream', box=box)
+        )
+        send({"type": "ready", "maxFrames": session.max_frames, "maxSeconds": session.max_seconds})
+
+        event = None
+        while event is None or event["type"] != "decision":
+            frame, skipped = latest_frame(ws, session.remaining_seconds())
+            if frame is None:
+                event = session.finish()
+                break
+            event = session.process(frame, skipped)
+            if event["type"] == "progress":
+                send(event)
+
+        print(f"Stream verification for {employeeID}: {event}")
+        similarity_score = event["similarity_score"]
+        stream_stats = {key: event[key] for key in ("frames", "skipped", "detections", "elapsed_ms")}
+        if event["verified"]:
+            body, status = mark_attendance(employee, employeeID, in_time_str, similarity_score, 'verify_stream')
+            if status == 200 and body["success"] and session.best_probe is not None:
+                learn_template(employee, employeeID, *session.best_probe)
+            return finish({**body, **stream_stats}, status)
+        metrics.record_outcome('verify_stream', 'rejected', similarity_score)
+        return finish({
+            "success": False,
+            "message": "Verification failed - face not recognized or similarity too low",
+            "similarity_score": similarity_score,
+            **stream_stats
+        }, 401)
+    except ConnectionClosed:
+        metrics.record_outcome('verify_stream', 'disconnected')
+    except (PoolBusy, SchedulerBusy) as e:
+        print(f"Inference backlog in stream verification: {e}")
+        metrics.record_outcome('verify_stream', 'busy')
+        return finish({"success": False, "error": "Face recognition is busy, please retry", "retryAfter": INFERENCE_RETRY_AFTER_S}, 429)
+    except (InferenceTimeout, SchedulerTimeout) as e:
+        metrics.record_outcome('verify_stream', 'timeout')
+        print(f"Inference timed out in stream verification: {e}")
+        return finish({"success": False, "error": "Server is busy, please try again"}, 503)
+    except InvalidImage as e:
+        metrics.record_outcome('verify_stream', 'invalid_image')
+        return finish({"success": False, "error": str(e)}, e.status_code)
+    except Exception as e:
+        metrics.record_outcome('verify_stream', 'error')
+        print(f"Error in stream verification: {e}")
+        traceback.print_exc()
+        return finish({"success": False, "error": str(e)}, 500)
+
+@app.route('/api/identify', methods=['POST'])
+def identify():
+    """Identify an employee from a face image alone (1:N search over enrolled embeddings)."""
+    if employees_collection is None:
+        return jsonify({"success": False, "error": "Database connection not established"}), 500
+    if not inference_ready():
+        return jsonify({"success": False, "error": "Face recognition models are still loading"}), 503
+    if not face_index_loaded.is_set():
+        return jsonify({"success": False, "error": "Identification index is still loading"}), 503
+
+    try:
+        face_image = request.files.get('faceImage')
+        if not face_image:
+            return jsonify({"success": False, "error": "Missing required field: faceImage"}), 400
+        top_k = min(max(int(request.form.get('topK', 1)), 1), 10)
+
+        analysis = check_face(face_image, 'identify')
+        if analysis["embedding"] is None:
+            return quality_response(analysis, 'identify')
+
+        with metrics.stage('identify', 'index_search'):
+            matches = [match_result(employee_id, similarity) for employee_id, similarity in face_index.search(analysis["embedding"], top_k)]
+
+        names = {
+            e["employee_id"]: e.get("employee_name", "Unknown")
+            for e in employees_collection.find(
+                {"employee_id": {"$in": [m["employeeID"] for m in matches]}},
+                {"_id": 0, "employee_id": 1, "employee_name": 1}
+            )
+        } if matches else {}
+        for match in matches:
+            match["employeeName"] = names.get(match["employeeID"], "Unknown")
+
+        best = matches[0] if matches else None
+        if best and best["verified"] and best["similarity_score"] >= 70:
+            metrics.record_outcome('identify', 'verified', best["similarity_score"])
+            print(f"Identified {best['employeeID']} ({best['similarity_score']:.2f}%)")
+            return jsonify({"success": True, "employeeID": best["employeeID"], "employeeName": best["employeeName"], "matches": matches}), 200
+        metrics.record_outcome('identify', 'rejected', best["similarity_score"] if best else None)
+        return jsonify({"success": False, "message": "No enrolled employee matches this face", "matches": matches}), 404
+    except (PoolBusy, SchedulerBusy) as e:
+        print(f"Inference backlog in identification: {e}")
+        return busy_response('identify')
+    except (InferenceTimeout, SchedulerTimeout) as e:
+        metrics.record_outcome('identify', 'timeout')
+        print(f"Inference timed out in identification: {e}")
+        return jsonify({"success": False, "error": "Server is busy, please try again"}), 503
+    except (InvalidImage, RequestEntityTooLarge) as e:
+        metrics.record_outcome('identify', 'invalid_image')
+        return image_error_response(e)
+    except Exception as e:
+        metrics.record_outcome('identify', 'error')
+        print(f"Error in identification: {e}")
+        traceback.print_exc()
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/api/cnn_process', methods=['POST'])
 def cnn_process():
     """Alternative face verification endpoint with in-time and late-time based on In Time threshold."""
     if employees_collection is None or attendance_collection is None:
         return jsonify({"success": False, "error": "Database connection not established"}), 500
+    if not inference_ready():
+        return jsonify({"error": "Face recognition models are still loading"}), 503
 
     try:
         employeeID = request.form.get('employeeID')
@@ -541,68 +1164,73 @@ def cnn_process():
         if not all([employeeID, password, face_image]):
             return jsonify({"error": "Missing required fields"}), 400
 
-        employee = employees_collection.find_one({"employee_id": employeeID, "password": password})
+        # The password is checked against Mongo (the cache never holds it); the rest comes from the cache
+        employee = None
+        if employees_collection.find_one({"employee_id": employeeID, "password": password}, {"_id": 1}):
+            employee = employee_cache.get(employeeID)
         if not employee:
             image_path = os.path.join(IMAGE_DIR, f"{employeeID}.jpg")
             if os.path.exists(image_path):
-                reference_image = Image.open(image_path)
-                reference_image = np.array(reference_image)
+                with open(image_path, 'rb') as f:
+                    reference_embedding = count_inference_error('cnn_process', embed_image, f.read(), True)
             else:
                 return jsonify({"error": f"No reference image found for employee ID {employeeID}"}), 404
         else:
-            reference_image_base64 = employee['face_image']
-            reference_image = Image.open(io.BytesIO(base64.b64decode(reference_image_base64)))
-            reference_image = np.array(reference_image)
-
-        captured_image = Image.open(face_image)
-        captured_image = np.array(captured_image)
+            reference_embedding = get_reference_templates(employee, employees_collection, face_store, compute=reference_compute('cnn_process'))
 
-        verification_result = DeepFace.verify(img1_path=captured_image, img2_path=reference_image, model_name='Facenet', enforce_detection=True)
+        analysis = check_face(face_image, 'cnn_process', min_eye_distance=0)
+        if analysis["embedding"] is None:
+            return quality_response(analysis, 'cnn_process')
+        verification_result = compare_templates(analysis["embedding"], reference_embedding)
         similarity_score = (1 - verification_result["distance"]) * 100
         print(f"CNN process result for {employeeID}: {similarity_score:.2f}%")
 
         if verification_result["verified"] and similarity_score >= 80:
             today = datetime.now().strftime("%Y-%m-%d")
-            in_time = datetime.strptime(in_time_str, "%H:%M:%S").time()
-            config = read_config()
-            in_time_threshold = datetime.strptime(config["inTimeThreshold"], "%H:%M").time()
-            late_time = None
-            if in_time > in_time_threshold:
-                in_datetime = datetime.combine(datetime.today(), in_time)
-                threshold_datetime = datetime.combine(datetime.today(), in_time_threshold)
-                late_delta = in_datetime - threshold_datetime
-                hours, remainder = divmod(late_delta.seconds, 3600)
-                minutes = remainder // 60
-                late_time = f"{hours} hr {minutes} min" if hours > 0 else f"{minutes} min"
-
-            attendance_collection.insert_one({
+            late_time, late_minutes = late_by(in_time_str)
+            attendance_record = {
                 "employee_id": employeeID,
                 "date": today,
                 "in_time": in_time_str,
                 "timestamp": datetime.now(),
                 "status": "present",
-                "late_time": late_time
-            })
-            send_email(
-                employee['email'],
-                "Attendance Recorded - Face Recognition System",
-                f"Your attendance has been recorded on {today} at {in_time_str}." +
-                (f" You were {late_time} late." if late_time else "")
-            )
+                "late_time": late_time,
+                "late_minutes": late_minutes
+            }
+            try:
+                attendance_collection.insert_one(attendance_record)
+            except pymongo.errors.DuplicateKeyError:
+                metrics.record_outcome('cnn_process', 'already_marked', similarity_score)
+                return jsonify({"message": "Attendance already marked for today", "success": False}), 200
+            count_attendance(attendance_record, employee.get('department') if employee else None)
+            metrics.record_outcome('cnn_process', 'verified', similarity_score)
+            send_attendance_email('cnn_process', employee, today, in_time_str, late_time)
             response = {"message": "Verification successful", "success": True, "inTime": in_time_str}
             if late_time:
                 response["lateTime"] = late_time
             return jsonify(response), 200
         else:
+            metrics.record_outcome('cnn_process', 'rejected', similarity_score)
             return jsonify({"message": "Verification failed", "success": False}), 401
+    except (PoolBusy, SchedulerBusy) as e:
+        print(f"Inference backlog in CNN process: {e}")
+        return busy_response('cnn_process')
+    except (InferenceTimeout, SchedulerTimeout) as e:
+        metrics.record_outcome('cnn_process', 'timeout')
+        print(f"Inference timed out in CNN process: {e}")
+        return jsonify({"error": "Server is busy, please try again"}), 503
+    except (InvalidImage, RequestEntityTooLarge) as e:
+        metrics.record_outcome('cnn_process', 'invalid_image')
+        return image_error_response(e)
     except Exception as e:
+        metrics.record_outcome('cnn_process', 'error')
         print(f"Error in CNN process: {e}")
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/mark_absent', methods=['POST'])
 def mark_absent():
-    """Mark an employee as absent for today if no attendance before 12 PM."""
+    """Mark an employee as absent for today if no attendance before the absent cutoff."""
     if attendance_collection is None or employees_collection is None:
         return jsonify({"success": False, "error": "Database connection not established"}), 500
 
@@ -619,25 +1247,89 @@ def mark_absent():
             return jsonify({"success": False, "message": "Attendance already marked today"}), 400
 
         now = datetime.now()
-        if now.hour >= 14:  # After 12 PM
-            attendance_collection.insert_one({
+        if now.time() >= absent_cutoff():
+            attendance_record = {
                 "employee_id": employeeID,
                 "date": today,
                 "in_time": "Absent",
                 "timestamp": now,
                 "status": "absent",
                 "late_time": None
-            })
+            }
+            try:
+                attendance_collection.insert_one(attendance_record)
+            except pymongo.errors.DuplicateKeyError:
+                return jsonify({"success": False, "message": "Attendance already marked today"}), 400
+            employee = employee_cache.get(employeeID)
+            count_attendance(attendance_record, employee.get('department') if employee else None)
             print(f"Marked {employeeID} as absent for {today}")
             return jsonify({"success": True, "message": "Marked as absent"}), 200
         
-        print(f"Too early to mark absent for {employeeID} (before 12 PM)")
+        print(f"Too early to mark absent for {employeeID} (before cutoff)")
         return jsonify({"success": False, "message": "Too early to mark absent"}), 200
     except Exception as e:
         print(f"Error marking absent: {e}")
         traceback.print_exc()
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/mark-absent-bulk', methods=['POST'])
+def mark_absent_bulk():
+    """Mark every employee without an attendance record for a date as absent in one bulk write."""
+    if attendance_collection is None or employees_collection is None:
+        return jsonify({"success": False, "error": "Database connection not established"}), 500
+
+    try:
+        data = request.get_json(silent=True) or request.form
+        today = datetime.now().strftime("%Y-%m-%d")
+        date = data.get('date') or today
+        if not re.match(r'^\d{4}-\d{2}-\d{2}$', date):
+            return jsonify({"success": False, "error": "Invalid date format. Use YYYY-MM-DD"}), 400
+        if date > today or (date == today and datetime.now().time() < absent_cutoff()):
+            return jsonify({"success": False, "message": "Too early to mark absent"}), 200
+
+        result = sweep_absences(date)
+        print(f"Bulk marked {result['marked_absent']} employees absent for {date}")
+        return jsonify({"success": True, "message": f"Marked {result['marked_absent']} employees as absent", **result}), 200
+    except Exception as e:
+        print(f"Error bulk marking absent: {e}")
+        traceback.print_exc()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+def format_history_record(record):
+    return {
+        "date": record["date"],
+        "inTime": record.get("in_time", record.get("time", "N/A")),  # Fallback to 'time' if 'in_time' missing
+        "status": record.get("status", "present"),
+        "lateTime": record.get("late_time", None)
+    }
+
+def history_etag(employeeID):
+    """Validator for every history page of an employee, from the attendance records themselves."""
+    # Records are only ever inserted, each with a fresh timestamp, so the count and the newest
+    # timestamp change whenever the history does; both come from the employee_date_timestamp index
+    totals = next(attendance_collection.aggregate([
+        {"$match": {"employee_id": employeeID}},
+        {"$group": {"_id": None, "records": {"$sum": 1}, "latest": {"$max": "$timestamp"}}}
+    ]), {"records": 0, "latest": None})
+    latest = totals["latest"].isoformat() if totals["latest"] else ""
+    return hashlib.sha1(f"{employeeID}:{totals['records']}:{latest}:{request.query_string.decode()}".encode()).hexdigest()
+
+def history_response(employeeID, query, key):
+    """One page of attendance history, streamed as JSON, or 304 if the client's copy is current."""
+    limit = page_size(request.args.get('limit'))
+    cursor = request.args.get('cursor')
+    etag = history_etag(employeeID)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        records, next_cursor = fetch_page(attendance_collection, query, limit, cursor)
+        print(f"Fetched {len(records)} {key} records for {employeeID} with filter: {query}")
+        response = app.response_class(stream_page(key, records, format_history_record, next_cursor), mimetype='application/json')
+    response.set_etag(etag)
+    # Cacheable by the browser, but revalidated on every visit
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/api/attendance_records', methods=['GET'])
 def get_attendance_records():
     """Retrieve attendance records with in_time and late_time, handling legacy 'time' field."""
@@ -656,20 +1348,11 @@ def get_attendance_records():
         if date:
             query["date"] = date
         elif month:
-            query["date"] = {"$regex": f"^{month}"}
-
-        records = attendance_collection.find(query).sort([("date", -1), ("timestamp", -1)])
-        attendance_records = [
-            {
-                "date": r["date"],
-                "inTime": r.get("in_time", r.get("time", "N/A")),  # Fallback to 'time' if 'in_time' missing
-                "status": r.get("status", "present"),
-                "lateTime": r.get("late_time", None)
-            }
-            for r in records
-        ]
-        print(f"Fetched {len(attendance_records)} records for {employeeID} with filter: {query}")
-        return jsonify({"success": True, "attendance_records": attendance_records})
+            query["date"] = month_range(month)
+
+        return history_response(employeeID, query, "attendance_records")
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         print(f"Error fetching attendance records: {e}")
         traceback.print_exc()
@@ -687,24 +1370,13 @@ def get_employee_history():
             return jsonify({"success": False, "error": "Missing employeeID"}), 400
 
         # Check if employee exists
-        employee = employees_collection.find_one({"employee_id": employeeID})
+        employee = employee_cache.get(employeeID)
         if not employee:
             return jsonify({"success": False, "error": "Employee not found"}), 404
 
-        # Fetch all attendance records for the employee
-        records = attendance_collection.find({"employee_id": employeeID}).sort("date", -1)
-        history = [
-            {
-                "date": record["date"],
-                "status": record.get("status", "present"),
-                "inTime": record.get("in_time", record.get("time", "N/A")),  # Fallback to 'time' if 'in_time' missing
-                "lateTime": record.get("late_time", None)
-            }
-            for record in records
-        ]
-
-        print(f"Fetched {len(history)} history records for employeeID={employeeID}")
-        return jsonify({"success": True, "history": history}), 200
+        return history_response(employeeID, {"employee_id": employeeID}, "history")
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         print(f"Error fetching employee history: {e}")
         traceback.print_exc()
@@ -720,25 +1392,43 @@ def get_employees():
         date = request.args.get('date')
         month = request.args.get('month')
 
-        employees = employees_collection.find({}, {"_id": 0, "employee_id": 1, "employee_name": 1, "email": 1, "department": 1})
-        employee_list = list(employees)
-
-        for emp in employee_list:
-            query = {"employee_id": emp["employee_id"]}
-            if date:
-                query["date"] = date
-            elif month:
-                query["date"] = {"$regex": f"^{month}"}
-            else:
-                query["date"] = datetime.now().strftime("%Y-%m-%d")
-
-            attendance = attendance_collection.find_one(query)
+        if date:
+            date_filter = date
+        elif month:
+            try:
+                date_filter = month_range(month)
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+        else:
+            date_filter = datetime.now().strftime("%Y-%m-%d")
+
+        # One round trip: join each employee to its attendance record via the (employee_id, date) index
+        pipeline = [
+            {"$project": {"_id": 0, "employee_id": 1, "employee_name": 1, "email": 1, "department": 1}},
+            {"$lookup": {
+                "from": attendance_collection.name,
+                "localField": "employee_id",
+                "foreignField": "employee_id",
+                "pipeline": [
+                    {"$match": {"date": date_filter}},
+                    {"$sort": {"date": -1}},
+                    {"$limit": 1},
+                    {"$project": {"_id": 0, "date": 1, "status": 1, "in_time": 1, "time": 1, "late_time": 1}}
+                ],
+                "as": "attendance"
+            }}
+        ]
+        employee_list = []
+        for emp in employees_collection.aggregate(pipeline):
+            attendance = emp.pop("attendance")
+            attendance = attendance[0] if attendance else None
             emp["status"] = attendance.get("status", "present") if attendance else "not_marked"
             emp["inTime"] = attendance.get("in_time", attendance.get("time", "N/A")) if attendance else "N/A"  # Fallback to 'time'
             emp["lateTime"] = attendance.get("late_time", None) if attendance else None
-            emp["date"] = attendance["date"] if attendance else (date or month or query["date"])
+            emp["date"] = attendance["date"] if attendance else (date or month or date_filter)
+            employee_list.append(emp)
 
-        print(f"Fetched {len(employee_list)} employees with filter: {query}")
+        print(f"Fetched {len(employee_list)} employees with date filter: {date_filter}")
         return jsonify({"success": True, "employees": employee_list}), 200
     except Exception as e:
         print(f"Error fetching employees: {e}")
@@ -757,8 +1447,13 @@ def calculate_attendance():
         if not employeeID:
             return jsonify({"success": False, "error": "Missing required fields"}), 400
 
-        total_days = len(attendance_collection.distinct("date"))
-        present_days = len(attendance_collection.distinct("date", {"employee_id": employeeID, "status": "present"}))
+        total_days = attendance_summary.total_days()
+        if total_days is None:
+            # Summary not built yet (run rebuild_attendance_summary.py); fall back to scanning attendance
+            total_days = len(attendance_collection.distinct("date"))
+            present_days = len(attendance_collection.distinct("date", {"employee_id": employeeID, "status": "present"}))
+        else:
+            present_days = attendance_summary.employee_totals(employeeID)["present"]
         attendance_percentage = 0 if total_days == 0 else (present_days / total_days) * 100
         print(f"Attendance calculated for {employeeID}: {attendance_percentage}%")
         return jsonify({"success": True, "attendance_percentage": attendance_percentage}), 200
@@ -767,6 +1462,113 @@ def calculate_attendance():
         traceback.print_exc()
         return jsonify({"success": False, "error": str(e)}), 500
 
+def report_month():
+    """The ?month=YYYY-MM query parameter (default: this month), validated."""
+    month = request.args.get('month') or datetime.now().strftime("%Y-%m")
+    month_range(month)
+    return month
+
+@app.route('/api/reports/monthly', methods=['GET'])
+def monthly_report():
+    """Per-employee present, absent and late counts for a month, read from the attendance summary."""
+    if attendance_summary is None:
+        return jsonify({"success": False, "error": "Database connection not established"}), 500
+
+    try:
+        month = report_month()
+        report = attendance_summary.month_report(month, request.args.get('employeeID'))
+        for row in report["employees"]:
+            row["attendance_percentage"] = 0 if report["days"] == 0 else (row["present"] / report["days"]) * 100
+        return jsonify({"success": True, **report}), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        print(f"Error building monthly report: {e}")
+        traceback.print_exc()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/reports/departments', methods=['GET'])
+def department_report():
+    """Attendance counts for a month summed per department, read from the attendance summary."""
+    if attendance_summary is None:
+        return jsonify({"success": False, "error": "Database connection not established"}), 500
+
+    try:
+        month = report_month()
+        return jsonify({"success": True, "month": month, "departments": attendance_summary.department_report(month)}), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        print(f"Error building department report: {e}")
+        traceback.print_exc()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/reports/calendar', methods=['GET'])
+def calendar_report():
+    """Company-wide attendance counts for each day of a month, read from the attendance summary."""
+    if attendance_summary is None:
+        return jsonify({"success": False, "error": "Database connection not established"}), 500
+
+    try:
+        month = report_month()
+        return jsonify({"success": True, "month": month, "days": attendance_summary.calendar_report(month)}), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        print(f"Error building attendance calendar: {e}")
+        traceback.print_exc()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/ready', methods=['GET'])
+def readiness():
+    """Readiness probe: 200 once this worker can reach Mongo and (unless API-only) has warmed up its models."""
+    if INFERENCE_ENABLED:
+        status = model_registry.status()
+        if inference_pool is not None:
+            status["ready"] = inference_pool.is_ready()
+            status["inference_pool"] = inference_pool.stats()
+        status["face_index_loaded"] = face_index_loaded.is_set()
+        if isinstance(face_index, (MappedEmbeddingIndex, SharedAnnIndex)):
+            status["face_index_mode"] = FACE_INDEX_MODE
+            status["face_index_generation"] = face_index.generation()
+    else:
+        status = {"ready": True}
+    status["role"] = APP_ROLE
+    try:
+        client.admin.command('ping')
+        status["database"] = True
+    except Exception as e:
+        print(f"Readiness database check failed: {e}")
+        status["database"] = False
+    code = 200 if status["ready"] and status["database"] else 503
+    return jsonify({"success": code == 200, **status}), code
+
+@app.route('/api/inference-stats', methods=['GET'])
+def inference_stats():
+    """Report micro-batching and process-pool statistics for this worker."""
+    stats = batching_stats()
+    pool_stats = inference_pool.stats() if inference_pool is not None else None
+    return jsonify({"success": True, "batching": stats is not None, "stats": stats, "pool": pool_stats}), 200
+
+@app.route('/api/email-outbox-stats', methods=['GET'])
+def email_outbox_stats():
+    """Report email outbox delivery counters and queue depth."""
+    if email_outbox is None:
+        return jsonify({"success": False, "error": "Email outbox is not available"}), 500
+    return jsonify({"success": True, "stats": email_outbox.stats()}), 200
+
+@app.route('/api/employee-cache-stats', methods=['GET'])
+def employee_cache_stats():
+    """Report employee cache hit rate, size and invalidations for this worker."""
+    if employee_cache is None:
+        return jsonify({"success": False, "error": "Database connection not established"}), 500
+    return jsonify({"success": True, "stats": employee_cache.stats()}), 200
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition of this worker's metrics."""
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/routes')
 def list_routes():
     """List all available routes."""
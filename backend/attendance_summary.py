@@ -0,0 +1,190 @@
+import re
+from collections import defaultdict
+from pymongo import UpdateOne, InsertOne
+
+# Lifetime totals live next to the monthly counters under this month key
+ALL_TIME = "all"
+COUNTERS = ("records", "present", "absent", "late", "late_minutes")
+
+def parse_late_minutes(late_time):
+    """Minutes late from a stored late_time string such as "1 hr 5 min" or "12 min"."""
+    if not late_time:
+        return 0
+    hours = re.search(r'(\d+)\s*hr', late_time)
+    minutes = re.search(r'(\d+)\s*min', late_time)
+    return (int(hours.group(1)) * 60 if hours else 0) + (int(minutes.group(1)) if minutes else 0)
+
+def record_counters(record):
+    """The counter increments one attendance record contributes."""
+    counters = {"records": 1}
+    status = record.get("status", "present")
+    if status in ("present", "absent"):
+        counters[status] = 1
+    if record.get("late_time"):
+        counters["late"] = 1
+        counters["late_minutes"] = record.get("late_minutes", parse_late_minutes(record["late_time"]))
+    return counters
+
+def _summary_id(employee_id, month):
+    return f"{employee_id}:{month}"
+
+def _with_counters(doc):
+    # $inc only creates the counters a record touched
+    return dict({c: 0 for c in COUNTERS}, **doc)
+
+class AttendanceSummary:
+    """Attendance counters maintained as records are written, so reports never scan attendance.
+
+    monthly holds one document per employee per month plus one lifetime
+    document per employee (month "all"): records, present, absent, late and
+    late_minutes. calendar holds one document per day with company-wide
+    counts, plus an "all" document whose days field counts distinct days.
+    Increments follow each successful attendance insert; rebuild() recomputes
+    everything from the attendance collection and marks the "all" document
+    built. Until then the counters only cover writes made since deploy, and
+    total_days() reports the summary as not built.
+    """
+
+    def __init__(self, monthly_collection, calendar_collection):
+        self.monthly = monthly_collection
+        self.calendar = calendar_collection
+
+    def ensure_indexes(self):
+        self.monthly.create_index([("month", 1), ("department", 1)], name="month_department")
+        self.monthly.create_index([("employee_id", 1), ("month", 1)], name="employee_month")
+        self.calendar.create_index([("month", 1)], name="month")
+
+    def _employee_updates(self, employee_id, date, counters, department=None):
+        fields = {"employee_id": employee_id}
+        if department is not None:
+            fields["department"] = department
+        return [
+            UpdateOne(
+                {"_id": _summary_id(employee_id, month)},
+                {"$inc": counters, "$set": dict(fields, month=month)},
+                upsert=True
+            )
+            for month in (date[:7], ALL_TIME)
+        ]
+
+    def _count_day(self, date, counters):
+        result = self.calendar.update_one(
+            {"_id": date},
+            {"$inc": counters, "$setOnInsert": {"month": date[:7]}},
+            upsert=True
+        )
+        if result.upserted_id is not None:
+            # May create the "all" document, but without the built marker only rebuild() sets
+            self.calendar.update_one({"_id": ALL_TIME}, {"$inc": {"days": 1}}, upsert=True)
+
+    def record(self, record, department=None):
+        """Count one newly inserted attendance record."""
+        counters = record_counters(record)
+        self.monthly.bulk_write(self._employee_updates(record["employee_id"], record["date"], counters, department), ordered=False)
+        self._count_day(record["date"], counters)
+
+    def record_absences(self, date, employee_ids, departments=None):
+        """Count a batch of absent records written for one date."""
+        if not employee_ids:
+            return
+        departments = departments or {}
+        counters = {"records": 1, "absent": 1}
+        operations = []
+        for employee_id in employee_ids:
+            operations.extend(self._employee_updates(employee_id, date, counters, departments.get(employee_id)))
+        self.monthly.bulk_write(operations, ordered=False)
+        self._count_day(date, {"records": len(employee_ids), "absent": len(employee_ids)})
+
+    def set_department(self, employee_id, department, month):
+        """Report the employee under a new department from month onwards, and in the lifetime totals."""
+        self.monthly.update_many(
+            {"employee_id": employee_id, "month": {"$gte": month}},
+            {"$set": {"department": department}}
+        )
+
+    def total_days(self):
+        """Distinct days with any attendance, or None if rebuild() never ran."""
+        doc = self.calendar.find_one({"_id": ALL_TIME})
+        return doc["days"] if doc and doc.get("built") else None
+
+    def employee_totals(self, employee_id, month=ALL_TIME):
+        doc = self.monthly.find_one({"_id": _summary_id(employee_id, month)}, {"_id": 0})
+        return _with_counters(doc or {"employee_id": employee_id, "month": month})
+
+    def month_report(self, month, employee_id=None):
+        """Per-employee counters for a month, plus the number of company working days in it."""
+        query = {"month": month}
+        if employee_id:
+            query["employee_id"] = employee_id
+        employees = [_with_counters(doc) for doc in self.monthly.find(query, {"_id": 0}).sort("employee_id", 1)]
+        days = self.calendar.count_documents({"month": month})
+        return {"month": month, "days": days, "employees": employees}
+
+    def department_report(self, month):
+        """Counters for a month summed per department."""
+        pipeline = [
+            {"$match": {"month": month}},
+            {"$group": dict(
+                {"_id": {"$ifNull": ["$department", "Unknown"]}, "employees": {"$sum": 1}},
+                **{c: {"$sum": f"${c}"} for c in COUNTERS}
+            )},
+            {"$sort": {"_id": 1}}
+        ]
+        return [dict(row, department=row.pop("_id")) for row in self.monthly.aggregate(pipeline)]
+
+    def calendar_report(self, month):
+        """Company-wide counts for each day of a month that has attendance."""
+        return [_with_counters(dict(day, date=day.pop("_id"))) for day in self.calendar.find({"month": month}).sort("_id", 1)]
+
+    def rebuild(self, attendance_collection, employees_collection):
+        """Recompute every counter from the attendance collection.
+
+        Builds into temporary collections and renames them over the live ones,
+        so readers never see a half-built summary. Increments made while the
+        rebuild runs are lost; run it when check-ins are quiet.
+        """
+        departments = {
+            e["employee_id"]: e.get("department")
+            for e in employees_collection.find({}, {"_id": 0, "employee_id": 1, "department": 1})
+        }
+        monthly = defaultdict(lambda: defaultdict(int))
+        calendar = defaultdict(lambda: defaultdict(int))
+        projection = {"_id": 0, "employee_id": 1, "date": 1, "status": 1, "late_time": 1, "late_minutes": 1}
+        for record in attendance_collection.find({}, projection):
+            if not record.get("employee_id") or not record.get("date"):
+                continue
+            counters = record_counters(record)
+            for month in (record["date"][:7], ALL_TIME):
+                summary = monthly[(record["employee_id"], month)]
+                for name, value in counters.items():
+                    summary[name] += value
+            for name, value in counters.items():
+                calendar[record["date"]][name] += value
+
+        db = self.monthly.database
+        monthly_tmp = db[self.monthly.name + "_rebuild"]
+        calendar_tmp = db[self.calendar.name + "_rebuild"]
+        monthly_tmp.drop()
+        calendar_tmp.drop()
+
+        operations = []
+        for (employee_id, month), counters in monthly.items():
+            doc = _with_counters(counters)
+            doc.update({"_id": _summary_id(employee_id, month), "employee_id": employee_id, "month": month})
+            if departments.get(employee_id) is not None:
+                doc["department"] = departments[employee_id]
+            operations.append(InsertOne(doc))
+        if operations:
+            monthly_tmp.bulk_write(operations, ordered=False)
+
+        operations = [
+            InsertOne(dict(_with_counters(counters), _id=date, month=date[:7]))
+            for date, counters in calendar.items()
+        ]
+        operations.append(InsertOne({"_id": ALL_TIME, "days": len(calendar), "built": True}))
+        calendar_tmp.bulk_write(operations, ordered=False)
+
+        monthly_tmp.rename(self.monthly.name, dropTarget=True)
+        calendar_tmp.rename(self.calendar.name, dropTarget=True)
+        self.ensure_indexes()
+        return {"summaries": len(monthly), "days": len(calendar)}
@@ -0,0 +1,72 @@
+"""Backfill precomputed Facenet reference embeddings for existing employees.
+
+Usage: python backfill_embeddings.py [--force] [--employee-id ID]
+"""
+import os
+import argparse
+import traceback
+from dotenv import load_dotenv
+import pymongo
+import certifi
+from embeddings import (
+    EMBEDDING_VERSION,
+    EMBEDDING_MODEL,
+    EMBEDDING_DETECTOR,
+    EMBEDDING_NORMALIZATION,
+    embed_employee_face
+)
+from face_store import FaceImageStore
+import model_registry
+
+def has_face_query():
+    """Query matching employees with a stored face image (binary store or legacy base64)."""
+    return {"$or": [{"face_image_id": {"$exists": True}}, {"face_image": {"$exists": True}}]}
+
+def stale_embedding_query():
+    """Query matching employees whose embedding is missing or from an older configuration."""
+    return {
+        "$and": [
+            has_face_query(),
+            {"$or": [
+                {"face_embedding.version": {"$ne": EMBEDDING_VERSION}},
+                {"face_embedding.model": {"$ne": EMBEDDING_MODEL}},
+                {"face_embedding.detector": {"$ne": EMBEDDING_DETECTOR}},
+                {"face_embedding.normalization": {"$ne": EMBEDDING_NORMALIZATION}}
+            ]}
+        ]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute and store reference embeddings for enrolled employees")
+    parser.add_argument('--force', action='store_true', help="Recompute embeddings even if they are current")
+    parser.add_argument('--employee-id', help="Only backfill a single employee")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = pymongo.MongoClient(os.getenv('MONGO_URI'), tls=True, tlsCAFile=certifi.where())
+    employees_collection = client['frs_db']['employees']
+    face_store = FaceImageStore(client['frs_db']['face_images'])
+
+    query = has_face_query() if args.force else stale_embedding_query()
+    if args.employee_id:
+        query["employee_id"] = args.employee_id
+
+    # compute_embedding runs the shared dlib pipeline, which needs the detector and predictor loaded
+    model_registry.ensure_ready()
+
+    updated, failed = 0, 0
+    for employee in employees_collection.find(query, {"employee_id": 1, "face_image_id": 1}):
+        try:
+            record = embed_employee_face(employee, employees_collection, face_store)
+            employees_collection.update_one({"_id": employee["_id"]}, {"$set": {"face_embedding": record}})
+            updated += 1
+            print(f"Stored embedding for {employee['employee_id']}")
+        except Exception as e:
+            failed += 1
+            print(f"Failed to compute embedding for {employee['employee_id']}: {e}")
+            traceback.print_exc()
+
+    print(f"Backfill complete: {updated} updated, {failed} failed")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Recall and latency of the approximate identification indexes against exact search.
+
+Synthetic Facenet-like galleries are generated per size: every employee has a
+random identity direction and 1-3 noisy templates around it, and queries are
+fresh noisy views of enrolled employees. For each gallery size the exact index
+(EmbeddingIndex) gives the ground truth; IVF is run at several nprobe values and
+HNSW (when hnswlib is installed) at several ef values. Reported per setting:
+build time, recall@1 (same best employee as exact), recall@10 (share of the
+exact top-10 employees found) and p50/p95 query latency.
+
+Usage (from backend/):
+    python benchmarks/ann_recall.py
+    python benchmarks/ann_recall.py --sizes 10000 100000 400000 --nprobe 4 8 16 32 --output ann.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import numpy as np
+from face_index import EmbeddingIndex
+from ann_index import IVFIndex, HnswIndex
+
+def synthetic_gallery(size, dim, intrinsic_dim, noise, seed):
+    """(employee_id, templates) items and a function drawing a query for an employee.
+
+    Identity directions come from a random intrinsic_dim-dimensional subspace,
+    since real face embeddings occupy only part of the space; uniform random
+    directions (intrinsic_dim == dim) are the worst case for IVF.
+    """
+    rng = np.random.default_rng(seed)
+    basis = rng.normal(size=(intrinsic_dim, dim)).astype(np.float32)
+    identities = rng.normal(size=(size, intrinsic_dim)).astype(np.float32) @ basis
+    identities /= np.linalg.norm(identities, axis=1, keepdims=True)
+    scale = noise / np.sqrt(dim)
+    items = []
+    for i in range(size):
+        count = int(rng.integers(1, 4))
+        items.append((f"E{i:07d}", identities[i] + rng.normal(scale=scale, size=(count, dim)).astype(np.float32)))
+
+    def query():
+        i = int(rng.integers(size))
+        return identities[i] + rng.normal(scale=scale, size=dim).astype(np.float32)
+
+    return items, query
+
+def run_queries(index, queries, k, **search_args):
+    """Results and per-query latencies in milliseconds."""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([employee_id for employee_id, _ in index.search(query, k, **search_args)])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, np.array(latencies)
+
+def score(results, truth, latencies):
+    recall_1 = np.mean([bool(found) and found[0] == expected[0] for found, expected in zip(results, truth)])
+    recall_10 = np.mean([len(set(found) & set(expected)) / len(expected) for found, expected in zip(results, truth)])
+    return {
+        "recall_at_1": round(float(recall_1), 4),
+        "recall_at_10": round(float(recall_10), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3)
+    }
+
+def timed_build(index, items):
+    start = time.perf_counter()
+    index.load(items)
+    return index, round(time.perf_counter() - start, 2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare approximate face index recall and latency with exact search")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10000, 50000, 200000], help="Employees per gallery")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--nprobe", nargs="+", type=int, default=[4, 8, 16, 32], help="IVF lists scanned per query")
+    parser.add_argument("--ef", nargs="+", type=int, default=[16, 32, 64, 128], help="HNSW search breadth")
+    parser.add_argument("--noise", type=float, default=0.6, help="Template spread around an identity (relative norm)")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--intrinsic-dim", type=int, default=32, help="Dimension of the subspace identities are drawn from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    try:
+        HnswIndex(dim=args.dim)
+        hnsw_available = True
+    except ImportError:
+        hnsw_available = False
+        print("hnswlib is not installed, skipping HNSW\n")
+
+    galleries = []
+    for size in args.sizes:
+        items, draw_query = synthetic_gallery(size, args.dim, args.intrinsic_dim, args.noise, args.seed)
+        queries = [draw_query() for _ in range(args.queries)]
+        rows = sum(len(vectors) for _, vectors in items)
+        print(f"Gallery of {size} employees ({rows} templates), {args.queries} queries")
+
+        exact, build_seconds = timed_build(EmbeddingIndex(dim=args.dim), items)
+        truth, latencies = run_queries(exact, queries, 10)
+        results = [dict(index="exact", build_seconds=build_seconds, **score(truth, truth, latencies))]
+
+        ivf, build_seconds = timed_build(IVFIndex(dim=args.dim), items)
+        for nprobe in args.nprobe:
+            found, latencies = run_queries(ivf, queries, 10, nprobe=nprobe)
+            results.append(dict(index="ivf", nlist=ivf.lists(), nprobe=nprobe, build_seconds=build_seconds,
+                                **score(found, truth, latencies)))
+
+        if hnsw_available:
+            hnsw, build_seconds = timed_build(HnswIndex(dim=args.dim), items)
+            for ef in args.ef:
+                found, latencies = run_queries(hnsw, queries, 10, ef=ef)
+                results.append(dict(index="hnsw", ef=ef, build_seconds=build_seconds, **score(found, truth, latencies)))
+
+        for result in results:
+            setting = {"ivf": lambda r: f"nprobe={r['nprobe']} of {r['nlist']}", "hnsw": lambda r: f"ef={r['ef']}"}.get(result["index"], lambda r: "")(result)
+            print(f"  {result['index']:<6}{setting:<20} build {result['build_seconds']:>7.2f}s  "
+                  f"recall@1 {result['recall_at_1']:.3f}  recall@10 {result['recall_at_10']:.3f}  "
+                  f"p50 {result['p50_ms']:.3f}ms  p95 {result['p95_ms']:.3f}ms")
+        print()
+        galleries.append({"employees": size, "templates": rows, "results": results})
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "benchmark": "ann_recall",
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "queries": args.queries,
+                "noise": args.noise,
+                "intrinsic_dim": args.intrinsic_dim,
+                "galleries": galleries
+            }, f, indent=2)
+        print(f"Wrote results to {args.output}")
+
+if __name__ == "__main__":
+    main()
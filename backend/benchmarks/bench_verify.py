@@ -0,0 +1,262 @@
+"""Per-stage micro-benchmark of the /api/verify pipeline on the bundled sample faces.
+
+Mongo is replaced by mongomock and SMTP by a local sink, so the numbers cover
+only this process. Each stage is timed separately and reported as p50/p95/p99,
+with peak Python memory per stage measured in a separate tracemalloc pass.
+
+Usage (from backend/):
+    python benchmarks/bench_verify.py --iterations 50 --output bench.json
+    python benchmarks/bench_verify.py --compare bench.json --fail-threshold 20
+"""
+import io
+import os
+import sys
+import glob
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tracemalloc
+from contextlib import contextmanager
+from collections import defaultdict
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import cv2
+import dlib
+import mongomock
+from imutils import face_utils
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+import model_registry
+from face_pipeline import detect_faces, align_face
+from embeddings import embed_face, build_embedding_record
+from image_io import decode_image, read_upload
+from email_outbox import EmailOutbox
+from employee_cache import EMPLOYEE_CACHE_PROJECTION
+from smtp_sink import SMTPSink
+
+STAGES = [
+    "multipart_decode",
+    "image_decode",
+    "dlib_detection",
+    "landmarks_and_alignment",
+    "embedding",
+    "db_lookup",
+    "attendance_write",
+    "email_enqueue"
+]
+
+class StageRecorder:
+    """Collects per-stage latency samples and, when tracing, peak allocations."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.samples = defaultdict(list)
+        self.peaks = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        if self.trace_memory:
+            self.peaks[name] = max(self.peaks[name], tracemalloc.get_traced_memory()[1] - baseline)
+        else:
+            self.samples[name].append(elapsed * 1000)
+
+def load_fixtures():
+    """Read every bundled JPEG as (employee_id, bytes)."""
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(BACKEND_DIR, "images", "*.jpg"))):
+        with open(path, "rb") as f:
+            fixtures.append((os.path.splitext(os.path.basename(path))[0], f.read()))
+    if not fixtures:
+        raise SystemExit("No fixture images found in backend/images")
+    return fixtures
+
+def build_request_body(employee_id, image_bytes):
+    """Encode a kiosk-style multipart request once; return (environ template, body bytes)."""
+    builder = EnvironBuilder(method="POST", path="/api/verify", data={
+        "faceImage": (io.BytesIO(image_bytes), "capture.jpg", "image/jpeg"),
+        "employeeID": employee_id,
+        "inTime": "09:05:00"
+    })
+    environ = builder.get_environ()
+    body = environ["wsgi.input"].read()
+    builder.close()
+    return environ, body
+
+def seed_database(fixtures):
+    """Create mongomock collections with one employee per fixture image."""
+    client = mongomock.MongoClient()
+    db = client["frs_db"]
+    employees = db["employees"]
+    attendance = db["attendance"]
+    attendance.create_index([("employee_id", 1), ("date", 1)], unique=True)
+    for employee_id, _ in fixtures:
+        employees.insert_one({
+            "employee_id": employee_id,
+            "email": f"{employee_id}@example.com",
+            "employee_name": employee_id,
+            "department": "Benchmark",
+            "face_image_id": employee_id,
+            "face_embedding": build_embedding_record(np.zeros(128, dtype=np.float32))
+        })
+    return db
+
+def run_pipeline(recorder, fixture, request_template, db, outbox):
+    """One /api/verify request, stage by stage, mirroring the endpoint."""
+    employee_id, _ = fixture
+    environ, body = request_template
+    environ = dict(environ)
+    environ["wsgi.input"] = io.BytesIO(body)
+
+    with recorder.stage("multipart_decode"):
+        request = Request(environ)
+        face_image = request.files["faceImage"]
+        employee_id = request.form["employeeID"]
+
+    with recorder.stage("image_decode"):
+        image = decode_image(read_upload(face_image))
+
+    with recorder.stage("dlib_detection"):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        boxes, _ = detect_faces(gray)
+
+    aligned = image
+    with recorder.stage("landmarks_and_alignment"):
+        if boxes:
+            shape = model_registry.predictor(gray, dlib.rectangle(*boxes[0]))
+            landmarks = face_utils.shape_to_np(shape)
+            aligned = align_face(image, boxes[0], landmarks[36:42].mean(axis=0), landmarks[42:48].mean(axis=0))
+
+    with recorder.stage("embedding"):
+        embed_face(aligned)
+
+    # The employee cache miss path: the same fetch /api/verify makes for a cold employee
+    with recorder.stage("db_lookup"):
+        db["employees"].find_one({"employee_id": employee_id}, EMPLOYEE_CACHE_PROJECTION)
+
+    with recorder.stage("attendance_write"):
+        db["attendance"].insert_one({
+            "employee_id": employee_id,
+            "date": datetime.now().strftime("%Y-%m-%d"),
+            "in_time": "09:05:00",
+            "status": "present",
+            "timestamp": datetime.now(),
+            "late_time": None
+        })
+    db["attendance"].delete_many({"employee_id": employee_id})
+
+    with recorder.stage("email_enqueue"):
+        outbox.enqueue(f"{employee_id}@example.com", "Attendance Recorded - Face Recognition System", "Benchmark")
+
+def summarize(recorder, memory):
+    stages = {}
+    for name in STAGES:
+        samples = np.array(recorder.samples[name])
+        stages[name] = {
+            "p50_ms": round(float(np.percentile(samples, 50)), 3),
+            "p95_ms": round(float(np.percentile(samples, 95)), 3),
+            "p99_ms": round(float(np.percentile(samples, 99)), 3),
+            "mean_ms": round(float(samples.mean()), 3),
+            "samples": int(samples.size),
+            "peak_kb": round(memory.peaks[name] / 1024, 1)
+        }
+    return stages
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def compare(current, baseline_path, fail_threshold):
+    """Print p50 deltas against a previous run; return True if any stage regressed beyond the threshold."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressed = False
+    print(f"\nComparison with {baseline_path} (commit {baseline.get('commit')}):")
+    for name in STAGES:
+        old = baseline["stages"].get(name)
+        new = current["stages"][name]
+        if not old or not old["p50_ms"]:
+            continue
+        delta = (new["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100
+        flag = ""
+        if delta > fail_threshold:
+            regressed = True
+            flag = "  <-- regression"
+        print(f"  {name:26s} p50 {old['p50_ms']:9.3f} -> {new['p50_ms']:9.3f} ms ({delta:+6.1f}%){flag}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each stage of /api/verify")
+    parser.add_argument("--iterations", type=int, default=20, help="Passes over the fixture images")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed passes before measuring")
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--compare", help="Previous JSON results to compare against")
+    parser.add_argument("--fail-threshold", type=float, default=20.0, help="Percent p50 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    model_registry.ensure_ready()
+    fixtures = load_fixtures()
+    templates = [build_request_body(employee_id, data) for employee_id, data in fixtures]
+    db = seed_database(fixtures)
+
+    sink = SMTPSink().start()
+    outbox = EmailOutbox("bench@example.com", None, "127.0.0.1", sink.port, use_tls=False, collection=db["email_outbox"])
+
+    warmup = StageRecorder()
+    for _ in range(args.warmup):
+        for fixture, template in zip(fixtures, templates):
+            run_pipeline(warmup, fixture, template, db, outbox)
+
+    timings = StageRecorder()
+    for _ in range(args.iterations):
+        for fixture, template in zip(fixtures, templates):
+            run_pipeline(timings, fixture, template, db, outbox)
+
+    # Memory is measured in its own pass so tracemalloc overhead doesn't skew latencies
+    memory = StageRecorder(trace_memory=True)
+    tracemalloc.start()
+    for fixture, template in zip(fixtures, templates):
+        run_pipeline(memory, fixture, template, db, outbox)
+    tracemalloc.stop()
+    sink.shutdown()
+
+    results = {
+        "benchmark": "verify_pipeline",
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "fixtures": len(fixtures),
+        "iterations": args.iterations,
+        "stages": summarize(timings, memory)
+    }
+
+    print(f"{'stage':26s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'peak KB':>9s}")
+    for name, row in results["stages"].items():
+        print(f"{name:26s} {row['p50_ms']:9.3f} {row['p95_ms']:9.3f} {row['p99_ms']:9.3f} {row['peak_kb']:9.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.fail_threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Accuracy parity and speed of a converted embedding backend against the Keras reference.
+
+Every bundled face in backend/images is aligned once and embedded by both
+backends. Reported:
+  * drift: cosine distance between the reference and candidate embedding of the same face
+  * agreement: share of face pairs where both backends make the same verify decision,
+    both with candidate embeddings on both sides and with candidate probes against
+    Keras references (what a deployment sees until references are recomputed)
+  * forward-pass latency per face and peak RSS of a process running only that backend
+
+Usage (from backend/):
+    python benchmarks/embedding_parity.py --backend onnx --model-path models/facenet.onnx
+    python benchmarks/embedding_parity.py --backend tflite --max-drift 0.02 --min-agreement 0.99 --output parity.json
+"""
+import os
+import sys
+import glob
+import json
+import time
+import resource
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# The reference is built explicitly below; keep the app default from loading a candidate
+os.environ["EMBEDDING_BACKEND"] = "keras"
+
+import numpy as np
+from PIL import Image
+
+def rss_probe(name, model_path):
+    """Run in a child process: load one backend, embed one face, print peak RSS in MB."""
+    from embedding_backends import create_backend
+    backend = create_backend(name, model_path)
+    width, height = backend.input_shape
+    backend.embed(np.zeros((1, height, width, 3), dtype=np.float32))
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+
+def peak_rss_mb(name, model_path):
+    command = [sys.executable, os.path.abspath(__file__), "--rss-probe", name]
+    if model_path:
+        command += ["--model-path", model_path]
+    output = subprocess.check_output(command, cwd=BACKEND_DIR, stderr=subprocess.DEVNULL)
+    return round(float(output.decode().strip().splitlines()[-1]), 1)
+
+def load_faces():
+    """Aligned face crops of every bundled image with a detectable face."""
+    from face_pipeline import analyze_face
+    faces = []
+    for path in sorted(glob.glob(os.path.join(BACKEND_DIR, "images", "*.jpg"))):
+        analysis = analyze_face(np.array(Image.open(path).convert('RGB')))
+        if analysis.detected:
+            faces.append((os.path.splitext(os.path.basename(path))[0], analysis.aligned_face))
+    if len(faces) < 2:
+        raise SystemExit("Need at least two detectable faces in backend/images")
+    return faces
+
+def embed_all(backend, faces):
+    from embeddings import prepare_face
+    return np.stack([backend.embed(prepare_face(face, backend)[np.newaxis])[0] for _, face in faces])
+
+def forward_latency(backend, faces, iterations):
+    """p50/p95 milliseconds of a single-face forward pass (preprocessing excluded)."""
+    from embeddings import prepare_face
+    inputs = [prepare_face(face, backend)[np.newaxis] for _, face in faces]
+    for batch in inputs[:3]:
+        backend.embed(batch)
+    samples = []
+    for _ in range(iterations):
+        for batch in inputs:
+            start = time.perf_counter()
+            backend.embed(batch)
+            samples.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(float(np.percentile(samples, 50)), 3), "p95_ms": round(float(np.percentile(samples, 95)), 3)}
+
+def pair_agreement(reference, probes, gallery):
+    """Share of face pairs where probe-vs-gallery makes the reference's verify decision, and the mean distance change."""
+    from embeddings import cosine_distance, VERIFY_THRESHOLD
+    agree, total, deltas = 0, 0, []
+    for i in range(len(reference)):
+        for j in range(len(reference)):
+            if i == j:
+                continue
+            expected = cosine_distance(reference[i], reference[j])
+            actual = cosine_distance(probes[i], gallery[j])
+            agree += (expected <= VERIFY_THRESHOLD) == (actual <= VERIFY_THRESHOLD)
+            deltas.append(abs(actual - expected))
+            total += 1
+    return round(agree / total, 4), round(float(np.mean(deltas)), 5)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an embedding backend with the Keras reference")
+    parser.add_argument("--backend", choices=["tflite", "onnx"], help="Candidate backend")
+    parser.add_argument("--model-path", help="Converted model (default: the backend's default path)")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed passes over the faces")
+    parser.add_argument("--max-drift", type=float, default=0.02, help="Fail if any face drifts more than this cosine distance")
+    parser.add_argument("--min-agreement", type=float, default=0.99, help="Fail if verify decisions agree on fewer pairs")
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--rss-probe", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss_probe:
+        return rss_probe(args.rss_probe, args.model_path)
+    if not args.backend:
+        parser.error("--backend is required")
+
+    import model_registry
+    from embedding_backends import create_backend
+    model_registry.load_models()
+    reference_backend = model_registry.facenet
+    candidate_backend = create_backend(args.backend, args.model_path)
+
+    faces = load_faces()
+    reference = embed_all(reference_backend, faces)
+    candidate = embed_all(candidate_backend, faces)
+
+    from embeddings import cosine_distance
+    drift = [cosine_distance(r, c) for r, c in zip(reference, candidate)]
+    agreement, mean_delta = pair_agreement(reference, candidate, candidate)
+    mixed_agreement, mixed_delta = pair_agreement(reference, candidate, reference)
+
+    reference_latency = forward_latency(reference_backend, faces, args.iterations)
+    candidate_latency = forward_latency(candidate_backend, faces, args.iterations)
+
+    results = {
+        "benchmark": "embedding_parity",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "backend": args.backend,
+        "model_path": candidate_backend.model_path,
+        "model_mb": round(os.path.getsize(candidate_backend.model_path) / 1e6, 2),
+        "faces": len(faces),
+        "drift": {
+            "mean": round(float(np.mean(drift)), 5),
+            "max": round(float(np.max(drift)), 5),
+            "worst_face": faces[int(np.argmax(drift))][0]
+        },
+        "agreement": agreement,
+        "mean_distance_change": mean_delta,
+        "mixed_agreement": mixed_agreement,
+        "mixed_mean_distance_change": mixed_delta,
+        "latency": {"keras": reference_latency, args.backend: candidate_latency},
+        "speedup_p50": round(reference_latency["p50_ms"] / candidate_latency["p50_ms"], 2),
+        "peak_rss_mb": {"keras": peak_rss_mb("keras", None), args.backend: peak_rss_mb(args.backend, candidate_backend.model_path)}
+    }
+
+    print(f"Backend {args.backend} ({results['model_mb']} MB) on {len(faces)} faces")
+    print(f"  drift           mean {results['drift']['mean']:.5f}  max {results['drift']['max']:.5f} ({results['drift']['worst_face']})")
+    print(f"  agreement       {agreement:.4f} (candidate vs candidate), {mixed_agreement:.4f} (candidate probe vs keras reference)")
+    print(f"  forward p50     keras {reference_latency['p50_ms']:.2f} ms, {args.backend} {candidate_latency['p50_ms']:.2f} ms ({results['speedup_p50']}x)")
+    print(f"  peak RSS        keras {results['peak_rss_mb']['keras']} MB, {args.backend} {results['peak_rss_mb'][args.backend]} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+
+    failed = results["drift"]["max"] > args.max_drift or min(agreement, mixed_agreement) < args.min_agreement
+    if failed:
+        print(f"\nParity check failed (max drift {args.max_drift}, min agreement {args.min_agreement})")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import socketserver
+import threading
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP dialogue: accepts every command and counts delivered messages."""
+
+    def handle(self):
+        self.wfile.write(b"220 smtp-sink ready\r\n")
+        in_data = False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            if in_data:
+                if line == b".\r\n":
+                    in_data = False
+                    self.server.delivered += 1
+                    self.wfile.write(b"250 OK\r\n")
+                continue
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.wfile.write(b"250 smtp-sink\r\n")
+            elif command == b"DATA":
+                in_data = True
+                self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif command == b"QUIT":
+                self.wfile.write(b"221 Bye\r\n")
+                break
+            else:
+                self.wfile.write(b"250 OK\r\n")
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Local SMTP stand-in for exercising the email outbox without a real server."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _SinkHandler)
+        self.delivered = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="smtp-sink", daemon=True).start()
+        return self
@@ -0,0 +1,86 @@
+"""Import time and memory of the app per APP_ROLE.
+
+Each role is imported in a fresh interpreter (as a gunicorn worker would) and
+reports wall time to import app, peak RSS, and which heavy modules ended up
+loaded. Mongo is never contacted at import, so no database is needed.
+
+Usage (from backend/):
+    python benchmarks/startup_report.py
+    python benchmarks/startup_report.py --roles api --max-api-seconds 1.0 --output startup.json
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["tensorflow", "deepface", "dlib", "cv2", "scipy", "onnxruntime", "tflite_runtime"]
+
+PROBE = """
+import sys, time, json, resource
+start = time.perf_counter()
+import app
+seconds = time.perf_counter() - start
+print(json.dumps({
+    "import_seconds": round(seconds, 3),
+    "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    "modules": len(sys.modules),
+    "heavy_modules": [m for m in %r if m in sys.modules]
+}))
+""" % (HEAVY_MODULES,)
+
+def probe_role(role, env):
+    env = dict(env, APP_ROLE=role)
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True
+    ).stdout.decode()
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app import time and RSS per APP_ROLE")
+    parser.add_argument("--roles", nargs="+", default=["api", "all"], choices=["api", "all", "inference"])
+    parser.add_argument("--repeat", type=int, default=3, help="Imports per role; the fastest is reported")
+    parser.add_argument("--max-api-seconds", type=float, help="Fail if the api role imports slower than this")
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # Load models inline so the all/inference figures include them
+    env.setdefault("MODEL_LOAD_MODE", "eager")
+    env.setdefault("INFERENCE_POOL_PROCESSES", "0")
+
+    roles = {}
+    for role in args.roles:
+        runs = [probe_role(role, env) for _ in range(args.repeat)]
+        roles[role] = min(runs, key=lambda run: run["import_seconds"])
+        result = roles[role]
+        heavy = ", ".join(result["heavy_modules"]) or "none"
+        print(f"{role:<10} import {result['import_seconds']:.3f}s  peak RSS {result['peak_rss_mb']:.1f} MB  "
+              f"{result['modules']} modules  heavy: {heavy}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "benchmark": "startup_report",
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "roles": roles
+            }, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+
+    api = roles.get("api")
+    if api and (api["heavy_modules"] or (args.max_api_seconds and api["import_seconds"] > args.max_api_seconds)):
+        print(f"\napi role loaded heavy modules or took longer than {args.max_api_seconds}s to import")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
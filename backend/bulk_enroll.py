@@ -0,0 +1,388 @@
+"""Enroll a batch of employees from a roster spreadsheet and a folder (or zip) of photos.
+
+The roster is an .xlsx or .csv file with a header row; photos are matched to
+rows by employee ID (e.g. 22A91A0568.jpg), case-insensitively. Faces are
+validated and embedded in a process pool while the next chunk of rows is read,
+and each chunk is written with one bulk write per collection. Bulk-enrolled
+employees have no password yet; they set one through the forgot-password flow.
+
+Usage: python bulk_enroll.py --roster ROSTER.xlsx --photos DIR_OR_ZIP [--processes N] [--report rejects.csv] [--dry-run]
+"""
+import os
+import re
+import csv
+import time
+import zipfile
+import argparse
+import multiprocessing
+from datetime import datetime
+from pymongo.collation import Collation
+from pymongo.errors import BulkWriteError
+from image_io import InvalidImage, MAX_UPLOAD_BYTES, open_image, decode_image
+from face_store import normalize_face_image, face_thumbnail, FACE_MAX_SIDE
+
+BULK_ENROLL_PROCESSES = int(os.getenv('BULK_ENROLL_PROCESSES', '2'))
+BULK_ENROLL_CHUNK = int(os.getenv('BULK_ENROLL_CHUNK', '64'))
+# Same minimum as a check-in, so every enrolled face is usable as a reference
+BULK_MIN_EYE_DISTANCE = float(os.getenv('BULK_MIN_EYE_DISTANCE', '10'))
+
+# Roster header names accepted for each employee field, compared lowercased
+ROSTER_COLUMNS = {
+    "employee_id": ("employee_id", "employeeid", "employee id", "roll number", "roll no", "id"),
+    "employee_name": ("employee_name", "employeename", "employee name", "name", "name of the trainee"),
+    "email": ("email", "email id", "e-mail"),
+    "department": ("department", "dept", "branch")
+}
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png")
+# Employee IDs that differ only in case are the same employee (photos and roster rows
+# are matched that way); the employees collection has a unique index with this collation
+EMPLOYEE_ID_COLLATION = Collation(locale="en", strength=2)
+EMAIL_PATTERN = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def _header_map(header):
+    names = [_cell_text(cell).lower() for cell in header]
+    columns = {}
+    for field, aliases in ROSTER_COLUMNS.items():
+        for i, name in enumerate(names):
+            if name in aliases:
+                columns[field] = i
+                break
+    return columns
+
+def read_roster(path):
+    """Yield (row_number, fields) for each data row, streaming the sheet instead of loading it whole."""
+    if path.lower().endswith(".csv"):
+        f = open(path, newline="", encoding="utf-8-sig")
+        rows = csv.reader(f)
+    else:
+        from openpyxl import load_workbook
+        f = load_workbook(path, read_only=True, data_only=True)
+        rows = f.active.iter_rows(values_only=True)
+    try:
+        columns = None
+        for row_number, row in enumerate(rows, start=1):
+            if columns is None:
+                # Some rosters have a title above the header row
+                columns = _header_map(row)
+                if "employee_id" not in columns:
+                    columns = None
+                continue
+            fields = {field: _cell_text(row[i]) if i < len(row) else "" for field, i in columns.items()}
+            if any(fields.values()):
+                yield row_number, fields
+        if columns is None:
+            raise ValueError(f"No header row with an employee ID column ({', '.join(ROSTER_COLUMNS['employee_id'])}) found in {path}")
+    finally:
+        f.close()
+
+def _read_limited(path):
+    if os.path.getsize(path) > MAX_UPLOAD_BYTES:
+        raise InvalidImage(f"Photo is larger than {MAX_UPLOAD_BYTES} bytes")
+    with open(path, "rb") as f:
+        return f.read()
+
+def photos_from_dir(photo_dir):
+    """Map lowercased employee ID to a loader returning the photo bytes, for every photo in photo_dir."""
+    photos = {}
+    for name in sorted(os.listdir(photo_dir)):
+        stem, extension = os.path.splitext(name)
+        if extension.lower() in PHOTO_EXTENSIONS:
+            path = os.path.join(photo_dir, name)
+            photos[stem.lower()] = lambda path=path: _read_limited(path)
+    return photos
+
+def photos_from_zip(archive):
+    """Like photos_from_dir for an open ZipFile; folders inside the archive are ignored."""
+    photos = {}
+    for info in archive.infolist():
+        name = os.path.basename(info.filename)
+        stem, extension = os.path.splitext(name)
+        if info.is_dir() or name.startswith(".") or extension.lower() not in PHOTO_EXTENSIONS:
+            continue
+
+        def load(info=info):
+            if info.file_size > MAX_UPLOAD_BYTES:
+                raise InvalidImage(f"Photo is larger than {MAX_UPLOAD_BYTES} bytes")
+            return archive.read(info)
+        photos[stem.lower()] = load
+    return photos
+
+def open_photos(path):
+    if zipfile.is_zipfile(path):
+        return photos_from_zip(zipfile.ZipFile(path))
+    return photos_from_dir(path)
+
+def enroll_photo(data, min_eye_distance=BULK_MIN_EYE_DISTANCE):
+    """Normalize, validate and embed one enrollment photo (inline or in a pool process).
+
+    Returns {"reason": None, "image", "size", "thumb", "vector"} for a usable
+    face, else {"reason": ..., "detail": ...} explaining the reject.
+    """
+    from face_pipeline import analyze_face
+    from embeddings import embed_face
+    import numpy as np
+
+    try:
+        image_data, size = normalize_face_image(open_image(data, FACE_MAX_SIDE))
+    except InvalidImage as e:
+        return {"reason": "invalid_image", "detail": str(e)}
+    # Embedded from the stored variant, exactly as /api/verify-otp does
+    analysis = analyze_face(decode_image(image_data))
+    if analysis.num_faces == 0:
+        return {"reason": "no_face", "detail": "No face detected"}
+    if analysis.num_faces > 1:
+        return {"reason": "multiple_faces", "detail": f"{analysis.num_faces} faces detected"}
+    if analysis.eye_distance < min_eye_distance:
+        return {"reason": "face_too_small", "detail": f"Eye distance {analysis.eye_distance:.1f}px, need {min_eye_distance}px"}
+    return {
+        "reason": None,
+        "image": image_data,
+        "size": size,
+        "thumb": face_thumbnail(image_data),
+        "vector": np.asarray(embed_face(analysis.aligned_face), dtype=np.float32)
+    }
+
+def start_pool(processes):
+    """Spawned processes with the face models loaded, like the inference pool; None runs inline."""
+    if processes <= 0:
+        import model_registry
+        model_registry.ensure_ready()
+        return None
+    from inference_pool import _init_worker
+    context = multiprocessing.get_context("spawn")
+    threads = max(1, (os.cpu_count() or 1) // processes)
+    return context.Pool(processes=processes, initializer=_init_worker, initargs=(threads, context.Value("i", 0)))
+
+class BulkEnrollment:
+    """One bulk enrollment run: validates rows, embeds faces in a pool and writes chunks in bulk.
+
+    Rejected rows are collected in report["rejects"] with the roster row number
+    and a reason (missing_fields, invalid_email, duplicate_id, already_enrolled,
+    duplicate_email, no_photo, invalid_image, no_face, multiple_faces,
+    face_too_small, write_failed). on_enrolled(employee_id, vector) is called
+    for every employee written; on_progress(report) after every chunk.
+    """
+
+    def __init__(self, employees_collection, face_store, processes=BULK_ENROLL_PROCESSES, chunk_size=BULK_ENROLL_CHUNK,
+                 dry_run=False, on_enrolled=None, on_progress=None):
+        self.employees_collection = employees_collection
+        self.face_store = face_store
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.on_enrolled = on_enrolled
+        self.on_progress = on_progress
+        self.report = {"rows": 0, "enrolled": 0, "rejected": 0, "dry_run": dry_run, "rejects": []}
+        self._seen_ids = set()
+        self._seen_emails = set()
+
+    def reject(self, row_number, employee_id, reason, detail=None):
+        self.report["rejected"] += 1
+        self.report["rejects"].append({"row": row_number, "employee_id": employee_id, "reason": reason, "detail": detail})
+
+    def _valid_rows(self, rows, photos):
+        """Rows that pass the checks needing no database or model, with their photo loaders."""
+        for row_number, fields in rows:
+            self.report["rows"] += 1
+            employee_id = fields.get("employee_id", "")
+            missing = [field for field in ROSTER_COLUMNS if not fields.get(field)]
+            if missing:
+                self.reject(row_number, employee_id, "missing_fields", ", ".join(missing))
+                continue
+            email = fields["email"].lower()
+            if not EMAIL_PATTERN.match(email):
+                self.reject(row_number, employee_id, "invalid_email", fields["email"])
+                continue
+            if employee_id.lower() in self._seen_ids:
+                self.reject(row_number, employee_id, "duplicate_id", "Employee ID appears earlier in the roster")
+                continue
+            self._seen_ids.add(employee_id.lower())
+            if email in self._seen_emails:
+                self.reject(row_number, employee_id, "duplicate_email", "Email appears earlier in the roster")
+                continue
+            self._seen_emails.add(email)
+            loader = photos.get(employee_id.lower())
+            if loader is None:
+                self.reject(row_number, employee_id, "no_photo", "No photo named after this employee ID")
+                continue
+            yield row_number, dict(fields, email=email), loader
+
+    def _chunks(self, rows, photos):
+        chunk = []
+        for item in self._valid_rows(rows, photos):
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _prepare(self, chunk):
+        """Drop rows already enrolled, then load the photos of the rest."""
+        existing_ids = set()
+        for employee in self.employees_collection.find(
+            {"employee_id": {"$in": [fields["employee_id"] for _, fields, _ in chunk]}},
+            {"_id": 0, "employee_id": 1},
+            collation=EMPLOYEE_ID_COLLATION
+        ):
+            existing_ids.add(employee["employee_id"].lower())
+        existing_emails = set()
+        for employee in self.employees_collection.find(
+            {"email": {"$in": [fields["email"] for _, fields, _ in chunk]}},
+            {"_id": 0, "email": 1}
+        ):
+            existing_emails.add((employee.get("email") or "").lower())
+
+        prepared = []
+        for row_number, fields, loader in chunk:
+            if fields["employee_id"].lower() in existing_ids:
+                self.reject(row_number, fields["employee_id"], "already_enrolled", "Employee ID already exists")
+                continue
+            if fields["email"] in existing_emails:
+                self.reject(row_number, fields["employee_id"], "duplicate_email", "Email already registered")
+                continue
+            try:
+                prepared.append((row_number, fields, loader()))
+            except (InvalidImage, OSError) as e:
+                self.reject(row_number, fields["employee_id"], "invalid_image", str(e))
+        return prepared
+
+    def _write(self, prepared, results):
+        accepted = []
+        for (row_number, fields, _), result in zip(prepared, results):
+            if result["reason"]:
+                self.reject(row_number, fields["employee_id"], result["reason"], result["detail"])
+            else:
+                accepted.append((row_number, fields, result))
+        if not accepted or self.dry_run:
+            self.report["enrolled"] += len(accepted)
+            return
+
+        from embeddings import build_embedding_record
+        try:
+            image_ids = self.face_store.put_many_normalized([(r["image"], r["size"], r["thumb"]) for _, _, r in accepted])
+            now = datetime.now()
+            self.employees_collection.insert_many([
+                {
+                    "employee_id": fields["employee_id"],
+                    "email": fields["email"],
+                    "employee_name": fields["employee_name"],
+                    "department": fields["department"],
+                    "face_image_id": image_id,
+                    "face_embedding": build_embedding_record(result["vector"]),
+                    "created_at": now,
+                    "enrolled_by": "bulk"
+                }
+                for (_, fields, result), image_id in zip(accepted, image_ids)
+            ], ordered=False)
+        except BulkWriteError as e:
+            # Unordered, so every other row of the chunk was inserted; reject only the failed ones
+            failed = {error["index"]: error for error in e.details["writeErrors"]}
+            for i, (row_number, fields, _) in enumerate(accepted):
+                if i not in failed:
+                    continue
+                if failed[i]["code"] == 11000:
+                    # Enrolled since _prepare checked, e.g. by a registration or another bulk run
+                    self.reject(row_number, fields["employee_id"], "already_enrolled", "Employee ID already exists")
+                else:
+                    self.reject(row_number, fields["employee_id"], "write_failed", failed[i]["errmsg"])
+            accepted = [item for i, item in enumerate(accepted) if i not in failed]
+        except Exception as e:
+            print(f"Bulk enrollment write failed for rows {accepted[0][0]}-{accepted[-1][0]}: {e}")
+            for row_number, fields, _ in accepted:
+                self.reject(row_number, fields["employee_id"], "write_failed", str(e))
+            return
+
+        self.report["enrolled"] += len(accepted)
+        if self.on_enrolled is not None:
+            for _, fields, result in accepted:
+                self.on_enrolled(fields["employee_id"], result["vector"])
+
+    def run(self, rows, photos):
+        """Enroll every row; while one chunk is in the pool the next is read, checked and loaded."""
+        start = time.perf_counter()
+        pool = start_pool(self.processes)
+        try:
+            in_flight = None
+            for chunk in self._chunks(rows, photos):
+                prepared = self._prepare(chunk)
+                if in_flight is not None:
+                    self._write(in_flight[0], in_flight[1].get())
+                    self._progress()
+                if pool is None:
+                    in_flight = (prepared, _Done([enroll_photo(data) for _, _, data in prepared]))
+                else:
+                    in_flight = (prepared, pool.map_async(enroll_photo, [data for _, _, data in prepared], chunksize=1))
+            if in_flight is not None:
+                self._write(in_flight[0], in_flight[1].get())
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        self.report["seconds"] = round(time.perf_counter() - start, 1)
+        self.report["rejects"].sort(key=lambda reject: reject["row"])
+        return self.report
+
+    def _progress(self):
+        if self.on_progress is not None:
+            self.on_progress(self.report)
+
+class _Done:
+    """Result holder with the AsyncResult.get() interface, for inline runs."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+def write_reject_report(rejects, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["row", "employee_id", "reason", "detail"])
+        writer.writeheader()
+        writer.writerows(rejects)
+
+def main():
+    parser = argparse.ArgumentParser(description="Enroll employees from a roster and a folder of photos")
+    parser.add_argument('--roster', required=True, help="Roster .xlsx or .csv with a header row")
+    parser.add_argument('--photos', required=True, help="Folder or .zip of photos named after employee IDs")
+    parser.add_argument('--processes', type=int, default=BULK_ENROLL_PROCESSES, help="Face processes (0 runs inline)")
+    parser.add_argument('--chunk-size', type=int, default=BULK_ENROLL_CHUNK, help="Rows per bulk write")
+    parser.add_argument('--report', help="Write rejected rows to this CSV file")
+    parser.add_argument('--dry-run', action='store_true', help="Validate and embed without writing")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    import pymongo
+    import certifi
+    from face_store import FaceImageStore
+
+    load_dotenv()
+    client = pymongo.MongoClient(os.getenv('MONGO_URI'), tls=True, tlsCAFile=certifi.where())
+    db = client['frs_db']
+    enrollment = BulkEnrollment(
+        db['employees'],
+        FaceImageStore(db['face_images']),
+        processes=args.processes,
+        chunk_size=args.chunk_size,
+        dry_run=args.dry_run,
+        on_progress=lambda report: print(f"{report['rows']} rows read, {report['enrolled']} enrolled, {report['rejected']} rejected")
+    )
+    report = enrollment.run(read_roster(args.roster), open_photos(args.photos))
+
+    print(f"{'Validated' if args.dry_run else 'Enrolled'} {report['enrolled']} of {report['rows']} rows in {report['seconds']}s, {report['rejected']} rejected")
+    for reject in report["rejects"]:
+        print(f"  row {reject['row']} {reject['employee_id']}: {reject['reason']} ({reject['detail']})")
+    if args.report:
+        write_reject_report(report["rejects"], args.report)
+        print(f"Wrote reject report to {args.report}")
+
+if __name__ == '__main__':
+    main()
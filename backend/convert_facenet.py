@@ -0,0 +1,118 @@
+"""Convert the DeepFace Facenet model for the tflite or onnx embedding backend.
+
+Int8 quantization is calibrated on aligned faces from images/, prepared exactly
+as the check-in pipeline prepares them. Check the result with
+benchmarks/embedding_parity.py before switching EMBEDDING_BACKEND.
+
+Usage: python convert_facenet.py --format tflite|onnx [--quantize none|float16|dynamic|int8] [--output PATH]
+"""
+import os
+import glob
+import argparse
+import tempfile
+import numpy as np
+from PIL import Image
+
+# Conversion always starts from the reference Keras model, whatever the deployment uses
+os.environ["EMBEDDING_BACKEND"] = "keras"
+
+import model_registry
+from embedding_backends import KerasBackend, DEFAULT_MODEL_PATHS
+from embeddings import prepare_face
+from face_pipeline import analyze_face
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def calibration_faces(backend, image_dir):
+    """Preprocessed Facenet inputs for every detectable face in image_dir, plus mirrored copies."""
+    faces = []
+    for path in sorted(glob.glob(os.path.join(image_dir, "*.jpg"))):
+        analysis = analyze_face(np.array(Image.open(path).convert('RGB')))
+        if not analysis.detected:
+            print(f"Skipping {path}: no face detected")
+            continue
+        face = prepare_face(analysis.aligned_face, backend)
+        faces.append(face)
+        faces.append(np.ascontiguousarray(face[:, ::-1]))
+    if not faces:
+        raise SystemExit(f"No calibration faces found in {image_dir}")
+    return faces
+
+def convert_tflite(keras_model, quantize, faces, output):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    if quantize != "none":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == "int8":
+        # Integer weights and activations; input and output stay float32
+        converter.representative_dataset = lambda: ([face[np.newaxis].astype(np.float32)] for face in faces)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    with open(output, "wb") as f:
+        f.write(converter.convert())
+
+def convert_onnx(keras_model, input_shape, quantize, faces, output):
+    import tensorflow as tf
+    import tf2onnx
+    width, height = input_shape
+    signature = (tf.TensorSpec((None, height, width, 3), tf.float32, name="input"),)
+    if quantize == "none":
+        tf2onnx.convert.from_keras(keras_model, input_signature=signature, opset=13, output_path=output)
+        return
+
+    from onnxruntime import quantization
+    with tempfile.TemporaryDirectory() as tmp:
+        float_path = os.path.join(tmp, "facenet_float.onnx")
+        tf2onnx.convert.from_keras(keras_model, input_signature=signature, opset=13, output_path=float_path)
+        if quantize == "dynamic":
+            quantization.quantize_dynamic(float_path, output, weight_type=quantization.QuantType.QInt8)
+            return
+
+        class FaceReader(quantization.CalibrationDataReader):
+            def __init__(self):
+                self._faces = iter(faces)
+
+            def get_next(self):
+                face = next(self._faces, None)
+                return None if face is None else {"input": face[np.newaxis].astype(np.float32)}
+
+        quantization.quantize_static(
+            float_path,
+            output,
+            FaceReader(),
+            quant_format=quantization.QuantFormat.QDQ,
+            activation_type=quantization.QuantType.QInt8,
+            weight_type=quantization.QuantType.QInt8
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert Facenet for a lightweight CPU runtime")
+    parser.add_argument('--format', choices=["tflite", "onnx"], required=True)
+    parser.add_argument('--quantize', choices=["none", "float16", "dynamic", "int8"], default="none")
+    parser.add_argument('--output', help="Where to write the model (default: the backend's default path)")
+    parser.add_argument('--calibration-dir', default=os.path.join(BASE_DIR, "images"), help="Face images for int8 calibration")
+    args = parser.parse_args()
+    if args.format == "onnx" and args.quantize == "float16":
+        parser.error("float16 is only supported for tflite")
+
+    output = args.output or DEFAULT_MODEL_PATHS[args.format]
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    backend = KerasBackend()
+    faces = []
+    if args.quantize == "int8":
+        model_registry.load_models()
+        faces = calibration_faces(backend, args.calibration_dir)
+        print(f"Calibrating on {len(faces)} faces")
+
+    if args.format == "tflite":
+        convert_tflite(backend.client.model, args.quantize, faces, output)
+    else:
+        convert_onnx(backend.client.model, backend.input_shape, args.quantize, faces, output)
+
+    print(f"Wrote {output} ({os.path.getsize(output) / 1e6:.1f} MB, quantize={args.quantize})")
+    print(f"Check it with: python benchmarks/embedding_parity.py --backend {args.format} --model-path {output}")
+
+if __name__ == '__main__':
+    main()
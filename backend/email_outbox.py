@@ -0,0 +1,244 @@
+import os
+import time
+import queue
+import smtplib
+import threading
+import traceback
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from pymongo import ReturnDocument
+
+class OutboxFull(Exception):
+    """Raised when a message cannot be queued."""
+
+class EmailOutbox:
+    """Background email sender that keeps check-in requests off the SMTP path.
+
+    Messages are persisted to a Mongo collection (when given) so they survive
+    restarts; workers claim them atomically, so several processes can share one
+    outbox. Each worker keeps an authenticated SMTP connection open between
+    messages, reconnects when it drops and retries failures with exponential
+    backoff. Without a collection the outbox is a bounded in-memory queue.
+    """
+
+    def __init__(self, sender, password, server, port, use_tls=True, collection=None,
+                 max_queue=1000, workers=1, max_attempts=5, backoff_seconds=5,
+                 max_backoff_seconds=600, batch_size=20, idle_seconds=60, poll_seconds=5,
+                 retention_seconds=7 * 24 * 3600):
+        self.sender = sender
+        self.password = password
+        self.server = server
+        self.port = port
+        self.use_tls = use_tls
+        self.collection = collection
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.batch_size = batch_size
+        self.idle_seconds = idle_seconds
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"queued": 0, "sent": 0, "retried": 0, "failed": 0, "connects": 0}
+
+    def ensure_indexes(self):
+        if self.collection is not None:
+            self.collection.create_index([("status", 1), ("next_attempt_at", 1)])
+            # Delivered messages are only kept for inspection; Mongo's TTL monitor removes them
+            # (pending and failed messages have no sent_at, so they are never expired)
+            self.collection.create_index("sent_at", expireAfterSeconds=self.retention_seconds)
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def ensure_started(self):
+        """Start the worker threads once per process (threads don't survive a fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._threads = []
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, args=(i,), name=f"email-outbox-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, to_email, subject, body):
+        """Queue an email for background delivery and return immediately."""
+        self.ensure_started()
+        message = {
+            "to": to_email,
+            "subject": subject,
+            "body": body,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": datetime.now(),
+            "created_at": datetime.now()
+        }
+        if self.collection is not None:
+            self.collection.insert_one(message)
+            # The document is persisted, so a full wake-up queue only delays delivery to the next poll
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+        else:
+            try:
+                self._queue.put_nowait(message)
+            except queue.Full:
+                raise OutboxFull(f"Email outbox is full ({self._queue.maxsize} messages pending)")
+        self._count("queued")
+
+    def _claim(self):
+        """Atomically take the next due message from Mongo."""
+        now = datetime.now()
+        stale = now - timedelta(minutes=5)
+        return self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "claimed_at": {"$lt": stale}}
+            ]},
+            {"$set": {"status": "sending", "claimed_at": now}, "$inc": {"attempts": 1}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _next_message(self, timeout):
+        if self.collection is None:
+            try:
+                message = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                return None
+            if message is not None:
+                message["attempts"] += 1
+            return message
+
+        message = self._claim()
+        if message is None:
+            try:
+                self._queue.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            message = self._claim()
+        return message
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.server, self.port, timeout=30)
+        if self.use_tls:
+            connection.starttls()
+        if self.password:
+            connection.login(self.sender, self.password)
+        self._count("connects")
+        return connection
+
+    def _close(self, connection):
+        if connection is None:
+            return
+        try:
+            connection.quit()
+        except Exception:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _deliver(self, connection, message):
+        """Send one message, reconnecting once if the held connection went away."""
+        msg = MIMEText(message["body"])
+        msg['Subject'] = message["subject"]
+        msg['From'] = self.sender
+        msg['To'] = message["to"]
+        if connection is None:
+            connection = self._connect()
+        try:
+            connection.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError, OSError):
+            self._close(connection)
+            connection = self._connect()
+            connection.send_message(msg)
+        return connection
+
+    def _backoff(self, attempts):
+        return min(self.backoff_seconds * (2 ** (attempts - 1)), self.max_backoff_seconds)
+
+    def _mark_sent(self, message):
+        self._count("sent")
+        if self.collection is not None:
+            self.collection.update_one({"_id": message["_id"]}, {"$set": {"status": "sent", "sent_at": datetime.now()}, "$unset": {"claimed_at": ""}})
+
+    def _mark_failed(self, message, error):
+        attempts = message["attempts"]
+        if attempts >= self.max_attempts:
+            self._count("failed")
+            print(f"Giving up on email to {message['to']} after {attempts} attempts: {error}")
+            if self.collection is not None:
+                self.collection.update_one({"_id": message["_id"]}, {"$set": {"status": "failed", "last_error": str(error)}})
+            return
+
+        self._count("retried")
+        delay = self._backoff(attempts)
+        print(f"Email to {message['to']} failed (attempt {attempts}), retrying in {delay}s: {error}")
+        if self.collection is not None:
+            self.collection.update_one(
+                {"_id": message["_id"]},
+                {"$set": {"status": "pending", "last_error": str(error), "next_attempt_at": datetime.now() + timedelta(seconds=delay)}}
+            )
+        else:
+            timer = threading.Timer(delay, self._requeue, args=(message,))
+            timer.daemon = True
+            timer.start()
+
+    def _requeue(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self._count("failed")
+            print(f"Dropping retry of email to {message['to']}: outbox is full")
+
+    def _worker(self, index):
+        connection = None
+        last_used = 0
+        while True:
+            # Hold the connection while there is traffic, drop it once idle
+            message = self._next_message(self.poll_seconds)
+            if message is None:
+                if connection is not None and time.monotonic() - last_used > self.idle_seconds:
+                    self._close(connection)
+                    connection = None
+                continue
+
+            # Send a burst over the same connection before waiting again
+            sent_in_burst = 0
+            while message is not None:
+                try:
+                    connection = self._deliver(connection, message)
+                    last_used = time.monotonic()
+                    self._mark_sent(message)
+                except Exception as e:
+                    if isinstance(e, smtplib.SMTPAuthenticationError):
+                        traceback.print_exc()
+                    self._close(connection)
+                    connection = None
+                    self._mark_failed(message, e)
+                sent_in_burst += 1
+                if sent_in_burst >= self.batch_size:
+                    break
+                message = self._next_message(0.01)
+
+    def stats(self):
+        """Delivery counters and the current queue depth."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        if self.collection is not None:
+            stats["pending"] = self.collection.count_documents({"status": {"$in": ["pending", "sending"]}})
+        return stats
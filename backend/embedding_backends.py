@@ -0,0 +1,107 @@
+import os
+import threading
+import numpy as np
+
+# Which runtime executes Facenet: "keras" (DeepFace/TensorFlow, the reference),
+# "tflite" or "onnx" (a model converted with convert_facenet.py).
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'keras')
+EMBEDDING_MODEL_PATH = os.getenv('EMBEDDING_MODEL_PATH')
+# Intra-op threads for the converted runtimes; 0 lets the runtime decide
+EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', '0')) or None
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+DEFAULT_MODEL_PATHS = {
+    "tflite": os.path.join(MODELS_DIR, "facenet.tflite"),
+    "onnx": os.path.join(MODELS_DIR, "facenet.onnx")
+}
+
+class KerasBackend:
+    """Facenet through DeepFace and TensorFlow; the reference implementation."""
+
+    name = "keras"
+
+    def __init__(self, model_name="Facenet"):
+        # Imported here so the converted backends never load TensorFlow
+        from deepface import DeepFace
+        # DeepFace caches built models, so other DeepFace calls reuse this instance
+        self.client = DeepFace.build_model(model_name)
+        self.input_shape = tuple(self.client.input_shape)
+        self.model_path = None
+
+    def embed(self, batch):
+        return self.client.model(batch, training=False).numpy().astype(np.float32)
+
+class TFLiteBackend:
+    """Facenet converted to TensorFlow Lite, float or quantized."""
+
+    name = "tflite"
+
+    def __init__(self, model_path, threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self.model_path = model_path
+        self.interpreter = Interpreter(model_path=model_path, num_threads=threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        _, height, width, _ = self._input["shape"]
+        self.input_shape = (int(width), int(height))
+        self._batch_size = int(self._input["shape"][0])
+        # An interpreter holds its tensors, so one batch runs at a time
+        self._lock = threading.Lock()
+
+    def embed(self, batch):
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input["index"], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            dtype = self._input["dtype"]
+            if dtype != np.float32:
+                # Fully integer model: quantize the input with the model's own parameters
+                scale, zero_point = self._input["quantization"]
+                batch = np.clip(np.round(batch / scale + zero_point), np.iinfo(dtype).min, np.iinfo(dtype).max).astype(dtype)
+            self.interpreter.set_tensor(self._input["index"], batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output["index"])
+        if self._output["dtype"] != np.float32:
+            scale, zero_point = self._output["quantization"]
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output.astype(np.float32)
+
+class OnnxBackend:
+    """Facenet converted to ONNX, run by ONNX Runtime on CPU."""
+
+    name = "onnx"
+
+    def __init__(self, model_path, threads=None):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.model_path = model_path
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self._input_name = model_input.name
+        # Converted from Keras, so the input stays NHWC
+        _, height, width, _ = model_input.shape
+        self.input_shape = (int(width), int(height))
+
+    def embed(self, batch):
+        return self.session.run(None, {self._input_name: batch})[0].astype(np.float32)
+
+def create_backend(name=EMBEDDING_BACKEND, model_path=EMBEDDING_MODEL_PATH, threads=EMBEDDING_THREADS, model_name="Facenet"):
+    """Build the embedding backend called name."""
+    if name == "keras":
+        return KerasBackend(model_name)
+    if name not in DEFAULT_MODEL_PATHS:
+        raise ValueError(f"Unknown embedding backend {name!r}, expected keras, tflite or onnx")
+    model_path = model_path or DEFAULT_MODEL_PATHS[name]
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"{model_path} not found; create it with convert_facenet.py --format {name}")
+    if name == "tflite":
+        return TFLiteBackend(model_path, threads)
+    return OnnxBackend(model_path, threads)
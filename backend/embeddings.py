@@ -0,0 +1,174 @@
+import base64
+import threading
+from datetime import datetime
+import numpy as np
+from bson.binary import Binary
+from inference_scheduler import BatchScheduler
+from embedding_backends import create_backend, EMBEDDING_BACKEND
+from image_io import decode_image
+
+# Embedding configuration. Bump EMBEDDING_VERSION whenever the model, detector or
+# normalization changes so that stored reference vectors get recomputed.
+EMBEDDING_VERSION = 2
+EMBEDDING_MODEL = 'Facenet'
+EMBEDDING_DETECTOR = 'dlib-hog'
+EMBEDDING_NORMALIZATION = 'base'
+EMBEDDING_DIM = 128
+
+# DeepFace's pre-tuned cosine distance threshold for Facenet
+VERIFY_THRESHOLD = 0.40
+
+# Optional micro-batching of Facenet forward passes across concurrent requests
+_scheduler = None
+
+# Runtime executing Facenet (see embedding_backends), created once per process
+_backend = None
+_backend_lock = threading.Lock()
+
+def decode_base64_image(image_base64):
+    """Decode a base64 encoded image into a numpy array."""
+    return decode_image(base64.b64decode(image_base64))
+
+def get_backend():
+    """Return this process's embedding backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(model_name=EMBEDDING_MODEL)
+                print(f"Embedding backend: {_backend.name}" + (f" ({_backend.model_path})" if _backend.model_path else ""))
+    return _backend
+
+def prepare_face(face, backend=None):
+    """Resize an aligned face crop into a normalized Facenet input."""
+    import cv2
+    backend = backend or get_backend()
+    face = cv2.resize(face, backend.input_shape, interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+    if EMBEDDING_NORMALIZATION != 'base':
+        # 'base' is a no-op; other schemes come from DeepFace (and so need TensorFlow)
+        from deepface.modules import preprocessing
+        face = preprocessing.normalize_input(img=face, normalization=EMBEDDING_NORMALIZATION)
+    return face
+
+def embed_faces(faces, backend=None):
+    """Run a batch of preprocessed faces through Facenet in a single forward pass."""
+    backend = backend or get_backend()
+    return backend.embed(np.stack(faces).astype(np.float32))
+
+def enable_batching(max_batch_size=8, max_wait_ms=10, max_queue=256, timeout=5.0):
+    """Route compute_embedding through a micro-batching scheduler.
+
+    Its thread starts on first use in each process, so a scheduler created
+    before gunicorn forks still runs in every worker.
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = BatchScheduler(
+            lambda faces: list(embed_faces(faces)),
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_queue=max_queue,
+            timeout=timeout,
+            name="facenet"
+        )
+        print(f"Facenet micro-batching enabled (max batch {max_batch_size}, max wait {max_wait_ms}ms)")
+    return _scheduler
+
+def batching_stats():
+    """Scheduler statistics, or None when batching is disabled."""
+    return _scheduler.stats() if _scheduler is not None else None
+
+def embed_face(face):
+    """Embed one aligned face crop, through the batching scheduler when enabled."""
+    face = prepare_face(face)
+    if _scheduler is not None:
+        return _scheduler.submit(face)
+    return embed_faces([face])[0]
+
+def compute_embedding(image, enforce_detection=False):
+    """Detect, align and embed the face in an image and return a float32 vector.
+
+    When no face is found the whole frame is embedded, unless enforce_detection is set.
+    """
+    # Imported here so processes that never run inference never load dlib and OpenCV
+    from face_pipeline import analyze_face, to_three_channels
+    analysis = analyze_face(image)
+    if not analysis.detected:
+        if enforce_detection:
+            raise ValueError("Face could not be detected in the image")
+        return embed_face(to_three_channels(image))
+    return embed_face(analysis.aligned_face)
+
+def build_embedding_record(vector):
+    """Build the versioned embedding document stored on an employee."""
+    vector = np.asarray(vector, dtype='<f4')
+    return {
+        "version": EMBEDDING_VERSION,
+        "model": EMBEDDING_MODEL,
+        "detector": EMBEDDING_DETECTOR,
+        "normalization": EMBEDDING_NORMALIZATION,
+        # The configured name, so recording a vector made in a pool process never loads the model here
+        "backend": EMBEDDING_BACKEND,
+        "dim": int(vector.shape[0]),
+        "vector": Binary(vector.tobytes()),
+        "created_at": datetime.now()
+    }
+
+def is_current(record):
+    """Check whether a stored embedding matches the current embedding configuration."""
+    return bool(record) and \
+        record.get("version") == EMBEDDING_VERSION and \
+        record.get("model") == EMBEDDING_MODEL and \
+        record.get("detector") == EMBEDDING_DETECTOR and \
+        record.get("normalization") == EMBEDDING_NORMALIZATION
+
+def decode_vector(record):
+    """Return the stored embedding as a float32 numpy vector."""
+    return np.frombuffer(record["vector"], dtype='<f4')
+
+def cosine_distance(a, b):
+    """Cosine distance between two embeddings."""
+    denom = np.linalg.norm(a) * np.linalg.norm(b)
+    if denom == 0:
+        return 1.0
+    return float(1 - np.dot(a, b) / denom)
+
+def compare_embeddings(probe, reference):
+    """Compare two embeddings the same way DeepFace.verify does (cosine distance)."""
+    distance = cosine_distance(probe, reference)
+    return {
+        "verified": distance <= VERIFY_THRESHOLD,
+        "distance": distance
+    }
+
+def load_employee_face(employee, employees_collection, face_store):
+    """Load an employee's reference image from the face store, or from a legacy base64 field."""
+    if employee.get('face_image_id'):
+        return face_store.get_array(employee['face_image_id'])
+    legacy = employee.get('face_image')
+    if legacy is None:
+        legacy = (employees_collection.find_one({"employee_id": employee['employee_id']}, {"_id": 0, "face_image": 1}) or {}).get('face_image')
+    return decode_base64_image(legacy) if legacy else None
+
+def embed_employee_face(employee, employees_collection, face_store, compute=None):
+    """Compute an embedding record from an employee's stored face image."""
+    image = load_employee_face(employee, employees_collection, face_store)
+    if image is None:
+        raise ValueError(f"No reference image found for employee ID {employee['employee_id']}")
+    return build_embedding_record((compute or compute_embedding)(image))
+
+def get_reference_embedding(employee, employees_collection, face_store, compute=None):
+    """Return the employee's reference embedding, computing and persisting it if stale or missing.
+
+    compute(image) overrides where the embedding runs (e.g. an inference pool).
+    """
+    record = employee.get('face_embedding')
+    if is_current(record):
+        return decode_vector(record)
+
+    print(f"No current embedding for {employee['employee_id']}, computing from stored face image")
+    record = embed_employee_face(employee, employees_collection, face_store, compute)
+    employees_collection.update_one({"employee_id": employee['employee_id']}, {"$set": {"face_embedding": record}})
+    # Keep the caller's copy (possibly a cached document) in step with the database
+    employee['face_embedding'] = record
+    return decode_vector(record)
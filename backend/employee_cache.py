@@ -0,0 +1,137 @@
+import os
+import time
+import threading
+import traceback
+from collections import OrderedDict
+
+# Employee fields the hot endpoints read. Only fields where a value up to ttl_seconds
+# old is harmless belong here; the password is always read from Mongo, since another
+# worker's stale copy would keep accepting it after a reset.
+EMPLOYEE_CACHE_PROJECTION = {
+    "_id": 1,
+    "employee_id": 1,
+    "employee_name": 1,
+    "email": 1,
+    "department": 1,
+    "face_embedding": 1,
+    "face_templates": 1,
+    "face_image_id": 1
+}
+
+class EmployeeCache:
+    """Bounded LRU + TTL cache of employee documents keyed by employee_id.
+
+    Writes made by this process invalidate their entry directly. Other workers
+    learn about writes from a Mongo change stream when watch is enabled;
+    otherwise their entries expire after ttl_seconds. Misses are not cached,
+    so a newly registered employee is visible immediately.
+
+    Callers must treat returned documents as read-only.
+    """
+
+    def __init__(self, collection, max_entries=2048, ttl_seconds=300, projection=EMPLOYEE_CACHE_PROJECTION, watch=False):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.projection = projection
+        self.watch = watch
+        self._entries = OrderedDict()
+        self._by_object_id = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0, "stream_events": 0}
+        self._watch_pid = None
+        # Bumped by every invalidation so a fetch that raced with a write is not cached
+        self._generation = 0
+
+    def _count(self, key):
+        self._stats[key] += 1
+
+    def get(self, employee_id):
+        """Return the employee document, from cache when fresh, else from Mongo (None if absent)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(employee_id)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(employee_id)
+                    self._count("hits")
+                    return entry[1]
+                self._drop(employee_id)
+                self._count("expired")
+            self._count("misses")
+            generation = self._generation
+
+        employee = self.collection.find_one({"employee_id": employee_id}, self.projection)
+        if employee is not None and self.max_entries > 0:
+            with self._lock:
+                if self._generation != generation:
+                    return employee
+                self._drop(employee_id)
+                self._entries[employee_id] = (now + self.ttl_seconds, employee)
+                if "_id" in employee:
+                    self._by_object_id[employee["_id"]] = employee_id
+                while len(self._entries) > self.max_entries:
+                    oldest = next(iter(self._entries))
+                    self._drop(oldest)
+                    self._count("evictions")
+        return employee
+
+    def _drop(self, employee_id):
+        entry = self._entries.pop(employee_id, None)
+        if entry is not None:
+            self._by_object_id.pop(entry[1].get("_id"), None)
+
+    def invalidate(self, employee_id):
+        """Forget one employee after a write."""
+        with self._lock:
+            self._generation += 1
+            if employee_id in self._entries:
+                self._drop(employee_id)
+                self._count("invalidations")
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_object_id.clear()
+
+    def ensure_started(self):
+        """Start the change-stream watcher once per process when watch is enabled."""
+        if not self.watch or self._watch_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watch_pid == os.getpid():
+                return
+            self._watch_pid = os.getpid()
+            threading.Thread(target=self._watch_changes, name="employee-cache-watch", daemon=True).start()
+
+    def _watch_changes(self):
+        # Change events only carry the document _id, which the cache maps back to an employee_id
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        while True:
+            try:
+                with self.collection.watch(pipeline) as stream:
+                    for change in stream:
+                        object_id = change.get("documentKey", {}).get("_id")
+                        with self._lock:
+                            self._count("stream_events")
+                            employee_id = self._by_object_id.get(object_id)
+                        if employee_id is not None:
+                            self.invalidate(employee_id)
+            except Exception as e:
+                # Events may have been missed while disconnected
+                print(f"Employee cache change stream failed, clearing cache and retrying: {e}")
+                traceback.print_exc()
+                self.clear()
+                time.sleep(5)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["watching"] = self._watch_pid == os.getpid()
+        return stats
@@ -0,0 +1,172 @@
+import threading
+import numpy as np
+from embeddings import EMBEDDING_DIM, VERIFY_THRESHOLD, is_current
+from face_templates import FACE_TEMPLATES_MAX, FACE_TEMPLATE_SCORING, employee_templates
+
+class EmbeddingIndex:
+    """In-memory 1:N search index over enrolled face embeddings.
+
+    Rows of a contiguous float32 matrix hold L2-normalized embeddings, one row
+    per template, so one matrix-vector product gives the cosine similarity to
+    every template of every employee.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM, capacity=1024):
+        self.dim = dim
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids = []
+        self._rows = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, employee_id):
+        return employee_id in self._rows
+
+    def rows(self):
+        """Number of template rows (at least one per employee)."""
+        return len(self._ids)
+
+    def _normalize(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d embeddings, got {vectors.shape[1]}")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+    def _grow(self, needed):
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:len(self._ids)] = self._matrix[:len(self._ids)]
+        self._matrix = matrix
+
+    def upsert(self, employee_id, vectors):
+        """Insert or replace an employee's templates (one vector or a k x dim array)."""
+        vectors = self._normalize(vectors)
+        with self._lock:
+            self._remove(employee_id)
+            first = len(self._ids)
+            self._grow(first + len(vectors))
+            self._matrix[first:first + len(vectors)] = vectors
+            self._ids.extend([employee_id] * len(vectors))
+            self._rows[employee_id] = list(range(first, first + len(vectors)))
+
+    def _remove(self, employee_id):
+        rows = self._rows.pop(employee_id, None)
+        if rows is None:
+            return False
+        # Fill each freed slot with the last row, highest slots first so none is moved twice
+        for row in sorted(rows, reverse=True):
+            last = len(self._ids) - 1
+            if row != last:
+                moved_id = self._ids[last]
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved_id
+                moved_rows = self._rows[moved_id]
+                moved_rows[moved_rows.index(last)] = row
+            self._ids.pop()
+        return True
+
+    def remove(self, employee_id):
+        """Drop every template of an employee from the index."""
+        with self._lock:
+            return self._remove(employee_id)
+
+    def load(self, items):
+        """Replace the index contents with (employee_id, vector or k x dim templates) pairs."""
+        blocks, ids, rows = [], [], {}
+        for employee_id, vectors in items:
+            if employee_id in rows:
+                continue
+            vectors = self._normalize(vectors)
+            rows[employee_id] = list(range(len(ids), len(ids) + len(vectors)))
+            ids.extend([employee_id] * len(vectors))
+            blocks.append(vectors)
+        matrix = np.zeros((max(len(ids), 1024), self.dim), dtype=np.float32)
+        if blocks:
+            matrix[:len(ids)] = np.vstack(blocks)
+        with self._lock:
+            self._matrix, self._ids, self._rows = matrix, ids, rows
+
+    def upsert_many(self, items):
+        """Insert or replace several employees' templates from (employee_id, vectors) pairs."""
+        with self._lock:
+            for employee_id, vectors in items:
+                self.upsert(employee_id, vectors)
+
+    def load_from(self, items_factory):
+        """Fill the index from items_factory(); see MappedEmbeddingIndex for a shared variant."""
+        self.load(items_factory())
+
+    def search(self, vector, k=1, scoring=FACE_TEMPLATE_SCORING):
+        """Return the top-k (employee_id, similarity) pairs, best first."""
+        query = self._normalize(vector)[0]
+        with self._lock:
+            count = len(self._ids)
+            if count == 0:
+                return []
+            return rank_employees(self._matrix[:count] @ query, self._ids, self._rows, k, scoring)
+
+def rank_employees(scores, ids, rows, k, scoring=FACE_TEMPLATE_SCORING):
+    """Top-k (employee_id, similarity) pairs from per-row scores, best first.
+
+    Candidates are the employees owning the best-scoring rows; with "mean"
+    scoring they are then re-scored by the average over all their templates.
+    """
+    count = len(scores)
+    # Enough rows to hold k distinct employees even if the best ones each match on every template
+    candidates = min(count, k * max(FACE_TEMPLATES_MAX, 1))
+    if candidates < count:
+        top = np.argpartition(scores, count - candidates)[count - candidates:]
+    else:
+        top = np.arange(count)
+    top = top[np.argsort(scores[top])[::-1]]
+    matches = []
+    seen = set()
+    for i in top:
+        employee_id = ids[i]
+        if employee_id in seen:
+            continue
+        seen.add(employee_id)
+        if scoring == 'mean':
+            matches.append((employee_id, float(scores[rows[employee_id]].mean())))
+        else:
+            matches.append((employee_id, float(scores[i])))
+        if len(matches) == k:
+            break
+    if scoring == 'mean':
+        matches.sort(key=lambda match: match[1], reverse=True)
+    return matches
+
+def load_index_from_collection(index, employees_collection):
+    """Fill the index with the templates of every employee that has a current embedding."""
+    def employee_items():
+        cursor = employees_collection.find(
+            {"face_embedding": {"$exists": True}},
+            {"_id": 0, "employee_id": 1, "face_embedding": 1, "face_templates": 1}
+        )
+        return (
+            (employee["employee_id"], employee_templates(employee))
+            for employee in cursor
+            if is_current(employee.get("face_embedding"))
+        )
+
+    index.load_from(employee_items)
+    print(f"Loaded {len(index)} employees ({index.rows()} face templates) into the identification index")
+    return index
+
+def match_result(employee_id, similarity):
+    """Format a search hit the way the verification endpoints report scores."""
+    distance = 1 - similarity
+    return {
+        "employeeID": employee_id,
+        "similarity_score": similarity * 100,
+        "verified": distance <= VERIFY_THRESHOLD
+    }
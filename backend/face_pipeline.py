@@ -0,0 +1,118 @@
+import os
+import math
+import numpy as np
+import cv2
+import dlib
+from scipy.spatial import distance as dist
+from imutils import face_utils
+import model_registry
+
+# Detection runs on a copy downscaled so its longest side is at most DETECT_MAX_SIDE;
+# the box is mapped back and landmarks are fitted on the full-resolution frame.
+DETECT_MAX_SIDE = int(os.getenv('DETECT_MAX_SIDE', '480'))
+DETECT_UPSAMPLE = int(os.getenv('DETECT_UPSAMPLE', '0'))
+# Extra border around the detected box in the aligned crop, as a fraction of its size
+CROP_MARGIN = float(os.getenv('FACE_CROP_MARGIN', '0.0'))
+
+class FaceAnalysis:
+    """Everything one detection pass produces for a frame."""
+
+    def __init__(self, image, gray, num_faces=0, box=None, landmarks=None, eye_distance=None, aligned_face=None, scale=1.0):
+        self.image = image
+        self.gray = gray
+        self.num_faces = num_faces
+        self.box = box
+        self.landmarks = landmarks
+        self.eye_distance = eye_distance
+        self.aligned_face = aligned_face
+        self.scale = scale
+
+    @property
+    def detected(self):
+        return self.box is not None
+
+    def metadata(self):
+        """Detection details safe to return in API responses."""
+        if not self.detected:
+            return {"faces": self.num_faces}
+        left, top, right, bottom = self.box
+        return {
+            "faces": self.num_faces,
+            "box": {"x": left, "y": top, "w": right - left, "h": bottom - top},
+            "eye_distance": round(self.eye_distance, 2),
+            "detection_scale": round(self.scale, 3)
+        }
+
+def to_three_channels(image):
+    """Drop alpha / expand grayscale so every frame is HxWx3 uint8."""
+    image = np.asarray(image)
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[2] == 4:
+        return np.ascontiguousarray(image[:, :, :3])
+    return image
+
+def detect_faces(gray):
+    """Run the HOG detector on a downscaled copy and return full-resolution boxes and the scale used."""
+    height, width = gray.shape[:2]
+    scale = min(1.0, DETECT_MAX_SIDE / float(max(height, width)))
+    small = gray if scale == 1.0 else cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    rects = model_registry.detector(small, DETECT_UPSAMPLE)
+    boxes = []
+    for rect in rects:
+        left = max(0, int(rect.left() / scale))
+        top = max(0, int(rect.top() / scale))
+        right = min(width, int(rect.right() / scale))
+        bottom = min(height, int(rect.bottom() / scale))
+        boxes.append((left, top, right, bottom))
+    # Largest face first
+    boxes.sort(key=lambda b: (b[2] - b[0]) * (b[3] - b[1]), reverse=True)
+    return boxes, scale
+
+def align_face(image, box, left_eye_center, right_eye_center):
+    """Rotate the face so the eyes are level and crop it square, in a single warp."""
+    left, top, right, bottom = box
+    side = int(max(right - left, bottom - top) * (1 + CROP_MARGIN))
+    face_center = ((left + right) / 2.0, (top + bottom) / 2.0)
+    eyes_center = ((left_eye_center[0] + right_eye_center[0]) / 2.0, (left_eye_center[1] + right_eye_center[1]) / 2.0)
+    angle = math.degrees(math.atan2(right_eye_center[1] - left_eye_center[1], right_eye_center[0] - left_eye_center[0]))
+
+    matrix = cv2.getRotationMatrix2D(eyes_center, angle, 1.0)
+    mapped_center = matrix @ np.array([face_center[0], face_center[1], 1.0])
+    matrix[0, 2] += side / 2.0 - mapped_center[0]
+    matrix[1, 2] += side / 2.0 - mapped_center[1]
+    return cv2.warpAffine(image, matrix, (side, side), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+
+def analyze_face(image, box=None):
+    """Detect once, fit landmarks once and derive eye distance and the aligned crop together.
+
+    When a box is given (e.g. from a tracker following the face across frames)
+    detection is skipped and landmarks are fitted inside that box.
+    """
+    image = to_three_channels(image)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if box is not None:
+        boxes, scale = [tuple(int(v) for v in box)], 1.0
+    else:
+        boxes, scale = detect_faces(gray)
+    if not boxes:
+        return FaceAnalysis(image, gray, num_faces=0, scale=scale)
+
+    box = boxes[0]
+    shape = model_registry.predictor(gray, dlib.rectangle(*box))
+    landmarks = face_utils.shape_to_np(shape)
+    left_eye_center = landmarks[36:42].mean(axis=0)
+    right_eye_center = landmarks[42:48].mean(axis=0)
+    eye_distance = dist.euclidean(left_eye_center, right_eye_center)
+    aligned_face = align_face(image, box, left_eye_center, right_eye_center)
+
+    return FaceAnalysis(
+        image,
+        gray,
+        num_faces=len(boxes),
+        box=box,
+        landmarks=landmarks,
+        eye_distance=eye_distance,
+        aligned_face=aligned_face,
+        scale=scale
+    )
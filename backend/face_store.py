@@ -0,0 +1,112 @@
+import io
+import os
+import hashlib
+from datetime import datetime, timedelta, timezone
+from PIL import Image
+from bson.binary import Binary
+from pymongo import UpdateOne
+from image_io import normalize_image, decode_image
+
+# Stored faces are normalized once: EXIF-rotated, RGB, longest side capped, re-encoded as JPEG
+FACE_MAX_SIDE = int(os.getenv('FACE_MAX_SIDE', '640'))
+FACE_THUMB_SIDE = int(os.getenv('FACE_THUMB_SIDE', '160'))
+FACE_JPEG_QUALITY = int(os.getenv('FACE_JPEG_QUALITY', '90'))
+
+def _encode_jpeg(image, max_side):
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=FACE_JPEG_QUALITY)
+    return buffer.getvalue(), image.size
+
+def normalize_face_image(image):
+    """Return (jpeg_bytes, (width, height)) for the normalized full-size variant of a PIL image."""
+    return _encode_jpeg(normalize_image(image), FACE_MAX_SIDE)
+
+def face_thumbnail(data):
+    """Return the thumbnail JPEG bytes for normalized face image bytes."""
+    return _encode_jpeg(Image.open(io.BytesIO(data)), FACE_THUMB_SIDE)[0]
+
+def decode_jpeg(data):
+    """Decode stored JPEG bytes into a numpy array."""
+    return decode_image(data, max_side=None)
+
+class FaceImageStore:
+    """Content-addressed store for face images as BSON binary, outside the employee documents.
+
+    Documents are keyed by the SHA-256 of the normalized JPEG and hold the
+    normalized image plus a small thumbnail, so the same photo is stored once
+    and employee queries never carry image bytes.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def _image_doc(self, data, size, thumb=None):
+        return {
+            "data": Binary(data),
+            "thumb": Binary(thumb if thumb is not None else face_thumbnail(data)),
+            "width": size[0],
+            "height": size[1],
+            "content_type": "image/jpeg",
+            "bytes": len(data),
+            "created_at": datetime.now()
+        }
+
+    def put_normalized(self, data, size, thumb=None):
+        """Store already-normalized JPEG bytes and return the image id."""
+        image_id = hashlib.sha256(data).hexdigest()
+        self.collection.update_one(
+            {"_id": image_id},
+            {"$setOnInsert": self._image_doc(data, size, thumb)},
+            upsert=True
+        )
+        return image_id
+
+    def put_many_normalized(self, images):
+        """Store (data, size, thumb) tuples of normalized images in one bulk write; return their ids in order."""
+        image_ids = [hashlib.sha256(data).hexdigest() for data, _, _ in images]
+        operations = [
+            UpdateOne({"_id": image_id}, {"$setOnInsert": self._image_doc(data, size, thumb)}, upsert=True)
+            for image_id, (data, size, thumb) in zip(image_ids, images)
+        ]
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+        return image_ids
+
+    def ensure_indexes(self):
+        # Only staged images carry expires_at; committed ones are never removed
+        self.collection.create_index([("expires_at", 1)], expireAfterSeconds=0, name="expires_at_ttl")
+
+    def stage_normalized(self, data, size, ttl_seconds):
+        """Store an image for a registration awaiting confirmation; it is removed unless committed in time."""
+        image_id = hashlib.sha256(data).hexdigest()
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+        self.collection.update_one(
+            {"_id": image_id},
+            {"$setOnInsert": dict(self._image_doc(data, size), expires_at=expires_at)},
+            upsert=True
+        )
+        # Staged again before it expired: keep it for the new registration too
+        self.collection.update_one({"_id": image_id, "expires_at": {"$exists": True}}, {"$max": {"expires_at": expires_at}})
+        return image_id
+
+    def commit(self, image_id):
+        """Keep a staged image permanently; False if it already expired."""
+        result = self.collection.update_one({"_id": image_id}, {"$unset": {"expires_at": ""}})
+        return result.matched_count == 1
+
+    def put(self, image):
+        """Normalize and store a PIL image; return the image id."""
+        data, size = normalize_face_image(image)
+        return self.put_normalized(data, size)
+
+    def get_bytes(self, image_id, variant="data"):
+        """Return the JPEG bytes of the full ("data") or "thumb" variant, or None."""
+        doc = self.collection.find_one({"_id": image_id}, {variant: 1})
+        return bytes(doc[variant]) if doc else None
+
+    def get_array(self, image_id):
+        """Return the normalized face image as a numpy array, or None."""
+        data = self.get_bytes(image_id)
+        return decode_jpeg(data) if data is not None else None
@@ -0,0 +1,154 @@
+import os
+from datetime import datetime, timedelta
+import numpy as np
+from bson.binary import Binary
+from embeddings import (
+    EMBEDDING_VERSION,
+    EMBEDDING_MODEL,
+    EMBEDDING_DETECTOR,
+    EMBEDDING_NORMALIZATION,
+    EMBEDDING_DIM,
+    VERIFY_THRESHOLD,
+    is_current,
+    decode_vector,
+    get_reference_embedding
+)
+from embedding_backends import EMBEDDING_BACKEND
+
+# An employee is matched against up to FACE_TEMPLATES_MAX embeddings: the enrolled
+# one (face_embedding, never evicted) plus templates learned from confident check-ins
+# (face_templates, stored as one k x dim float32 array).
+FACE_TEMPLATES_MAX = int(os.getenv('FACE_TEMPLATES_MAX', '5'))
+# "max" scores a probe by its best template, "mean" by the average over all templates
+FACE_TEMPLATE_SCORING = os.getenv('FACE_TEMPLATE_SCORING', 'max')
+FACE_TEMPLATE_LEARN = os.getenv('FACE_TEMPLATE_LEARN', '1') == '1'
+# A check-in becomes a template when it scored at least FACE_TEMPLATE_ADD_SCORE but
+# below FACE_TEMPLATE_NOVELTY against every template it already has (else it adds nothing)
+FACE_TEMPLATE_ADD_SCORE = float(os.getenv('FACE_TEMPLATE_ADD_SCORE', '80'))
+FACE_TEMPLATE_NOVELTY = float(os.getenv('FACE_TEMPLATE_NOVELTY', '92'))
+# Learned templates no check-in has matched for this long are dropped
+FACE_TEMPLATE_STALE_DAYS = int(os.getenv('FACE_TEMPLATE_STALE_DAYS', '90'))
+# last_matched_at is only written back when older than this, not on every check-in
+FACE_TEMPLATE_TOUCH_HOURS = int(os.getenv('FACE_TEMPLATE_TOUCH_HOURS', '24'))
+
+def normalize_rows(vectors):
+    """L2-normalize each row of a k x dim array."""
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+def build_templates_record(vectors, added_at, last_matched_at):
+    """Build the versioned learned-templates document stored on an employee."""
+    vectors = np.asarray(vectors, dtype='<f4').reshape(-1, EMBEDDING_DIM)
+    return {
+        "version": EMBEDDING_VERSION,
+        "model": EMBEDDING_MODEL,
+        "detector": EMBEDDING_DETECTOR,
+        "normalization": EMBEDDING_NORMALIZATION,
+        "backend": EMBEDDING_BACKEND,
+        "dim": EMBEDDING_DIM,
+        "count": int(vectors.shape[0]),
+        "vectors": Binary(vectors.tobytes()),
+        "added_at": list(added_at),
+        "last_matched_at": list(last_matched_at),
+        "updated_at": datetime.now()
+    }
+
+def learned_templates(employee):
+    """The employee's learned templates as a k x dim array (k may be 0), ignoring stale configurations."""
+    record = employee.get('face_templates')
+    if not is_current(record) or not record.get("count"):
+        return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    return np.frombuffer(record["vectors"], dtype='<f4').reshape(record["count"], EMBEDDING_DIM)
+
+def employee_templates(employee):
+    """Enrolled plus learned templates as a k x dim array, or None without a current enrolled embedding."""
+    record = employee.get('face_embedding')
+    if not is_current(record):
+        return None
+    return np.vstack([decode_vector(record).reshape(1, -1), learned_templates(employee)])
+
+def get_reference_templates(employee, employees_collection, face_store, compute=None):
+    """Like get_reference_embedding, but returns every template of the employee (enrolled first)."""
+    enrolled = get_reference_embedding(employee, employees_collection, face_store, compute)
+    return np.vstack([enrolled.reshape(1, -1), learned_templates(employee)])
+
+def template_similarities(probe, templates):
+    """Cosine similarity of the probe to each template, in one matrix-vector product."""
+    probe = normalize_rows(probe)[0]
+    return normalize_rows(templates) @ probe
+
+def aggregate(similarities, scoring=FACE_TEMPLATE_SCORING):
+    """Collapse per-template similarities into one score."""
+    return float(similarities.mean() if scoring == 'mean' else similarities.max())
+
+def compare_templates(probe, templates, scoring=FACE_TEMPLATE_SCORING):
+    """compare_embeddings against a set of templates; also returns the per-template similarities."""
+    similarities = template_similarities(probe, templates)
+    distance = 1 - aggregate(similarities, scoring)
+    return {
+        "verified": distance <= VERIFY_THRESHOLD,
+        "distance": distance,
+        "similarities": similarities
+    }
+
+def learn_from_checkin(employee, probe, similarities, employees_collection, now=None):
+    """Apply the template policy after a successful check-in and persist any change.
+
+    similarities are the probe's scores against employee_templates(employee)
+    (enrolled first). A confident but novel probe is added, evicting the learned
+    template matched least recently once the set is full; templates unmatched
+    for FACE_TEMPLATE_STALE_DAYS are dropped; the best match's last_matched_at
+    is refreshed at most every FACE_TEMPLATE_TOUCH_HOURS. Returns the new
+    template array when the set changed, else None.
+
+    The write is conditional on the record the decision was based on, so of two
+    workers learning for the same employee at once only one wins; the other
+    check-in is simply not learned from.
+    """
+    if not FACE_TEMPLATE_LEARN or FACE_TEMPLATES_MAX < 2:
+        return None
+    now = now or datetime.now()
+    record = employee.get('face_templates') if is_current(employee.get('face_templates')) else None
+    vectors = list(learned_templates(employee))
+    added_at = list(record["added_at"]) if record else []
+    last_matched_at = list(record["last_matched_at"]) if record else []
+
+    changed = False
+    touched = False
+    best = int(np.argmax(similarities))
+    if best > 0 and now - last_matched_at[best - 1] >= timedelta(hours=FACE_TEMPLATE_TOUCH_HOURS):
+        last_matched_at[best - 1] = now
+        touched = True
+
+    stale_before = now - timedelta(days=FACE_TEMPLATE_STALE_DAYS)
+    keep = [i for i, matched in enumerate(last_matched_at) if matched >= stale_before]
+    if len(keep) < len(vectors):
+        vectors = [vectors[i] for i in keep]
+        added_at = [added_at[i] for i in keep]
+        last_matched_at = [last_matched_at[i] for i in keep]
+        changed = True
+
+    score = aggregate(similarities) * 100
+    if score >= FACE_TEMPLATE_ADD_SCORE and similarities.max() * 100 < FACE_TEMPLATE_NOVELTY:
+        if len(vectors) >= FACE_TEMPLATES_MAX - 1:
+            oldest = min(range(len(vectors)), key=lambda i: last_matched_at[i])
+            del vectors[oldest], added_at[oldest], last_matched_at[oldest]
+        vectors.append(normalize_rows(probe)[0])
+        added_at.append(now)
+        last_matched_at.append(now)
+        changed = True
+
+    if not changed and not touched:
+        return None
+    stored = employee.get('face_templates')
+    previous = {"face_templates.updated_at": stored["updated_at"] if stored else {"$exists": False}}
+    if vectors:
+        update = {"$set": {"face_templates": build_templates_record(vectors, added_at, last_matched_at)}}
+    else:
+        update = {"$unset": {"face_templates": ""}}
+    result = employees_collection.update_one({"employee_id": employee["employee_id"], **previous}, update)
+    if not changed or result.matched_count == 0:
+        return None
+    enrolled = decode_vector(employee["face_embedding"]).reshape(1, -1)
+    return np.vstack([enrolled] + [np.asarray(vectors, dtype=np.float32).reshape(-1, EMBEDDING_DIM)])
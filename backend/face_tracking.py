@@ -0,0 +1,58 @@
+import os
+import dlib
+
+# Below this peak-to-sidelobe ratio the tracker has probably lost the face
+TRACK_MIN_CONFIDENCE = float(os.getenv('TRACK_MIN_CONFIDENCE', '7.0'))
+# Re-run the detector at least this often even while tracking looks good
+TRACK_REDETECT_EVERY = int(os.getenv('TRACK_REDETECT_EVERY', '8'))
+TRACK_MIN_SIDE = 20
+
+class FaceTracker:
+    """Follows one face across video frames with dlib's correlation tracker.
+
+    Tracking a known box costs a fraction of a HOG detection pass, so a stream
+    only runs the detector on its first frame, when the tracker loses
+    confidence, and every TRACK_REDETECT_EVERY frames to correct drift.
+    """
+
+    def __init__(self, min_confidence=TRACK_MIN_CONFIDENCE, redetect_every=TRACK_REDETECT_EVERY):
+        self.min_confidence = min_confidence
+        self.redetect_every = redetect_every
+        self._tracker = None
+        self._frames_since_detection = 0
+
+    @property
+    def tracking(self):
+        return self._tracker is not None
+
+    def reset(self):
+        self._tracker = None
+
+    def start(self, image, box):
+        """Start following the face at box = (left, top, right, bottom) in image."""
+        self._tracker = dlib.correlation_tracker()
+        self._tracker.start_track(image, dlib.rectangle(*box))
+        self._frames_since_detection = 0
+
+    def update(self, image):
+        """Return the face box in this frame, or None when the caller should detect again."""
+        if self._tracker is None or self._frames_since_detection >= self.redetect_every:
+            return None
+        confidence = self._tracker.update(image)
+        self._frames_since_detection += 1
+        if confidence < self.min_confidence:
+            self.reset()
+            return None
+
+        position = self._tracker.get_position()
+        height, width = image.shape[:2]
+        box = (
+            max(0, int(position.left())),
+            max(0, int(position.top())),
+            min(width, int(position.right())),
+            min(height, int(position.bottom()))
+        )
+        if box[2] - box[0] < TRACK_MIN_SIDE or box[3] - box[1] < TRACK_MIN_SIDE:
+            self.reset()
+            return None
+        return box
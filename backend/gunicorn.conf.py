@@ -0,0 +1,24 @@
+import os
+import gc
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+# MODEL_PRELOAD=1 imports the app (and loads + warms the face models) once in the
+# master. Forked workers then share the read-only model pages copy-on-write instead
+# of each building a private copy.
+preload_app = os.getenv('MODEL_PRELOAD', '0') == '1'
+
+def pre_fork(server, worker):
+    # Move everything allocated so far out of the collector's reach, so gc passes in
+    # the workers don't touch (and copy) the shared pages.
+    if preload_app:
+        gc.freeze()
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} forked (preloaded models: {preload_app})")
+
+# Threads per worker. With more than one thread concurrent check-ins can share a
+# Facenet forward pass when INFERENCE_BATCHING=1.
+threads = int(os.getenv('GUNICORN_THREADS', '1'))
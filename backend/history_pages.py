@@ -0,0 +1,67 @@
+import os
+import json
+import base64
+from datetime import datetime
+
+# Attendance history is served newest first in pages of at most HISTORY_MAX_PAGE_SIZE records
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '100'))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv('HISTORY_MAX_PAGE_SIZE', '500'))
+HISTORY_SORT = [("date", -1), ("timestamp", -1)]
+HISTORY_PROJECTION = {"_id": 0, "date": 1, "timestamp": 1, "in_time": 1, "time": 1, "status": 1, "late_time": 1}
+
+def page_size(value):
+    """Parse the limit query parameter, capped at HISTORY_MAX_PAGE_SIZE."""
+    if not value:
+        return HISTORY_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be a positive integer")
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, HISTORY_MAX_PAGE_SIZE)
+
+def encode_cursor(record):
+    """Opaque cursor pointing just past record in (date, timestamp) descending order."""
+    timestamp = record.get("timestamp")
+    key = [record["date"], timestamp.isoformat() if isinstance(timestamp, datetime) else None]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce."""
+    try:
+        date, timestamp = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(date), datetime.fromisoformat(timestamp) if timestamp else None
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def after_cursor(query, cursor):
+    """Restrict query to records that sort after cursor, so each page is one index range scan."""
+    if not cursor:
+        return query
+    date, timestamp = decode_cursor(cursor)
+    if timestamp is None:
+        keyset = {"date": {"$lt": date}}
+    else:
+        # Legacy records without a timestamp sort last within their date
+        keyset = {"$or": [
+            {"date": {"$lt": date}},
+            {"date": date, "timestamp": {"$lt": timestamp}},
+            {"date": date, "timestamp": None}
+        ]}
+    return {"$and": [query, keyset]}
+
+def fetch_page(collection, query, limit, cursor=None):
+    """Return (records, next_cursor) for one page of query, newest first."""
+    records = list(collection.find(after_cursor(query, cursor), HISTORY_PROJECTION).sort(HISTORY_SORT).limit(limit + 1))
+    if len(records) <= limit:
+        return records, None
+    records = records[:limit]
+    return records, encode_cursor(records[-1])
+
+def stream_page(key, records, format_record, next_cursor):
+    """Yield the JSON body {"success": true, key: [...], "next_cursor": ...} one record at a time."""
+    yield '{"success": true, "%s": [' % key
+    for i, record in enumerate(records):
+        yield ("," if i else "") + json.dumps(format_record(record))
+    yield '], "next_cursor": %s}' % json.dumps(next_cursor)
@@ -0,0 +1,82 @@
+import io
+import os
+import numpy as np
+from PIL import Image, ImageOps
+
+# Upload limits, checked before any pixels are decoded
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(5 * 1024 * 1024)))
+MAX_IMAGE_SIDE = int(os.getenv('MAX_IMAGE_SIDE', '4096'))
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', str(4096 * 4096)))
+# Working resolution for probe images; detection already runs at DETECT_MAX_SIDE (480)
+DECODE_MAX_SIDE = int(os.getenv('DECODE_MAX_SIDE', '640'))
+
+EXIF_ORIENTATION = 0x0112
+
+# Pillow's own decompression-bomb guard, aligned with ours
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+class InvalidImage(ValueError):
+    """Raised for uploads that are not a usable image."""
+    status_code = 400
+
+class ImageTooLarge(InvalidImage):
+    """Raised for uploads over the byte or dimension limits."""
+    status_code = 413
+
+def read_upload(file, max_bytes=MAX_UPLOAD_BYTES):
+    """Read an uploaded file, refusing anything larger than max_bytes."""
+    data = file.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ImageTooLarge(f"Image is larger than {max_bytes // 1024} KB")
+    if not data:
+        raise InvalidImage("Image is empty")
+    return data
+
+def normalize_image(image):
+    """Apply EXIF orientation and convert to RGB, each only when the image needs it."""
+    if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+def open_image(source, max_side=None):
+    """Open image bytes or a file object as an upright RGB PIL image.
+
+    Dimensions are checked from the header before decoding. With max_side set,
+    JPEGs are decoded in draft mode: libjpeg scales by 1/2, 1/4 or 1/8 while
+    decoding, so a large frame is never materialized at full resolution. The
+    result is at least max_side on its longest side when the source is.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    try:
+        image = Image.open(source)
+    except Exception as e:
+        raise InvalidImage(f"Could not read image: {e}")
+
+    width, height = image.size
+    if max(width, height) > MAX_IMAGE_SIDE or width * height > MAX_IMAGE_PIXELS:
+        raise ImageTooLarge(f"Image is {width}x{height}, the limit is {MAX_IMAGE_SIDE} px per side")
+
+    if max_side and max(width, height) > max_side:
+        scale = max_side / float(max(width, height))
+        image.draft('RGB', (int(width * scale), int(height * scale)))
+    try:
+        return normalize_image(image)
+    except (OSError, SyntaxError) as e:
+        raise InvalidImage(f"Could not decode image: {e}")
+
+def decode_image(source, max_side=DECODE_MAX_SIDE):
+    """Decode an image straight to an HxWx3 uint8 RGB array, longest side at most max_side.
+
+    This is the only decode a probe image needs: the face pipeline takes the
+    array as is.
+    """
+    image = open_image(source, max_side)
+    try:
+        if max_side and max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.BILINEAR)
+        return np.array(image)
+    except (OSError, SyntaxError) as e:
+        raise InvalidImage(f"Could not decode image: {e}")
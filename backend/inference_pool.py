@@ -0,0 +1,171 @@
+import os
+import time
+import threading
+import multiprocessing
+from image_io import decode_image
+
+class PoolBusy(Exception):
+    """Raised when the inference pool already has its maximum number of pending jobs."""
+
+class InferenceTimeout(TimeoutError):
+    """Raised when an inference job does not finish in time."""
+
+def _to_array(image):
+    if isinstance(image, (bytes, bytearray)):
+        return decode_image(image)
+    return image
+
+def analyze_and_embed(image, min_eye_distance=10, box=None):
+    """Detect, align and embed a face; the whole CPU-bound part of a check-in.
+
+    Runs inline or inside a pool process. The embedding is skipped when the
+    face fails the quality gate (none found, too far, blurry, badly lit, turned
+    away...). Passing a box (from a tracker) skips detection. Stage timings are returned so the caller can record them even
+    when this ran in another process.
+    """
+    # Imported here so a web process that only submits jobs never loads the models
+    from face_pipeline import analyze_face
+    from embeddings import embed_face
+    from quality_gate import assess
+
+    timings = {}
+    start = time.perf_counter()
+    image = _to_array(image)
+    timings["decode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    analysis = analyze_face(image, box=box)
+    timings["detection" if box is None else "landmarks"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    quality = assess(analysis, min_eye_distance)
+    timings["quality"] = time.perf_counter() - start
+
+    result = {
+        "detected": analysis.detected,
+        "num_faces": analysis.num_faces,
+        "box": analysis.box,
+        "eye_distance": analysis.eye_distance,
+        "metadata": analysis.metadata(),
+        "quality": quality,
+        "embedding": None,
+        "timings": timings
+    }
+    if quality["passed"]:
+        start = time.perf_counter()
+        result["embedding"] = embed_face(analysis.aligned_face)
+        timings["embedding"] = time.perf_counter() - start
+    return result
+
+def embed_image(image, enforce_detection=False):
+    """Compute a reference embedding for an enrollment image (inline or in a pool process)."""
+    from embeddings import compute_embedding
+    return compute_embedding(_to_array(image), enforce_detection=enforce_detection)
+
+def _init_worker(threads, ready_counter):
+    """Pool process initializer: size thread pools for this process, then load and warm the models."""
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ.setdefault("EMBEDDING_THREADS", str(threads))
+    import cv2
+    cv2.setNumThreads(threads)
+    import embedding_backends
+    if embedding_backends.EMBEDDING_BACKEND == "keras":
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    import model_registry
+    model_registry.ensure_ready()
+    with ready_counter.get_lock():
+        ready_counter.value += 1
+
+class InferencePool:
+    """Pre-warmed pool of inference processes with a bounded number of pending jobs.
+
+    Keeps face detection and Facenet off the web worker so I/O-only endpoints
+    are not stuck behind check-ins. When max_pending jobs are already in flight,
+    run() raises PoolBusy immediately instead of queueing without bound.
+    """
+
+    def __init__(self, processes=2, max_pending=None, threads_per_process=None, timeout=10.0):
+        self.processes = processes
+        self.max_pending = max_pending or processes * 2
+        self.threads_per_process = threads_per_process or max(1, (os.cpu_count() or 1) // processes)
+        self.timeout = timeout
+        self._pool = None
+        self._pid = None
+        self._ready = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "completed": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+
+    def ensure_started(self):
+        """Start the pool once per web worker process (a pool does not survive a fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # spawn, not fork: children start clean instead of inheriting TensorFlow state
+            context = multiprocessing.get_context("spawn")
+            self._ready = context.Value("i", 0)
+            self._slots = threading.BoundedSemaphore(self.max_pending)
+            self._pending = 0
+            self._pool = context.Pool(
+                processes=self.processes,
+                initializer=_init_worker,
+                initargs=(self.threads_per_process, self._ready)
+            )
+            self._pid = os.getpid()
+            print(f"Started inference pool: {self.processes} processes x {self.threads_per_process} threads, {self.max_pending} max pending")
+
+    def is_ready(self):
+        """True once every pool process has loaded and warmed its models."""
+        return self._ready is not None and self._pid == os.getpid() and self._ready.value >= self.processes
+
+    def _release(self, _):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def run(self, func, *args):
+        """Run func(*args) in the pool and wait for the result."""
+        self.ensure_started()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise PoolBusy(f"Inference pool has {self.max_pending} jobs pending")
+        with self._lock:
+            self._pending += 1
+            self._stats["submitted"] += 1
+
+        job = self._pool.apply_async(func, args, callback=self._release, error_callback=self._release)
+        try:
+            result = job.get(self.timeout)
+        except multiprocessing.TimeoutError:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise InferenceTimeout(f"Inference did not finish within {self.timeout}s")
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        with self._lock:
+            self._stats["completed"] += 1
+        return result
+
+    def pending(self):
+        return self._pending
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = self._pending
+        stats["processes"] = self.processes
+        stats["threads_per_process"] = self.threads_per_process
+        stats["max_pending"] = self.max_pending
+        stats["ready_processes"] = self._ready.value if self._ready is not None else 0
+        return stats
@@ -0,0 +1,167 @@
+import os
+import time
+import queue
+import threading
+import traceback
+
+class SchedulerBusy(Exception):
+    """Raised when the batching queue is full."""
+
+class SchedulerTimeout(TimeoutError):
+    """Raised when a request's result is not ready within its timeout."""
+
+class _Pending:
+    __slots__ = ("item", "event", "result", "error", "deadline", "abandoned")
+
+    def __init__(self, item, deadline):
+        self.item = item
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.deadline = deadline
+        self.abandoned = False
+
+class BatchScheduler:
+    """Collects inference inputs from concurrent requests and runs them as one batch.
+
+    A batch is flushed when it reaches max_batch_size or when the oldest queued
+    item has waited max_wait_ms, whichever comes first. run_batch receives a list
+    of items and must return a list of results in the same order.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=10, max_queue=256, timeout=None, name="inference"):
+        self.run_batch = run_batch
+        self.timeout = timeout
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._running = False
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "batches": 0,
+            "max_batch_size_seen": 0,
+            "batch_sizes": {}
+        }
+
+    def start(self):
+        """Start the batcher thread once per process (a thread doesn't survive a fork)."""
+        if self._running and self._pid == os.getpid():
+            return self
+        with self._start_lock:
+            if self._running and self._pid == os.getpid():
+                return self
+            if self._pid != os.getpid():
+                # Items queued in the parent have no thread left to answer them here, and a
+                # lock held by the parent's batcher at the fork would never be released
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self._stats_lock = threading.Lock()
+            self._pid = os.getpid()
+            self._running = True
+            self._thread = threading.Thread(target=self._loop, name=f"{self.name}-batcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def submit(self, item, timeout=None):
+        """Queue an item and block until its result is ready."""
+        self.start()
+        timeout = timeout if timeout is not None else self.timeout
+        deadline = time.monotonic() + timeout if timeout else None
+        pending = _Pending(item, deadline)
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            self._count("rejected")
+            raise SchedulerBusy(f"{self.name} queue is full ({self._queue.maxsize} pending)")
+        self._count("submitted")
+
+        if not pending.event.wait(timeout):
+            pending.abandoned = True
+            self._count("timeouts")
+            raise SchedulerTimeout(f"{self.name} result not ready after {timeout}s")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _collect(self, first):
+        batch = [first]
+        flush_at = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = flush_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if pending is None:
+                self._running = False
+                break
+            batch.append(pending)
+        return batch
+
+    def _loop(self):
+        while self._running:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+
+            # Skip work for requests whose caller already gave up
+            now = time.monotonic()
+            live = [p for p in batch if not p.abandoned and (p.deadline is None or p.deadline > now)]
+            if not live:
+                continue
+
+            try:
+                results = self.run_batch([p.item for p in live])
+                for pending, result in zip(live, results):
+                    pending.result = result
+                    pending.event.set()
+            except Exception as e:
+                print(f"Error running {self.name} batch of {len(live)}: {e}")
+                traceback.print_exc()
+                self._count("errors")
+                for pending in live:
+                    pending.error = e
+                    pending.event.set()
+
+            with self._stats_lock:
+                size = len(live)
+                self._stats["batches"] += 1
+                self._stats["completed"] += size
+                self._stats["max_batch_size_seen"] = max(self._stats["max_batch_size_seen"], size)
+                self._stats["batch_sizes"][size] = self._stats["batch_sizes"].get(size, 0) + 1
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        """Return queue depth and batch size statistics."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats["batch_sizes"] = {str(k): v for k, v in sorted(self._stats["batch_sizes"].items())}
+        stats["queue_depth"] = self.queue_depth()
+        stats["mean_batch_size"] = round(stats["completed"] / stats["batches"], 2) if stats["batches"] else 0
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait * 1000
+        return stats
@@ -0,0 +1,373 @@
+import os
+import json
+import time
+import base64
+import fcntl
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+import numpy as np
+from embeddings import EMBEDDING_DIM, EMBEDDING_VERSION, EMBEDDING_MODEL, EMBEDDING_DETECTOR, EMBEDDING_NORMALIZATION
+from face_index import rank_employees
+from face_templates import FACE_TEMPLATE_SCORING
+
+# "memory": a private exact index per worker. "mmap": one index file per host,
+# mapped read-only by every worker so the matrix sits in the page cache once
+# instead of once per worker heap. "ivf" / "hnsw": approximate search for very
+# large galleries (see ann_index).
+FACE_INDEX_MODE = os.getenv('FACE_INDEX_MODE', 'memory')
+FACE_INDEX_PATH = os.getenv('FACE_INDEX_PATH', os.path.join(tempfile.gettempdir(), 'frs_face_index.bin'))
+# A worker starting up rebuilds the file from Mongo when it is older than this,
+# picking up enrollments made through other hosts
+FACE_INDEX_MAX_AGE_S = int(os.getenv('FACE_INDEX_MAX_AGE_S', '900'))
+# How often a worker checks whether another process replaced the file
+FACE_INDEX_CHECK_S = float(os.getenv('FACE_INDEX_CHECK_S', '1'))
+# Single-employee changes are journaled next to the file; past this size the journal
+# is folded into a rewritten file
+FACE_INDEX_JOURNAL_MAX_BYTES = int(os.getenv('FACE_INDEX_JOURNAL_MAX_BYTES', str(4 * 1024 * 1024)))
+
+# File layout: a 64-byte header, rows x dim little-endian float32 (L2-normalized,
+# one row per template), then a JSON table with the owning employee of each row
+# and the embedding configuration the vectors were made with.
+MAGIC = b"FRSIDX\x00\x01"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIQQdQQ")
+HEADER_SIZE = 64
+
+def embedding_config():
+    return {
+        "version": EMBEDDING_VERSION,
+        "model": EMBEDDING_MODEL,
+        "detector": EMBEDDING_DETECTOR,
+        "normalization": EMBEDDING_NORMALIZATION
+    }
+
+def normalize_templates(vectors, dim=EMBEDDING_DIM):
+    """One vector or a k x dim array as L2-normalized float32 rows."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    if vectors.shape[1] != dim:
+        raise ValueError(f"Expected {dim}-d embeddings, got {vectors.shape[1]}")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+def write_index_file(path, ids, matrix, generation, built_at=None):
+    """Write a complete index file next to path, then rename it over path.
+
+    Readers either keep the old file (their mapping stays valid after the
+    rename) or open the new one; none ever sees a partly written file.
+    built_at (default now) is what load_from compares against its max age.
+    """
+    matrix = np.ascontiguousarray(matrix, dtype='<f4').reshape(-1, EMBEDDING_DIM)
+    table = json.dumps({"embedding": embedding_config(), "ids": list(ids)}).encode("utf-8")
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, EMBEDDING_DIM, matrix.shape[0], generation,
+                         time.time() if built_at is None else built_at,
+                         HEADER_SIZE + matrix.nbytes, len(table))
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".face_index.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header.ljust(HEADER_SIZE, b"\0"))
+            f.write(matrix.tobytes())
+            f.write(table)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def encode_change(generation, op, employee_id, vectors=None):
+    """One journal line."""
+    change = {"generation": generation, "op": op, "id": employee_id}
+    if vectors is not None:
+        change["vectors"] = base64.b64encode(np.ascontiguousarray(vectors, dtype='<f4').tobytes()).decode("ascii")
+    return (json.dumps(change) + "\n").encode("utf-8")
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock shared by every process on the host that writes the index at path."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class IndexSnapshot:
+    """One version of the index file, with its matrix mapped read-only."""
+
+    def __init__(self, path):
+        stat = os.stat(path)
+        self.key = (stat.st_ino, stat.st_mtime_ns)
+        with open(path, "rb") as f:
+            magic, format_version, dim, rows, self.generation, self.built_at, table_offset, table_length = \
+                HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or format_version != FORMAT_VERSION or dim != EMBEDDING_DIM:
+                raise ValueError(f"{path} is not a version {FORMAT_VERSION} {EMBEDDING_DIM}-d face index")
+            f.seek(table_offset)
+            table = json.loads(f.read(table_length).decode("utf-8"))
+        self.compatible = table["embedding"] == embedding_config()
+        if rows:
+            self.matrix = np.memmap(path, dtype='<f4', mode='r', offset=HEADER_SIZE, shape=(rows, dim))
+        else:
+            self.matrix = np.zeros((0, dim), dtype=np.float32)
+        self.ids = table["ids"]
+        self.rows = {}
+        for row, employee_id in enumerate(self.ids):
+            self.rows.setdefault(employee_id, []).append(row)
+
+class IndexView:
+    """A snapshot with the journal's later upserts and removals laid over it.
+
+    Rows of changed employees are left out of the mapped matrix by index and
+    their current templates are kept in a small in-heap matrix, so the mapped
+    rows are still never copied.
+    """
+
+    def __init__(self, snapshot, changes=None):
+        self.snapshot = snapshot
+        self.generation = snapshot.generation
+        self.built_at = snapshot.built_at
+        if not changes:
+            self.keep, self.extra = None, None
+            self.ids, self.rows = snapshot.ids, snapshot.rows
+            return
+        self.keep = np.array([row for row, employee_id in enumerate(snapshot.ids) if employee_id not in changes], dtype=np.int64)
+        self.ids = [snapshot.ids[row] for row in self.keep]
+        blocks = [vectors for vectors in changes.values() if vectors is not None]
+        for employee_id, vectors in changes.items():
+            if vectors is not None:
+                self.ids.extend([employee_id] * len(vectors))
+        self.extra = np.vstack(blocks) if blocks else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self.rows = {}
+        for row, employee_id in enumerate(self.ids):
+            self.rows.setdefault(employee_id, []).append(row)
+
+    def scores(self, query):
+        """Similarity of the query to every row of self.ids."""
+        scores = self.snapshot.matrix @ query
+        if self.keep is None:
+            return scores
+        return np.concatenate([scores[self.keep], self.extra @ query])
+
+    def matrix(self):
+        """Every row of self.ids as one in-heap array, for rewriting the file."""
+        if self.keep is None:
+            return np.asarray(self.snapshot.matrix)
+        return np.vstack([np.asarray(self.snapshot.matrix[self.keep]), self.extra])
+
+class MappedEmbeddingIndex:
+    """EmbeddingIndex backed by a host-level file that every worker maps read-only.
+
+    Single-employee writes (registration, updates, learned templates, removals)
+    take an exclusive file lock and append the change to a journal next to the
+    file; every worker replays new journal lines within FACE_INDEX_CHECK_S into
+    a small in-heap overlay. Bulk writes and rebuilds, and a journal grown past
+    FACE_INDEX_JOURNAL_MAX_BYTES, write a complete new file and rename it into
+    place, which workers then map. The matrix is never copied into a worker's
+    heap.
+    """
+
+    def __init__(self, path=FACE_INDEX_PATH, check_seconds=FACE_INDEX_CHECK_S,
+                 journal_max_bytes=FACE_INDEX_JOURNAL_MAX_BYTES):
+        self.path = path
+        self.check_seconds = check_seconds
+        self.journal_max_bytes = journal_max_bytes
+        self._snapshot = None
+        self._view = None
+        self._changes = {}
+        self._journal_key = None
+        self._offset = 0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def _journal_path(self):
+        return self.path + ".journal"
+
+    def _file_lock(self):
+        return file_lock(self.path)
+
+    def _current(self, force=False):
+        """The view of the file on disk now, re-mapped if it was replaced and with new journal lines applied.
+
+        None when there is no file yet or it was built with another embedding
+        configuration.
+        """
+        now = time.monotonic()
+        if force or now - self._checked_at >= self.check_seconds:
+            with self._lock:
+                self._checked_at = now
+                try:
+                    stat = os.stat(self.path)
+                except FileNotFoundError:
+                    self._snapshot, self._view = None, None
+                else:
+                    if self._snapshot is None or self._snapshot.key != (stat.st_ino, stat.st_mtime_ns):
+                        try:
+                            self._snapshot = IndexSnapshot(self.path)
+                        except (ValueError, KeyError, struct.error) as e:
+                            # Treated as missing, so the next write or startup load replaces it
+                            print(f"Ignoring unreadable identification index {self.path}: {e}")
+                            self._snapshot = None
+                        self._changes, self._offset = {}, 0
+                        self._view = IndexView(self._snapshot) if self._snapshot is not None else None
+                    if self._snapshot is not None and self._replay():
+                        self._view = IndexView(self._snapshot, self._changes)
+        view = self._view
+        return view if view is not None and view.snapshot.compatible else None
+
+    def _replay(self):
+        """Apply journal lines written since the last call to self._changes; True if any applied."""
+        try:
+            with open(self._journal_path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                if (stat.st_ino, stat.st_dev) != self._journal_key:
+                    # A new journal was started when the file was last rewritten
+                    self._journal_key, self._offset = (stat.st_ino, stat.st_dev), 0
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        end = data.rfind(b"\n") + 1
+        applied = False
+        for line in data[:end].splitlines():
+            change = json.loads(line.decode("utf-8"))
+            # Lines for an older file are already in the one mapped; those for a newer
+            # one are replayed after mapping it
+            if change["generation"] != self._snapshot.generation:
+                continue
+            if change["op"] == "remove":
+                self._changes[change["id"]] = None
+            else:
+                self._changes[change["id"]] = np.frombuffer(base64.b64decode(change["vectors"]), dtype='<f4').reshape(-1, EMBEDDING_DIM)
+            applied = True
+        self._offset += end
+        return applied
+
+    def _next_generation(self):
+        return self._snapshot.generation + 1 if self._snapshot is not None else 1
+
+    def __len__(self):
+        view = self._current()
+        return len(view.rows) if view is not None else 0
+
+    def __contains__(self, employee_id):
+        view = self._current()
+        return view is not None and employee_id in view.rows
+
+    def rows(self):
+        """Number of template rows (at least one per employee)."""
+        view = self._current()
+        return len(view.ids) if view is not None else 0
+
+    def generation(self):
+        """Counter bumped by every rewrite of the file, or None before it exists."""
+        view = self._current()
+        return view.generation if view is not None else None
+
+    def _write_file(self, ids, matrix, built_at=None):
+        """Write a complete file as the next generation and start an empty journal (file lock held)."""
+        write_index_file(self.path, ids, matrix, self._next_generation(), built_at)
+        # Lines left in the old journal belong to the previous generation, so readers skip them either way
+        with open(self._journal_path + ".tmp", "wb"):
+            pass
+        os.replace(self._journal_path + ".tmp", self._journal_path)
+        self._current(force=True)
+
+    def _rewrite(self, replace, drop=()):
+        """Write a new file without the employees in drop and with replace's (employee_id, vectors) added (file lock held)."""
+        drop = set(drop) | {employee_id for employee_id, _ in replace}
+        view = self._current(force=True)
+        if view is not None:
+            keep = [row for row, employee_id in enumerate(view.ids) if employee_id not in drop]
+            ids = [view.ids[row] for row in keep]
+            blocks = [view.matrix()[keep]]
+            built_at = view.built_at
+        else:
+            # Not built from Mongo yet: written as already stale so the startup load still rebuilds it
+            ids, blocks, built_at = [], [], 0.0
+        for employee_id, vectors in replace:
+            ids.extend([employee_id] * len(vectors))
+            blocks.append(vectors)
+        matrix = np.vstack(blocks) if blocks else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self._write_file(ids, matrix, built_at)
+
+    def _record(self, op, employee_id, vectors=None):
+        """Journal one employee's change, or rewrite the file when there is none to journal against."""
+        with self._file_lock():
+            view = self._current(force=True)
+            if view is None:
+                self._rewrite([(employee_id, vectors)] if op == "upsert" else [], drop=[employee_id])
+                return
+            with open(self._journal_path, "ab") as f:
+                f.write(encode_change(view.generation, op, employee_id, vectors))
+                size = f.tell()
+            if size > self.journal_max_bytes:
+                self._rewrite([])
+            else:
+                self._current(force=True)
+
+    def upsert(self, employee_id, vectors):
+        """Insert or replace an employee's templates (one vector or a k x dim array)."""
+        self._record("upsert", employee_id, normalize_templates(vectors))
+
+    def upsert_many(self, items):
+        """Insert or replace several employees' templates with a single file rewrite."""
+        items = [(employee_id, normalize_templates(vectors)) for employee_id, vectors in items]
+        if items:
+            with self._file_lock():
+                self._rewrite(items)
+
+    def remove(self, employee_id):
+        """Drop every template of an employee from the index."""
+        if employee_id not in self:
+            return False
+        self._record("remove", employee_id)
+        return True
+
+    def _write_all(self, items):
+        ids, blocks, seen = [], [], set()
+        for employee_id, vectors in items:
+            if employee_id in seen:
+                continue
+            seen.add(employee_id)
+            vectors = normalize_templates(vectors)
+            ids.extend([employee_id] * len(vectors))
+            blocks.append(vectors)
+        matrix = np.vstack(blocks) if blocks else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self._write_file(ids, matrix)
+
+    def load(self, items):
+        """Replace the file contents with (employee_id, vectors) pairs."""
+        with self._file_lock():
+            self._current(force=True)
+            self._write_all(items)
+
+    def load_from(self, items_factory, max_age=FACE_INDEX_MAX_AGE_S):
+        """Map the host's file and replay its journal, rebuilding from items_factory() only when missing, incompatible or stale.
+
+        Workers starting together queue on the file lock, so the first one
+        rebuilds and the rest map its result.
+        """
+        with self._file_lock():
+            view = self._current(force=True)
+            if view is not None and time.time() - view.built_at < max_age:
+                print(f"Mapped identification index {self.path} (generation {view.generation})")
+                return
+            self._write_all(items_factory())
+
+    def search(self, vector, k=1, scoring=FACE_TEMPLATE_SCORING):
+        """Return the top-k (employee_id, similarity) pairs, best first."""
+        query = normalize_templates(vector)[0]
+        view = self._current()
+        if view is None or not view.ids:
+            return []
+        return rank_employees(view.scores(query), view.ids, view.rows, k, scoring)
@@ -0,0 +1,170 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from pymongo import monitoring
+
+# Latency buckets in seconds, from sub-millisecond Mongo calls to multi-second inference
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIMILARITY_BUCKETS = (10, 20, 30, 40, 50, 60, 70, 75, 80, 85, 90, 95, 100)
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class Counter:
+    """Monotonic counter with a fixed set of label names."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of label names."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time."""
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def render(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "frs_http_request_duration_seconds", "HTTP request latency by route", ("route", "method", "status")))
+stage_duration = registry.register(Histogram(
+    "frs_stage_duration_seconds", "Latency of individual hot-path stages", ("endpoint", "stage")))
+checkin_outcomes = registry.register(Counter(
+    "frs_checkin_outcomes_total", "Face check-in outcomes", ("endpoint", "outcome")))
+similarity_scores = registry.register(Histogram(
+    "frs_similarity_score", "Face similarity scores (percent) of check-in attempts", ("endpoint",), SIMILARITY_BUCKETS))
+inference_errors = registry.register(Counter(
+    "frs_inference_errors_total", "Exceptions raised by face detection or embedding", ("endpoint",)))
+quality_rejections = registry.register(Counter(
+    "frs_quality_rejections_total", "Frames rejected by the quality gate before embedding", ("endpoint", "reason")))
+email_enqueue_failures = registry.register(Counter(
+    "frs_email_enqueue_failures_total", "Attendance notifications dropped because the email outbox was full", ("endpoint",)))
+mongo_commands = registry.register(Counter(
+    "frs_mongo_commands_total", "MongoDB commands by name and result", ("command", "result")))
+mongo_duration = registry.register(Histogram(
+    "frs_mongo_command_duration_seconds", "MongoDB command latency", ("command",)))
+
+def stage(endpoint, name):
+    """Time a hot-path stage: `with metrics.stage('verify', 'embedding'): ...`."""
+    return stage_duration.time(endpoint=endpoint, stage=name)
+
+def record_outcome(endpoint, outcome, similarity_score=None):
+    """Count a check-in outcome and record its similarity score, if any."""
+    checkin_outcomes.inc(endpoint=endpoint, outcome=outcome)
+    if similarity_score is not None:
+        similarity_scores.observe(similarity_score, endpoint=endpoint)
+
+def register_gauge(name, documentation, callback):
+    return registry.register(Gauge(name, documentation, callback))
+
+def render():
+    return registry.render()
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Counts and times every MongoDB command issued by the client it is attached to."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_commands.inc(command=event.command_name, result="ok")
+        mongo_duration.observe(event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        mongo_commands.inc(command=event.command_name, result="error")
+        mongo_duration.observe(event.duration_micros / 1e6, command=event.command_name)
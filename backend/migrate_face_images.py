@@ -0,0 +1,53 @@
+"""Move base64 face images out of employee documents into the binary face store.
+
+Usage: python migrate_face_images.py [--dry-run]
+"""
+import io
+import os
+import base64
+import argparse
+import traceback
+from dotenv import load_dotenv
+import pymongo
+import certifi
+from PIL import Image
+from face_store import FaceImageStore
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert embedded base64 face images to face store references")
+    parser.add_argument('--dry-run', action='store_true', help="Report what would be migrated without writing")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = pymongo.MongoClient(os.getenv('MONGO_URI'), tls=True, tlsCAFile=certifi.where())
+    db = client['frs_db']
+    employees_collection = db['employees']
+    face_store = FaceImageStore(db['face_images'])
+
+    migrated, failed, saved_bytes = 0, 0, 0
+    for employee in employees_collection.find({"face_image": {"$exists": True}}, {"employee_id": 1, "face_image": 1}):
+        try:
+            raw = base64.b64decode(employee['face_image'])
+            saved_bytes += len(employee['face_image'])
+            if args.dry_run:
+                migrated += 1
+                continue
+            image_id = face_store.put(Image.open(io.BytesIO(raw)))
+            employees_collection.update_one(
+                {"_id": employee["_id"]},
+                {"$set": {"face_image_id": image_id}, "$unset": {"face_image": ""}}
+            )
+            migrated += 1
+            print(f"Migrated face image for {employee['employee_id']} -> {image_id}")
+        except Exception as e:
+            failed += 1
+            print(f"Failed to migrate face image for {employee['employee_id']}: {e}")
+            traceback.print_exc()
+
+    action = "Would migrate" if args.dry_run else "Migrated"
+    print(f"{action} {migrated} employees ({saved_bytes / 1024:.1f} KB of base64 removed from employee documents), {failed} failed")
+    if migrated and not args.dry_run:
+        print("Run backfill_embeddings.py if reference embeddings should be recomputed from the normalized images")
+
+if __name__ == '__main__':
+    main()
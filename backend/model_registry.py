@@ -0,0 +1,98 @@
+import os
+import time
+import threading
+import traceback
+import numpy as np
+from PIL import Image
+import embeddings
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PREDICTOR_PATH = os.path.join(BASE_DIR, "shape_predictor_68_face_landmarks.dat")
+WARMUP_IMAGE_PATH = os.path.join(BASE_DIR, "images", os.getenv('WARMUP_IMAGE', "lohith.jpg"))
+
+# Shared model objects, populated once by load_models()
+detector = None
+predictor = None
+facenet = None
+
+_state = {
+    "loaded": False,
+    "warmed": False,
+    "loading": False,
+    "error": None,
+    "backend": None,
+    "load_seconds": None,
+    "warmup_seconds": None,
+    "pid": None
+}
+_lock = threading.Lock()
+
+def load_models():
+    """Load the dlib detector, landmark predictor and Facenet model once per process."""
+    global detector, predictor, facenet
+    if _state["loaded"]:
+        return
+    # Imported here so importing the registry (e.g. for status()) stays cheap
+    import dlib
+    start = time.perf_counter()
+    detector = dlib.get_frontal_face_detector()
+    predictor = dlib.shape_predictor(PREDICTOR_PATH)
+    facenet = embeddings.get_backend()
+    _state["backend"] = facenet.name
+    _state["load_seconds"] = round(time.perf_counter() - start, 3)
+    _state["loaded"] = True
+    print(f"Loaded face models in {_state['load_seconds']}s")
+
+def warm_up():
+    """Run the detection pipeline and one embedding on a bundled image so the first request pays no setup cost."""
+    start = time.perf_counter()
+    if os.path.exists(WARMUP_IMAGE_PATH):
+        image = np.array(Image.open(WARMUP_IMAGE_PATH).convert('RGB'))
+    else:
+        print(f"Warm-up image {WARMUP_IMAGE_PATH} not found, warming up on a blank frame")
+        image = np.zeros((480, 640, 3), dtype=np.uint8)
+    embeddings.compute_embedding(image, enforce_detection=False)
+    _state["warmup_seconds"] = round(time.perf_counter() - start, 3)
+    _state["warmed"] = True
+    print(f"Warm-up inference finished in {_state['warmup_seconds']}s")
+
+def ensure_ready():
+    """Load and warm up the models if that has not happened in this process yet."""
+    with _lock:
+        if _state["warmed"]:
+            return
+        _state["loading"] = True
+        try:
+            load_models()
+            warm_up()
+            _state["error"] = None
+            _state["pid"] = os.getpid()
+        except Exception as e:
+            _state["error"] = str(e)
+            print(f"Failed to load face models: {e}")
+            traceback.print_exc()
+            raise
+        finally:
+            _state["loading"] = False
+
+def start_background_load():
+    """Load models on a background thread so the worker can answer readiness probes meanwhile."""
+    def _load():
+        try:
+            ensure_ready()
+        except Exception:
+            pass
+    thread = threading.Thread(target=_load, name="model-loader", daemon=True)
+    thread.start()
+    return thread
+
+def is_ready():
+    """Whether the models are loaded and warmed up in this process."""
+    return _state["loaded"] and _state["warmed"]
+
+def status():
+    """Return a copy of the registry state for readiness reporting."""
+    state = dict(_state)
+    state["ready"] = is_ready()
+    state["inherited"] = state["pid"] is not None and state["pid"] != os.getpid()
+    return state
@@ -0,0 +1,93 @@
+import os
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+
+# How long an emailed OTP stays valid
+OTP_TTL_SECONDS = int(os.getenv('OTP_TTL_S', '600'))
+
+class MemoryOtpStore:
+    """Pending verifications in this process only: bounded, oldest evicted first, expired on read.
+
+    Fine for a single worker; with several workers or nodes the OTP may be
+    issued by one process and checked by another, so use MongoOtpStore.
+    """
+
+    backend = "memory"
+
+    def __init__(self, ttl_seconds=OTP_TTL_SECONDS, max_entries=10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, entry):
+        """Store entry under key, replacing any pending verification for it."""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(entry))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def take(self, key, otp, purpose):
+        """Remove and return the entry if otp and purpose match and it has not expired, else None."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, entry = item
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            if entry.get("otp") != otp or entry.get("purpose") != purpose:
+                return None
+            del self._entries[key]
+            return entry
+
+    def stats(self):
+        with self._lock:
+            return {"backend": self.backend, "pending": len(self._entries), "max_entries": self.max_entries, "ttl_seconds": self.ttl_seconds}
+
+class MongoOtpStore:
+    """Pending verifications in a Mongo collection shared by every worker and node.
+
+    A TTL index on expires_at removes stale entries; reads also check the
+    expiry, since the TTL monitor only runs about once a minute.
+    """
+
+    backend = "mongo"
+
+    def __init__(self, collection, ttl_seconds=OTP_TTL_SECONDS):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+
+    def ensure_indexes(self):
+        self.collection.create_index([("expires_at", 1)], expireAfterSeconds=0, name="expires_at_ttl")
+
+    def put(self, key, entry):
+        """Store entry under key, replacing any pending verification for it."""
+        # The TTL monitor compares in UTC
+        now = datetime.now(timezone.utc)
+        self.collection.replace_one(
+            {"_id": key},
+            dict(entry, created_at=now, expires_at=now + timedelta(seconds=self.ttl_seconds)),
+            upsert=True
+        )
+
+    def take(self, key, otp, purpose):
+        """Remove and return the entry if otp and purpose match and it has not expired, else None.
+
+        One find_one_and_delete, so two requests can never both consume the same OTP.
+        """
+        return self.collection.find_one_and_delete(
+            {"_id": key, "otp": otp, "purpose": purpose, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            {"_id": 0}
+        )
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "pending": self.collection.count_documents({"expires_at": {"$gt": datetime.now(timezone.utc)}}),
+            "ttl_seconds": self.ttl_seconds
+        }
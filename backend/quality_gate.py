@@ -0,0 +1,122 @@
+import os
+import numpy as np
+import cv2
+
+# Checks a detected face must pass before it is embedded. Each runs on the
+# detection output (grayscale frame, box, landmarks) and costs well under a
+# millisecond, against tens of milliseconds for a Facenet pass.
+QUALITY_GATE = os.getenv('QUALITY_GATE', '1') == '1'
+QUALITY_MAX_FACES = int(os.getenv('QUALITY_MAX_FACES', '1'))
+# Variance of the Laplacian of the face at QUALITY_FACE_SIDE px; lower is blurrier
+QUALITY_MIN_SHARPNESS = float(os.getenv('QUALITY_MIN_SHARPNESS', '30'))
+# Mean and standard deviation of face pixel intensities (0-255)
+QUALITY_MIN_BRIGHTNESS = float(os.getenv('QUALITY_MIN_BRIGHTNESS', '40'))
+QUALITY_MAX_BRIGHTNESS = float(os.getenv('QUALITY_MAX_BRIGHTNESS', '220'))
+QUALITY_MIN_CONTRAST = float(os.getenv('QUALITY_MIN_CONTRAST', '18'))
+# Head pose limits in degrees
+QUALITY_MAX_YAW = float(os.getenv('QUALITY_MAX_YAW', '35'))
+QUALITY_MAX_PITCH = float(os.getenv('QUALITY_MAX_PITCH', '30'))
+QUALITY_FACE_SIDE = 128
+
+# What the kiosk shows for each rejection reason
+REASON_MESSAGES = {
+    "no_face": "No face detected, please look at the camera",
+    "multiple_faces": "More than one face in view, please step up alone",
+    "too_far": "Face is too far from the camera, please move closer",
+    "blurry": "Image is blurry, please hold still",
+    "too_dark": "Face is too dark, please find better light",
+    "too_bright": "Face is overexposed, please avoid direct light",
+    "low_contrast": "Face is washed out, please find even light",
+    "head_turned": "Please face the camera directly",
+    "head_tilted": "Please keep your head level, not looking up or down"
+}
+
+# Generic 3D face model (x to the subject's left, y up, z towards the camera) matched
+# to dlib's 68-point landmarks: brow ends, inner and outer eye corners, nostrils,
+# mouth corners, lower lip and chin. Fitting 14 points keeps the pitch from hinging
+# on the chin alone, which moves with jaw length and an open mouth.
+_MODEL_POINTS = np.array([
+    (-6.825897, 6.760612, 4.402142),
+    (-1.330353, 7.122144, 6.903745),
+    (1.330353, 7.122144, 6.903745),
+    (6.825897, 6.760612, 4.402142),
+    (-5.311432, 5.485328, 3.987654),
+    (-1.789930, 5.393625, 4.413414),
+    (1.789930, 5.393625, 4.413414),
+    (5.311432, 5.485328, 3.987654),
+    (-2.005628, 1.409845, 6.165652),
+    (2.005628, 1.409845, 6.165652),
+    (-2.774015, -2.080775, 5.048531),
+    (2.774015, -2.080775, 5.048531),
+    (0.000000, -3.116408, 6.097667),
+    (0.000000, -7.415691, 4.070434)
+])
+_LANDMARK_INDEXES = [17, 21, 22, 26, 36, 39, 42, 45, 31, 35, 48, 54, 57, 8]
+# Pitch the model reads on a level face, the mean over the frontal photos in images/
+_PITCH_ZERO = -2.8
+
+def head_pose(landmarks, frame_shape):
+    """(yaw, pitch) in degrees from the 68 landmarks, 0 when facing the camera."""
+    height, width = frame_shape[:2]
+    camera = np.array([[width, 0, width / 2.0], [0, width, height / 2.0], [0, 0, 1]], dtype=np.float64)
+    image_points = np.asarray(landmarks, dtype=np.float64)[_LANDMARK_INDEXES]
+    ok, rotation, translation = cv2.solvePnP(_MODEL_POINTS, image_points, camera, np.zeros(4), flags=cv2.SOLVEPNP_ITERATIVE)
+    if not ok:
+        return 0.0, 0.0
+    angles = cv2.RQDecomp3x3(cv2.Rodrigues(rotation)[0])[0]
+    pitch, yaw = angles[0], angles[1]
+    # The model's y axis points up and the image's down, so a frontal face decomposes to ~180
+    if pitch > 90:
+        pitch -= 180
+    elif pitch < -90:
+        pitch += 180
+    # The rotation is relative to the optical axis; a face off-centre in the frame that
+    # looks at the lens is turned by the angle of its line of sight, which is not a pose
+    x, y, z = translation.ravel()
+    yaw -= np.degrees(np.arctan2(x, z))
+    pitch += np.degrees(np.arctan2(y, z)) - _PITCH_ZERO
+    return float(yaw), float(pitch)
+
+def face_statistics(gray, box):
+    """Sharpness, brightness and contrast of the face region at a fixed size."""
+    left, top, right, bottom = box
+    face = gray[max(0, top):bottom, max(0, left):right]
+    if face.size == 0:
+        return 0.0, 0.0, 0.0
+    face = cv2.resize(face, (QUALITY_FACE_SIDE, QUALITY_FACE_SIDE), interpolation=cv2.INTER_AREA)
+    sharpness = cv2.Laplacian(face, cv2.CV_64F).var()
+    return float(sharpness), float(face.mean()), float(face.std())
+
+def assess(analysis, min_eye_distance=10):
+    """Check a FaceAnalysis; returns {"passed", "reason", "message", "metrics"} with the first failed check."""
+    def result(reason, metrics):
+        return {"passed": reason is None, "reason": reason, "message": REASON_MESSAGES.get(reason), "metrics": metrics}
+
+    if not analysis.detected:
+        return result("no_face", {"faces": analysis.num_faces})
+    metrics = {"faces": analysis.num_faces, "eye_distance": round(analysis.eye_distance, 1)}
+    if analysis.num_faces > QUALITY_MAX_FACES and QUALITY_GATE:
+        return result("multiple_faces", metrics)
+    if analysis.eye_distance < min_eye_distance:
+        return result("too_far", metrics)
+    if not QUALITY_GATE:
+        return result(None, metrics)
+
+    sharpness, brightness, contrast = face_statistics(analysis.gray, analysis.box)
+    metrics.update(sharpness=round(sharpness, 1), brightness=round(brightness, 1), contrast=round(contrast, 1))
+    if brightness < QUALITY_MIN_BRIGHTNESS:
+        return result("too_dark", metrics)
+    if brightness > QUALITY_MAX_BRIGHTNESS:
+        return result("too_bright", metrics)
+    if contrast < QUALITY_MIN_CONTRAST:
+        return result("low_contrast", metrics)
+    if sharpness < QUALITY_MIN_SHARPNESS:
+        return result("blurry", metrics)
+
+    yaw, pitch = head_pose(analysis.landmarks, analysis.gray.shape)
+    metrics.update(yaw=round(yaw, 1), pitch=round(pitch, 1))
+    if abs(yaw) > QUALITY_MAX_YAW:
+        return result("head_turned", metrics)
+    if abs(pitch) > QUALITY_MAX_PITCH:
+        return result("head_tilted", metrics)
+    return result(None, metrics)
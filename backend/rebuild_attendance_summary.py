@@ -0,0 +1,26 @@
+"""Rebuild the attendance summary counters from the attendance collection.
+
+Run once after deploying the summary, and whenever the counters may have
+drifted (records edited by hand, a summary write that failed).
+
+Usage: python rebuild_attendance_summary.py
+"""
+import os
+import time
+from dotenv import load_dotenv
+import pymongo
+import certifi
+from attendance_summary import AttendanceSummary
+
+def main():
+    load_dotenv()
+    client = pymongo.MongoClient(os.getenv('MONGO_URI'), tls=True, tlsCAFile=certifi.where())
+    db = client['frs_db']
+    summary = AttendanceSummary(db['attendance_monthly'], db['attendance_calendar'])
+
+    start = time.perf_counter()
+    result = summary.rebuild(db['attendance'], db['employees'])
+    print(f"Rebuilt {result['summaries']} employee summaries over {result['days']} days in {time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()
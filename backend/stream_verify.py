@@ -0,0 +1,149 @@
+import os
+import time
+from face_templates import compare_templates
+from image_io import decode_image
+
+# Budget for one streaming check-in
+STREAM_MAX_FRAMES = int(os.getenv('STREAM_MAX_FRAMES', '12'))
+STREAM_MAX_SECONDS = float(os.getenv('STREAM_MAX_SECONDS', '8'))
+# Accept after STREAM_MIN_MATCHES frames at or above the single-shot threshold,
+# or on one frame at or above STREAM_INSTANT_SCORE
+STREAM_ACCEPT_SCORE = float(os.getenv('STREAM_ACCEPT_SCORE', '70'))
+STREAM_MIN_MATCHES = int(os.getenv('STREAM_MIN_MATCHES', '2'))
+STREAM_INSTANT_SCORE = float(os.getenv('STREAM_INSTANT_SCORE', '90'))
+# Give up early once STREAM_REJECT_AFTER faces all scored below STREAM_REJECT_SCORE
+STREAM_REJECT_SCORE = float(os.getenv('STREAM_REJECT_SCORE', '40'))
+STREAM_REJECT_AFTER = int(os.getenv('STREAM_REJECT_AFTER', '4'))
+
+def decode_frame(data):
+    """Decode one JPEG frame from the stream into an HxWx3 array."""
+    return decode_image(data)
+
+def latest_frame(ws, timeout):
+    """Wait for the next binary frame, then skip any that queued up meanwhile.
+
+    Frames that arrive while the previous one is being analyzed are stale by the
+    time we get to them; only the newest is worth the pipeline. Returns
+    (frame or None on timeout, number of frames skipped).
+    """
+    frame = None
+    skipped = 0
+    deadline = time.monotonic() + timeout
+    while frame is None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None, skipped
+        message = ws.receive(timeout=remaining)
+        if message is None:
+            return None, skipped
+        if isinstance(message, (bytes, bytearray)):
+            frame = message
+    while True:
+        message = ws.receive(timeout=0)
+        if message is None:
+            return frame, skipped
+        if isinstance(message, (bytes, bytearray)):
+            frame = message
+            skipped += 1
+
+class Evidence:
+    """Per-frame similarity scores of one stream, until they support a decision."""
+
+    def __init__(self):
+        self.scores = []
+        self.matches = []
+
+    def add(self, verified, similarity_score):
+        self.scores.append(similarity_score)
+        if verified and similarity_score >= STREAM_ACCEPT_SCORE:
+            self.matches.append(similarity_score)
+
+    def decision(self):
+        """Return "accept", "reject", or None while the evidence is still inconclusive."""
+        if self.matches and (len(self.matches) >= STREAM_MIN_MATCHES or self.matches[-1] >= STREAM_INSTANT_SCORE):
+            return "accept"
+        if len(self.scores) >= STREAM_REJECT_AFTER and max(self.scores) < STREAM_REJECT_SCORE:
+            return "reject"
+        return None
+
+    def similarity_score(self):
+        """Mean of the matching frames once accepted, otherwise the best frame seen."""
+        if self.matches:
+            return sum(self.matches) / len(self.matches)
+        return max(self.scores) if self.scores else None
+
+class StreamSession:
+    """One streaming check-in against a single employee's face templates.
+
+    The face is tracked between frames so the detector only runs when the
+    tracker needs it; every frame with a usable face adds evidence, and the
+    session ends at the first confident decision or when the frame or time
+    budget runs out. analyze(image, data, box) must return the dict produced by
+    inference_pool.analyze_and_embed.
+    """
+
+    def __init__(self, reference_templates, analyze, max_frames=STREAM_MAX_FRAMES, max_seconds=STREAM_MAX_SECONDS):
+        self.reference_templates = reference_templates
+        self.analyze = analyze
+        self.max_frames = max_frames
+        self.max_seconds = max_seconds
+        # dlib is only needed once a stream is actually open
+        from face_tracking import FaceTracker
+        self.tracker = FaceTracker()
+        self.evidence = Evidence()
+        self.frames = 0
+        self.skipped = 0
+        self.detections = 0
+        # (embedding, per-template similarities) of the best-scoring frame, for template learning
+        self.best_probe = None
+        self.best_score = None
+        self.started_at = time.monotonic()
+
+    def remaining_seconds(self):
+        return max(0.0, self.max_seconds - (time.monotonic() - self.started_at))
+
+    def process(self, data, skipped=0):
+        """Analyze one frame; return a progress event, or the decision event once reached."""
+        self.frames += 1
+        self.skipped += skipped
+        image = decode_frame(data)
+        box = self.tracker.update(image)
+        tracked = box is not None
+        if not tracked:
+            self.detections += 1
+
+        result = self.analyze(image, data, box)
+        event = {"type": "progress", "frame": self.frames, "face": result["detected"], "tracked": tracked}
+        if result["embedding"] is None:
+            self.tracker.reset()
+            event["reason"] = result["quality"]["reason"]
+            event["message"] = result["quality"]["message"]
+        else:
+            if not tracked:
+                self.tracker.start(image, result["box"])
+            comparison = compare_templates(result["embedding"], self.reference_templates)
+            similarity_score = (1 - comparison["distance"]) * 100
+            self.evidence.add(comparison["verified"], similarity_score)
+            if self.best_score is None or similarity_score > self.best_score:
+                self.best_score = similarity_score
+                self.best_probe = (result["embedding"], comparison["similarities"])
+            event["similarity_score"] = similarity_score
+
+        decision = self.evidence.decision()
+        if decision is None and (self.frames >= self.max_frames or self.remaining_seconds() <= 0):
+            decision = "reject"
+        if decision is not None:
+            return self.finish(decision)
+        return event
+
+    def finish(self, decision="reject"):
+        """Decision event; also used when the client stops sending before a decision."""
+        return {
+            "type": "decision",
+            "verified": decision == "accept",
+            "similarity_score": self.evidence.similarity_score(),
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "detections": self.detections,
+            "elapsed_ms": round((time.monotonic() - self.started_at) * 1000)
+        }
@@ -0,0 +1,36 @@
+import os
+import numpy as np
+import pytest
+import embeddings
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(embeddings, "embed_faces", lambda faces: np.stack(faces) * 2)
+    monkeypatch.setattr(embeddings, "_scheduler", None)
+    scheduler = embeddings.enable_batching(max_batch_size=4, max_wait_ms=1, timeout=2)
+    yield scheduler
+    scheduler.stop()
+
+def test_submit_completes(scheduler):
+    assert scheduler.submit(np.ones(3)).tolist() == [2, 2, 2]
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_submit_completes_in_forked_child(scheduler):
+    # As with MODEL_PRELOAD=1: the scheduler is created and used in the gunicorn master, then the worker forks
+    assert scheduler.submit(np.ones(3)).tolist() == [2, 2, 2]
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            result = scheduler.submit(np.full(3, 5.0), timeout=2)
+            os.write(write_fd, b"ok" if result.tolist() == [10, 10, 10] else b"wrong result")
+        except BaseException as e:
+            os.write(write_fd, repr(e).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd, "rb") as f:
+        outcome = f.read().decode()
+    os.waitpid(pid, 0)
+    assert outcome == "ok"
@@ -0,0 +1,40 @@
+import os
+import cv2
+import numpy as np
+import pytest
+
+dlib = pytest.importorskip("dlib")
+import model_registry
+from quality_gate import head_pose, QUALITY_MAX_YAW
+
+IMAGES_DIR = os.path.join(model_registry.BASE_DIR, "images")
+# Enrollment photos of people looking straight at the camera
+FRONTAL_IMAGES = ["1234.jpg", "12.jpg", "lohith.jpg", "22A91A04H0.jpg"]
+
+@pytest.fixture(scope="module")
+def landmarks():
+    """68 landmarks of the largest face in an image from images/, detected the way face_pipeline does."""
+    try:
+        predictor = dlib.shape_predictor(model_registry.PREDICTOR_PATH)
+    except RuntimeError:
+        pytest.skip("shape_predictor_68_face_landmarks.dat is not checked out (git lfs pull)")
+    detector = dlib.get_frontal_face_detector()
+
+    def fit(name):
+        gray = cv2.cvtColor(cv2.imread(os.path.join(IMAGES_DIR, name)), cv2.COLOR_BGR2GRAY)
+        faces = detector(gray, 1)
+        assert faces, f"no face in {name}"
+        box = max(faces, key=lambda rect: rect.area())
+        return [(p.x, p.y) for p in predictor(gray, box).parts()], gray.shape
+    return fit
+
+@pytest.mark.parametrize("name", FRONTAL_IMAGES)
+def test_frontal_faces_measure_level(landmarks, name):
+    yaw, pitch = head_pose(*landmarks(name))
+    assert abs(pitch) < 12
+    assert abs(yaw) < QUALITY_MAX_YAW
+
+def test_pitch_zero_point_matches_bundled_photos(landmarks):
+    names = [name for name in sorted(os.listdir(IMAGES_DIR)) if name.lower().endswith(".jpg")]
+    pitches = [head_pose(*landmarks(name))[1] for name in names]
+    assert abs(np.mean(pitches)) < 2
@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
+import fetchPage from './fetchPage';
 
 const AdminDashboard = () => {
   const [employees, setEmployees] = useState([]);
@@ -16,6 +17,7 @@ const AdminDashboard = () => {
   const [isMounted, setIsMounted] = useState(false);
   const [searchQuery, setSearchQuery] = useState('');
   const [employeeHistory, setEmployeeHistory] = useState(null);
+  const [historyCursor, setHistoryCursor] = useState(null);
   const navigate = useNavigate();
   const employeeListRef = useRef(null);
 
@@ -29,21 +31,20 @@ const AdminDashboard = () => {
       if (data.success) {
         setEmployees(data.employees || []);
         const now = new Date();
-        if (!selectedDate && now.getHours() >= 12) {
-          for (const emp of data.employees) {
-            if (emp.status === 'not_marked') {
-              await fetch('http://localhost:5000/api/mark_absent', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
-                body: new URLSearchParams({ employeeID: emp.employee_id }),
-              });
-            }
-          }
-          const updatedResponse = await fetch('http://localhost:5000/api/employees', {
+        if (!selectedDate && now.getHours() >= 12 && (data.employees || []).some((emp) => emp.status === 'not_marked')) {
+          const sweepResponse = await fetch('http://localhost:5000/api/mark-absent-bulk', {
+            method: 'POST',
             headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({}),
           });
-          const updatedData = await updatedResponse.json();
-          if (updatedData.success) setEmployees(updatedData.employees || []);
+          const sweepData = await sweepResponse.json();
+          if (sweepData.success && sweepData.marked_absent > 0) {
+            const updatedResponse = await fetch('http://localhost:5000/api/employees', {
+              headers: { 'Content-Type': 'application/json' },
+            });
+            const updatedData = await updatedResponse.json();
+            if (updatedData.success) setEmployees(updatedData.employees || []);
+          }
         }
       } else throw new Error(data.error || 'Failed to fetch employees');
     } catch (err) {
@@ -68,15 +69,13 @@ const AdminDashboard = () => {
     }
   };
 
-  const fetchEmployeeHistory = async (employeeId) => {
+  // Without a cursor loads the newest page; with one appends the page after it
+  const fetchEmployeeHistory = async (employeeId, cursor = null) => {
     try {
-      const response = await fetch(`http://localhost:5000/api/employee-history?employeeID=${employeeId}`, {
-        headers: { 'Content-Type': 'application/json' },
-      });
-      if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
-      const data = await response.json();
-      if (data.success) setEmployeeHistory(data.history);
-      else throw new Error(data.error || 'Failed to fetch history');
+      const data = await fetchPage(`http://localhost:5000/api/employee-history?employeeID=${employeeId}`, cursor);
+      if (!data.success) throw new Error(data.error || 'Failed to fetch history');
+      setEmployeeHistory((previous) => (cursor ? previous.concat(data.history) : data.history));
+      setHistoryCursor(data.next_cursor);
     } catch (err) {
       setError(err.message || 'Network or server issue');
       setEmployeeHistory(null);
@@ -372,6 +371,17 @@ const AdminDashboard = () => {
       boxShadow: '0 4px 10px rgba(40, 167, 69, 0.4)',
       whiteSpace: 'nowrap',
     },
+    loadMoreButton: {
+      marginTop: 'clamp(8px, 1.5vw, 12px)',
+      padding: 'clamp(6px, 1.2vw, 8px) clamp(12px, 2vw, 16px)',
+      border: '1px solid #ff7300',
+      borderRadius: '4px',
+      backgroundColor: '#ffffff',
+      color: '#ff7300',
+      fontSize: 'clamp(12px, 1.8vw, 14px)',
+      fontWeight: '600',
+      cursor: 'pointer',
+    },
     tableContainer: {
       backgroundColor: '#ffffff',
       padding: 'clamp(15px, 2vw, 20px)',
@@ -662,6 +672,11 @@ const AdminDashboard = () => {
               </tbody>
             </table>
           )}
+          {historyCursor && (
+            <button style={styles.loadMoreButton} onClick={() => fetchEmployeeHistory(searchQuery, historyCursor)}>
+              Load more
+            </button>
+          )}
         </div>
       )}
 
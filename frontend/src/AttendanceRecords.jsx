@@ -1,6 +1,8 @@
 import React, { useState, useRef, useCallback } from "react";
 import { useNavigate } from "react-router-dom";
 import Webcam from "react-webcam";
+import streamVerify from "./streamVerify";
+import fetchPage from "./fetchPage";
 
 const AttendanceRecords = () => {
   const [employeeID, setEmployeeID] = useState("");
@@ -8,6 +10,7 @@ const AttendanceRecords = () => {
   const [message, setMessage] = useState("");
   const [isLoggedIn, setIsLoggedIn] = useState(false);
   const [records, setRecords] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [attendanceMarked, setAttendanceMarked] = useState(false);
   const webcamRef = useRef(null);
   const navigate = useNavigate();
@@ -27,13 +30,16 @@ const AttendanceRecords = () => {
     }
   };
 
-  const fetchRecords = async () => {
-    const response = await fetch(`http://localhost:5000/api/attendance_records?employeeID=${employeeID}`);
-    const result = await response.json();
-    if (result.success) setRecords(result.attendance_records);
+  // Without a cursor reloads the newest page; with one appends the page after it
+  const fetchRecords = async (cursor = null) => {
+    const result = await fetchPage(`http://localhost:5000/api/attendance_records?employeeID=${employeeID}`, cursor);
+    if (!result.success) return;
+    setRecords((previous) => (cursor ? previous.concat(result.attendance_records) : result.attendance_records));
+    setNextCursor(result.next_cursor);
   };
 
-  const handleVerify = async () => {
+  // Single-frame upload, used when the streaming connection is unavailable
+  const verifySingleFrame = async (inTime) => {
     const faceData = capture();
     if (!faceData) return setMessage("Failed to capture image.");
     const byteString = atob(faceData.split(",")[1]);
@@ -47,8 +53,22 @@ const AttendanceRecords = () => {
     const formData = new FormData();
     formData.append("employeeID", employeeID);
     formData.append("faceImage", file);
+    formData.append("inTime", inTime);
     const response = await fetch("http://localhost:5000/api/verify", { method: "POST", body: formData });
-    const result = await response.json();
+    return response.json();
+  };
+
+  const handleVerify = async () => {
+    const inTime = new Date().toTimeString().split(" ")[0];
+    let result;
+    try {
+      result = await streamVerify(webcamRef, employeeID, inTime, (event) =>
+        setMessage(event.face ? `Checking... (frame ${event.frame})` : "Please face the camera")
+      );
+    } catch (err) {
+      result = await verifySingleFrame(inTime);
+    }
+    if (!result) return;
     setMessage(result.message || result.error);
     if (result.success) {
       setAttendanceMarked(result.attendance_marked);
@@ -99,6 +119,9 @@ const AttendanceRecords = () => {
               </tbody>
             </table>
           )}
+          {nextCursor && (
+            <button className="btn btn-outline-warning mb-3" onClick={() => fetchRecords(nextCursor)}>Load more</button>
+          )}
           <button
             className="btn btn-warning"
             onClick={handleVerify}
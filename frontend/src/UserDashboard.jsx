@@ -1,8 +1,12 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate, useLocation } from 'react-router-dom';
+import fetchPage from './fetchPage';
 
 const UserDashboard = () => {
   const [attendanceRecords, setAttendanceRecords] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [monthRecords, setMonthRecords] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [selectedDate, setSelectedDate] = useState('');
@@ -10,6 +14,12 @@ const UserDashboard = () => {
   const location = useLocation();
   const { employeeName = 'Unknown', employeeID = '' } = location.state || {};
 
+  // The heatmap shows one month, fetched on its own so it doesn't depend on how much history is loaded
+  const now = new Date();
+  const heatmapMonth = selectedDate
+    ? selectedDate.slice(0, 7)
+    : `${now.getFullYear()}-${String(now.getMonth() + 1).padStart(2, '0')}`;
+
   useEffect(() => {
     const fetchAttendance = async () => {
       if (!employeeID) {
@@ -23,19 +33,20 @@ const UserDashboard = () => {
         let url = `http://localhost:5000/api/attendance_records?employeeID=${employeeID}`;
         if (selectedDate) url += `&date=${selectedDate}`;
 
-        const response = await fetch(url, {
-          method: 'GET',
-          headers: { 'Content-Type': 'application/json' },
-        });
-        if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
-        const data = await response.json();
+        // Only the newest page of history; older pages are fetched when asked for
+        const [data, month] = await Promise.all([
+          fetchPage(url),
+          fetchPage(`http://localhost:5000/api/attendance_records?employeeID=${employeeID}&month=${heatmapMonth}&limit=31`)
+        ]);
         console.log('Backend response:', data);
 
         if (data.success) {
           setAttendanceRecords(data.attendance_records || []);
+          setNextCursor(data.next_cursor);
         } else {
           throw new Error(data.error || 'Failed to fetch attendance records');
         }
+        setMonthRecords(month.success ? month.attendance_records : []);
       } catch (err) {
         console.error('Error fetching attendance:', err);
         setError(err.message);
@@ -45,7 +56,24 @@ const UserDashboard = () => {
     };
 
     fetchAttendance();
-  }, [employeeID, navigate, selectedDate]);
+  }, [employeeID, navigate, selectedDate, heatmapMonth]);
+
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      let url = `http://localhost:5000/api/attendance_records?employeeID=${employeeID}`;
+      if (selectedDate) url += `&date=${selectedDate}`;
+      const data = await fetchPage(url, nextCursor);
+      if (!data.success) throw new Error(data.error || 'Failed to fetch attendance records');
+      setAttendanceRecords((previous) => previous.concat(data.attendance_records));
+      setNextCursor(data.next_cursor);
+    } catch (err) {
+      console.error('Error fetching attendance:', err);
+      setError(err.message);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   const handleLogout = () => {
     console.log('Logging out, clearing state, navigating to /login');
@@ -60,7 +88,7 @@ const UserDashboard = () => {
     const daysInMonth = new Date(year, month + 1, 0).getDate();
     const heatmap = Array(daysInMonth).fill(0);
 
-    attendanceRecords.forEach((record) => {
+    monthRecords.forEach((record) => {
       const recordDate = new Date(record.date);
       if (recordDate.getMonth() === month && recordDate.getFullYear() === year && record.status === 'present') {
         const day = recordDate.getDate() - 1;
@@ -71,6 +99,7 @@ const UserDashboard = () => {
     return heatmap;
   };
 
+  // Streaks cover the history loaded so far (the newest page, plus any loaded with "Load more")
   const getStreaks = () => {
     const sortedRecords = attendanceRecords
       .filter((rec) => rec.status === 'present')
@@ -248,6 +277,17 @@ const UserDashboard = () => {
       fontSize: 'clamp(12px, 2vw, 15px)',
     },
     tr: { transition: 'background-color 0.3s' },
+    loadMoreButton: {
+      marginTop: 'clamp(8px, 1.5vw, 12px)',
+      padding: 'clamp(6px, 1.2vw, 8px) clamp(12px, 2vw, 16px)',
+      border: '1px solid #ff7300',
+      borderRadius: 'clamp(6px, 1.5vw, 8px)',
+      backgroundColor: '#ffffff',
+      color: '#ff7300',
+      fontSize: 'clamp(12px, 2vw, 14px)',
+      fontWeight: '600',
+      cursor: 'pointer',
+    },
     error: { color: '#d9534f', fontSize: 'clamp(14px, 2vw, 16px)', textAlign: 'center', padding: 'clamp(8px, 1.5vw, 10px)' },
     loading: { color: '#ff7300', fontSize: 'clamp(14px, 2vw, 16px)', textAlign: 'center', padding: 'clamp(8px, 1.5vw, 10px)' },
     noData: { color: '#d9534f', fontSize: 'clamp(14px, 2vw, 16px)', textAlign: 'center', padding: 'clamp(8px, 1.5vw, 10px)' },
@@ -410,6 +450,11 @@ const UserDashboard = () => {
             </tbody>
           </table>
         )}
+        {!loading && nextCursor && (
+          <button style={styles.loadMoreButton} onClick={loadMore} disabled={loadingMore}>
+            {loadingMore ? 'Loading...' : 'Load more'}
+          </button>
+        )}
       </div>
 
       <footer style={styles.footer}>
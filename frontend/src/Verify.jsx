@@ -1,33 +1,43 @@
 import React, { useState, useRef } from 'react';
 import Webcam from 'react-webcam';
 import { useNavigate, useLocation } from 'react-router-dom';
+import streamVerify from './streamVerify';
 
 const Verify = () => {
   const [isVerified, setIsVerified] = useState(false);
+  const [isVerifying, setIsVerifying] = useState(false);
+  const [progress, setProgress] = useState('');
   const webcamRef = useRef(null);
   const navigate = useNavigate();
   const location = useLocation();
   const { employeeName = 'Unknown', employeeID = '' } = location.state || {};
   console.log('Verify.jsx loaded with state:', { employeeID, employeeName });
 
-  const handleSubmit = async (e) => {
-    e.preventDefault();
-
-    if (!employeeID) {
-      alert('Employee ID not found. Please log in again.');
-      return;
+  const handleResult = (data) => {
+    console.log('Backend response:', data);
+    if (data.success) {
+      if (data.lateTime) {
+        alert(`Good morning, ${employeeName}! Attendance recorded. You are ${data.lateTime} late.`);
+      } else {
+        alert(`Good morning, ${employeeName}! Attendance recorded successfully`);
+      }
+      setIsVerified(true);
+    } else if (data.message === 'Attendance already marked for today') {
+      alert(`Hello, ${employeeName}! Attendance already recorded for today at ${data.inTime}`);
+      setIsVerified(true);
+    } else {
+      alert(data.error || data.message || 'Verification failed');
     }
+  };
 
+  // Single-frame upload, used when the streaming connection is unavailable
+  const verifySingleFrame = async (inTime) => {
     const imageSrc = webcamRef.current.getScreenshot();
     if (!imageSrc) {
       alert('Failed to capture image. Please ensure your webcam is working.');
       return;
     }
 
-    const now = new Date();
-    const inTime = now.toTimeString().split(' ')[0]; // e.g., "09:20:00"
-    console.log(`Captured in-time for ${employeeID}: ${inTime}`);
-
     const blob = await fetch(imageSrc).then((res) => res.blob());
     const file = new File([blob], `${employeeID}.jpg`, { type: 'image/jpeg' });
 
@@ -36,30 +46,43 @@ const Verify = () => {
     formData.append('faceImage', file);
     formData.append('inTime', inTime); // Send in-time to backend
 
+    const response = await fetch('http://localhost:5000/api/verify', {
+      method: 'POST',
+      body: formData,
+    });
+    handleResult(await response.json());
+  };
+
+  const handleSubmit = async (e) => {
+    e.preventDefault();
+
+    if (!employeeID) {
+      alert('Employee ID not found. Please log in again.');
+      return;
+    }
+
+    const now = new Date();
+    const inTime = now.toTimeString().split(' ')[0]; // e.g., "09:20:00"
+    console.log(`Captured in-time for ${employeeID}: ${inTime}`);
+
+    setIsVerifying(true);
+    setProgress('Looking for your face...');
     try {
-      const response = await fetch('http://localhost:5000/api/verify', {
-        method: 'POST',
-        body: formData,
+      const data = await streamVerify(webcamRef, employeeID, inTime, (event) => {
+        setProgress(event.message || (event.face ? `Checking... (frame ${event.frame})` : 'Please face the camera'));
       });
-      const data = await response.json();
-      console.log('Backend response:', data);
-
-      if (data.success) {
-        if (data.lateTime) {
-          alert(`Good morning, ${employeeName}! Attendance recorded. You are ${data.lateTime} late.`);
-        } else {
-          alert(`Good morning, ${employeeName}! Attendance recorded successfully`);
-        }
-        setIsVerified(true);
-      } else if (data.message === 'Attendance already marked for today') {
-        alert(`Hello, ${employeeName}! Attendance already recorded for today at ${data.inTime}`);
-        setIsVerified(true);
-      } else {
-        alert(data.error || data.message || 'Verification failed');
+      handleResult(data);
+    } catch (streamErr) {
+      console.warn('Streaming verification unavailable, sending a single frame:', streamErr);
+      try {
+        await verifySingleFrame(inTime);
+      } catch (err) {
+        alert('An error occurred. Please try again.');
+        console.error('Fetch error:', err);
       }
-    } catch (err) {
-      alert('An error occurred. Please try again.');
-      console.error('Fetch error:', err);
+    } finally {
+      setIsVerifying(false);
+      setProgress('');
     }
   };
 
@@ -95,8 +118,9 @@ const Verify = () => {
               height={240}
               style={styles.webcam}
             />
-            <button type="submit" style={styles.button}>
-              Verify
+            {progress && <p style={styles.progress}>{progress}</p>}
+            <button type="submit" style={styles.button} disabled={isVerifying}>
+              {isVerifying ? 'Verifying...' : 'Verify'}
             </button>
           </form>
         ) : (
@@ -221,6 +245,11 @@ const styles = {
     flexDirection: 'column',
     gap: '10px',
   },
+  progress: {
+    color: '#555555',
+    fontSize: '14px',
+    marginBottom: '10px',
+  },
   successMessage: {
     color: '#28a745',
     fontSize: '18px',
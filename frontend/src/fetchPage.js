@@ -0,0 +1,11 @@
+// Fetches one page of a paginated history endpoint; pass the previous page's
+// next_cursor to get the page after it. Pages are fetched with the browser
+// cache, so unchanged histories revalidate with a 304.
+const fetchPage = async (url, cursor = null) => {
+  const separator = url.includes('?') ? '&' : '?';
+  const response = await fetch(cursor ? `${url}${separator}cursor=${encodeURIComponent(cursor)}` : url);
+  if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
+  return response.json();
+};
+
+export default fetchPage;
@@ -0,0 +1,56 @@
+// Streams low-resolution webcam frames to /api/verify-stream until the server
+// reaches a decision. Resolves with the server's result message, or rejects if
+// the socket fails so the caller can fall back to a single-frame /api/verify.
+const STREAM_URL = 'ws://localhost:5000/api/verify-stream';
+const FRAME_INTERVAL_MS = 150;
+const FRAME_WIDTH = 320;
+const FRAME_HEIGHT = 240;
+
+const streamVerify = (webcamRef, employeeID, inTime, onProgress) =>
+  new Promise((resolve, reject) => {
+    const ws = new WebSocket(STREAM_URL);
+    ws.binaryType = 'arraybuffer';
+    let timer = null;
+    let settled = false;
+
+    const stop = () => {
+      if (timer) clearInterval(timer);
+      timer = null;
+    };
+
+    const fail = (message) => {
+      stop();
+      if (!settled) {
+        settled = true;
+        reject(new Error(message));
+      }
+    };
+
+    const sendFrame = async () => {
+      // Skip this tick while the previous frame is still on the wire
+      if (ws.readyState !== WebSocket.OPEN || ws.bufferedAmount > 0) return;
+      const imageSrc = webcamRef.current?.getScreenshot({ width: FRAME_WIDTH, height: FRAME_HEIGHT });
+      if (!imageSrc) return;
+      const buffer = await fetch(imageSrc).then((res) => res.arrayBuffer());
+      if (ws.readyState === WebSocket.OPEN) ws.send(buffer);
+    };
+
+    ws.onopen = () => ws.send(JSON.stringify({ employeeID, inTime }));
+    ws.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (data.type === 'ready') {
+        timer = setInterval(sendFrame, FRAME_INTERVAL_MS);
+      } else if (data.type === 'progress') {
+        if (onProgress) onProgress(data);
+      } else if (data.type === 'result') {
+        stop();
+        settled = true;
+        ws.close();
+        resolve(data);
+      }
+    };
+    ws.onerror = () => fail('Stream connection failed');
+    ws.onclose = () => fail('Stream closed before a decision');
+  });
+
+export default streamVerify;